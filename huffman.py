@@ -1,6 +1,63 @@
 from huffman_bit_writer import *
 from huffman_bit_reader import *
+from huffman_stats import *
+from array import array
+import collections
+import heapq
+import importlib
+import io
+import mmap
+import os
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DECODE_TABLE_BITS = 10   # bits indexed by the first level of the decode table
+CHUNK_SIZE = 1 << 16     # characters read from the input at a time
+DECODE_CHUNK_SIZE = 1 << 20   # characters huffman_decode decodes before writing them out
+MMAP_DECODE = True       # huffman_decode with binary=True decodes straight into a memory map of the output file
+ESTIMATE_SAMPLES = 16    # pieces of the input read by estimate_encoded_size
+ESTIMATE_SAMPLE_SIZE = 1 << 16   # bytes in each of those pieces
+COUNT_BLOCK_SIZE = 1 << 20   # bytes read at a time when counting a binary file
+
+# The first byte of a compressed file says which format follows. The original text header always
+# starts with an ASCII digit (or the file is empty), so format bytes are kept below ' '
+FORMAT_CANONICAL = 1     # canonical codes, binary header of code lengths
+FORMAT_BLOCKS = 2        # independently coded blocks with a block directory, see huffman_blocks.py
+FORMAT_ADAPTIVE = 3      # one-pass adaptive Huffman coding, see huffman_adaptive.py
+FORMAT_STREAM = 4        # length-prefixed canonical blocks written as they are coded, see huffman_async.py
+FORMAT_SHARED = 5        # codes from a shared dictionary named by its ID instead of a header, see huffman_batch.py
+FORMAT_DICTIONARY = 6    # a shared dictionary file, see huffman_batch.py
+FORMAT_CONTEXT = 7       # a code table for each preceding character (order-1 context), see huffman_context.py
+FORMAT_UNICODE = 8       # canonical codes over the code points of UTF-8 text, see huffman_unicode.py
+FORMAT_RAW = 9           # the input stored as it is, after the format byte, because coding would not make it smaller
+FORMAT_LZ77 = 10         # LZ77 matches and literals with DEFLATE-style Huffman codes, see huffman_lz77.py
+FORMAT_SEGMENTS = 11     # segments that can be added to without recompressing, see huffman_append.py
+
+# Formats decoded by other modules, which are imported only when a file in that format is read
+# format byte -> (module, function that decodes a file to a file, generator of decoded pieces from a binary file
+# object positioned at the format byte and a chunk size); huffman_decode and iter_decode hand these files over
+SHARED_MESSAGE = 'file is coded with a shared dictionary, decode it with huffman_batch.decode_with_dictionary'
+FORMAT_DECODERS = {
+    FORMAT_BLOCKS: ('huffman_blocks', 'huffman_decode_blocks', 'block_chunks'),
+    FORMAT_ADAPTIVE: ('huffman_adaptive', 'huffman_decode_adaptive', 'adaptive_chunks'),
+    FORMAT_STREAM: ('huffman_async', 'huffman_decode_stream', 'stream_blocks'),
+    FORMAT_CONTEXT: ('huffman_context', 'huffman_decode_context', 'context_chunks'),
+    FORMAT_UNICODE: ('huffman_unicode', 'huffman_decode_unicode', 'unicode_chunks'),
+    FORMAT_LZ77: ('huffman_lz77', 'huffman_decode_lz77', 'lz77_chunks'),
+    FORMAT_SEGMENTS: ('huffman_append', 'huffman_decode_segments', 'segment_chunks'),
+}
+
+CODEBOOK_CACHE_SIZE = 64   # codebooks kept by codebook_cache
+NUMPY_ENCODE = True      # encode with NumPy when it is installed; set to False to force the pure Python encoder
+NUMPY_MAX_CODE_LEN = 56  # longer codes do not fit the NumPy encoder's 64-bit words, so the pure Python encoder is used
+
 class HuffmanNode:
+    __slots__ = ('char', 'freq', 'left', 'right')
+
     def __init__(self, char, freq):
         self.char = char   # stored as an integer - the ASCII character code value
         self.freq = freq   # the freqency associated with the node
@@ -62,51 +119,203 @@ def combine(a, b):
     return c'''
 
 
-def cnt_freq(filename):
+class HuffmanTree:
+    # A Huffman tree kept as parallel arrays indexed by node number instead of one object per node
+    # The leaves come first, in character order, then the internal nodes in the order they were made
+    # A leaf has -1 for left and right; an internal node's char is the lesser char of its children, as in combine
+    def __init__(self):
+        self.char = array('i')
+        self.freq = array('q')
+        self.left = array('i')
+        self.right = array('i')
+        self.root = -1
+
+    # Adds a node and returns its number
+    # Frequencies too big for a 64-bit array entry turn freq into a plain list
+    def add(self, char, freq, left, right):
+        self.char.append(char)
+        try:
+            self.freq.append(freq)
+        except OverflowError:
+            self.freq = list(self.freq)
+            self.freq.append(freq)
+        self.left.append(left)
+        self.right.append(right)
+        return len(self.char) - 1
+
+    # Returns a HuffmanNodeView of the node numbered index (the root by default)
+    def node(self, index=None):
+        if index is None:
+            index = self.root
+        return HuffmanNodeView(self, index)
+
+    # Returns a list of (value, length) codes indexed by character for the subtree at node index (the root by default)
+    # The list covers at least 256 characters. The tree is walked with a stack, not recursion, so deep trees are fine
+    def int_codes(self, index=None):
+        if index is None:
+            index = self.root
+        left = self.left
+        right = self.right
+        char = self.char
+        codes = [(0, 0)] * max(256, max(char) + 1)
+        stack = [(index, 0, 0)]
+        while stack:
+            node, value, length = stack.pop()
+            if left[node] < 0:
+                codes[char[node]] = (value, length)
+            else:
+                stack.append((right[node], (value << 1) | 1, length + 1))
+                stack.append((left[node], value << 1, length + 1))
+        return codes
+
+
+class HuffmanNodeView:
+    # Read-only stand-in for a HuffmanNode that reads node index of a HuffmanTree
+    # create_huff_tree returns one for the root, so code written for HuffmanNode trees keeps working
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def char(self):
+        return self.tree.char[self.index]
+
+    @property
+    def freq(self):
+        return self.tree.freq[self.index]
+
+    @property
+    def left(self):
+        if self.tree.left[self.index] < 0:
+            return None
+        return HuffmanNodeView(self.tree, self.tree.left[self.index])
+
+    @property
+    def right(self):
+        if self.tree.right[self.index] < 0:
+            return None
+        return HuffmanNodeView(self.tree, self.tree.right[self.index])
+
+    def __eq__(self, other):
+        return isinstance(other, HuffmanNodeView) and self.tree is other.tree and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+
+def cnt_freq(filename, binary=False):
     """Opens a text file with a given file name (passed as a string) and counts the 
-    frequency of occurrences of all the characters within that file"""
+    frequency of occurrences of all the characters within that file
+    With binary=True the file is read as bytes in large blocks and the 256 byte values are counted,
+    with NumPy if it is installed"""
+    try:
+        fin = open(filename,'rb' if binary else 'r')
+    except:
+        raise FileNotFoundError
+    if binary:
+        final = count_bytes(fin)
+        fin.close()
+        return final
     try:
-        fin = open(filename,'r')
         final = [0]*256
-        for line in fin:
-            for char in line:
-                final[ord(char)] += 1
+        for chunk in iter(lambda: fin.read(CHUNK_SIZE), ''):
+            counts = collections.Counter(chunk)
+            for char in counts:
+                final[ord(char)] += counts[char]
         fin.close()
         return final
     except:
         raise FileNotFoundError
 
 
+def count_bytes(fin):
+    """Returns a list with the number of times each byte value occurs in the binary file object fin"""
+    final = [0]*256
+    for block in iter(lambda: fin.read(COUNT_BLOCK_SIZE), b''):
+        if numpy is not None:
+            counts = numpy.bincount(numpy.frombuffer(block, dtype=numpy.uint8), minlength=256)
+            for i in range(256):
+                final[i] += int(counts[i])
+        else:
+            counts = collections.Counter(block)
+            for byte in counts:
+                final[byte] += counts[byte]
+    return final
+
+
 def create_huff_tree(char_freq):
     """Create a Huffman tree for characters with non-zero frequency
-    Returns the root node of the Huffman tree"""
-    
-    tree = []
+    Returns the root node of the Huffman tree, as a HuffmanNodeView of the HuffmanTree from create_flat_tree"""
+    tree = create_flat_tree(char_freq)
+    if tree is None:
+        return None
+    return tree.node()
+
+
+def create_flat_tree(char_freq):
+    """Builds the Huffman tree for characters with non-zero frequency as a HuffmanTree; returns None if there are none
+    Live trees are kept in a heap ordered on (freq, char), the same order comes_before uses.
+    No two live trees ever share a char value, so the order is total and the result matches
+    re-sorting the whole list after every combine. The key is packed into a single integer
+    and the tree itself is looked up by its char, which keeps the heap comparisons cheap.
+    The first tree popped always comes before the second, so it goes on the left as combine would put it"""
+    shift = max(len(char_freq) - 1, 1).bit_length()
+    mask = (1 << shift) - 1
+    tree = HuffmanTree()
+    live = array('i', [0]) * max(len(char_freq), 1)   # char -> node number of the live tree with that char
+    heap = []
     for i in range(len(char_freq)):
         if char_freq[i] != 0:
-            tree.append(HuffmanNode(i,char_freq[i]))
-    if len(tree) == 0:
+            live[i] = tree.add(i, char_freq[i], -1, -1)
+            heap.append((char_freq[i] << shift) | i)
+    if len(heap) == 0:
         return None
-    else:
-        tree.sort(key=lambda x: x.freq, reverse = False)
-        while len(tree) > 1:
-            new = combine(tree[0],tree[1])
-            tree.append(new)
-            tree.pop(0)
-            tree.pop(0)
-            tree.sort(key=lambda x: (x.freq,x.char), reverse = False)
-
-    final_tree = tree[0]
-    return final_tree 
+    heapq.heapify(heap)
+    while len(heap) > 1:
+        a = heapq.heappop(heap)
+        b = heap[0]
+        char = min(a & mask, b & mask)
+        freq = (a >> shift) + (b >> shift)
+        live[char] = tree.add(char, freq, live[a & mask], live[b & mask])
+        heapq.heapreplace(heap, (freq << shift) | char)
+    tree.root = live[heap[0] & mask]
+    return tree
 
 
 def create_code(node):
     """Returns an array (Python list) of Huffman codes. For each character, use the integer ASCII representation 
     as the index into the arrary, with the resulting Huffman code for that character stored at that location"""
-    codes = [''] * 256
+    codes = []
+    for value, length in create_tree_int_code(node):
+        if length == 0:
+            codes.append('')
+        else:
+            codes.append(format(value, '0%db' % length))
+    return codes
+
+
+def create_tree_int_code(node):
+    """Returns the codes of the tree rooted at node as a list of (value, length) pairs indexed by character, at least 256 long
+    Characters without a code (and the only character of a one-node tree) get (0, 0)
+    A HuffmanNodeView is read straight from its HuffmanTree's arrays; other trees are walked with a stack"""
     if node is None:
-        return codes
-    create_code_helper('', node, codes)
+        return [(0, 0)] * 256
+    if isinstance(node, HuffmanNodeView):
+        return node.tree.int_codes(node.index)
+    leaves = []
+    stack = [(node, 0, 0)]
+    while stack:
+        current, value, length = stack.pop()
+        if current.right is not None and current.left is not None:
+            stack.append((current.right, (value << 1) | 1, length + 1))
+            stack.append((current.left, value << 1, length + 1))
+        else:
+            leaves.append((current.char, value, length))
+    codes = [(0, 0)] * max(256, max(leaf[0] for leaf in leaves) + 1)
+    for char, value, length in leaves:
+        codes[char] = (value, length)
     return codes
 
 
@@ -118,6 +327,160 @@ def create_code_helper(code,current,codes):
         codes[current.char] = code
 
 
+def create_int_code(codes):
+    """Returns the codes from create_code as a list of (value, length) pairs, the form HuffmanBitWriter.write_bits takes
+    Characters without a code get (0, 0)"""
+    pairs = []
+    for code in codes:
+        if code == '':
+            pairs.append((0, 0))
+        else:
+            pairs.append((int(code, 2), len(code)))
+    return pairs
+
+
+def create_code_lengths(node):
+    """Returns a list of code lengths, indexed like create_code, for the tree rooted at node
+    A tree with a single character gets a length of 1 for it so that it still shows up as present"""
+    lengths = [length for value, length in create_tree_int_code(node)]
+    if node is not None and node.left is None and node.right is None:
+        lengths[node.char] = 1
+    return lengths
+
+
+def check_max_code_len(max_code_len):
+    """Raises ValueError if max_code_len is not None and is less than 1, the shortest code a character can have"""
+    if max_code_len is not None and max_code_len < 1:
+        raise ValueError('max_code_len must be at least 1, got %d' % max_code_len)
+
+
+def create_limited_code_lengths(char_freq, max_code_len):
+    """Returns optimal code lengths, indexed like create_code, with no code longer than max_code_len bits
+    When the Huffman tree already fits in max_code_len these are its own code lengths. Otherwise the
+    package-merge algorithm finds the cheapest lengths that respect the cap
+    Raises ValueError if max_code_len is less than 1 or too small to give every counted character a code"""
+    check_max_code_len(max_code_len)
+    present = sorted((char_freq[i], i) for i in range(len(char_freq)) if char_freq[i] != 0)
+    if len(present) > (1 << max_code_len):
+        raise ValueError('%d characters cannot all get codes of %d bits or less' % (len(present), max_code_len))
+    lengths = create_code_lengths(create_huff_tree(char_freq))
+    if max(lengths, default=0) <= max_code_len:
+        return lengths
+    # an item is (weight, char, first, second): a single character when char is not None, else a package of two items
+    leaves = [(freq, char, None, None) for freq, char in present]
+    items = leaves
+    for level in range(max_code_len - 1):
+        packages = []
+        for i in range(0, len(items) - 1, 2):
+            packages.append((items[i][0] + items[i + 1][0], None, items[i], items[i + 1]))
+        items = merge_items(leaves, packages)
+    # every time a character shows up in the cheapest 2n - 2 items its code gets one bit longer
+    lengths = [0] * len(lengths)
+    stack = items[:2 * len(leaves) - 2]
+    while stack:
+        item = stack.pop()
+        if item[1] is not None:
+            lengths[item[1]] += 1
+        else:
+            stack.append(item[2])
+            stack.append(item[3])
+    return lengths
+
+
+def merge_items(a, b):
+    """Merges two lists of package-merge items that are sorted by weight; items from a go first on ties"""
+    merged = []
+    i = 0
+    j = 0
+    while i < len(a) and j < len(b):
+        if b[j][0] < a[i][0]:
+            merged.append(b[j])
+            j += 1
+        else:
+            merged.append(a[i])
+            i += 1
+    merged.extend(a[i:])
+    merged.extend(b[j:])
+    return merged
+
+
+def create_canonical_code(lengths):
+    """Returns a list of canonical Huffman codes, indexed like create_code, for the given code lengths
+    Codes are handed out in order of (length, character), so the lengths alone are enough to rebuild them"""
+    codes = [''] * len(lengths)
+    code = 0
+    prev_len = 0
+    for length, char in sorted((lengths[i], i) for i in range(len(lengths)) if lengths[i] != 0):
+        code <<= length - prev_len
+        codes[char] = format(code, '0%db' % length)
+        code += 1
+        prev_len = length
+    return codes
+
+
+def encode_varint(n):
+    """Returns the non-negative integer n as bytes, 7 bits per byte with the high bit set on all but the last"""
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def read_varint(bit):
+    """Reads an integer written by encode_varint from a HuffmanBitReader"""
+    n = 0
+    shift = 0
+    while True:
+        byte = bit.read_byte()
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n
+        shift += 7
+
+
+def create_canonical_header(lengths, char_num):
+    """Creates and returns the binary header for the canonical format
+    Layout: the FORMAT_CANONICAL byte, the number of characters in the file, the number of characters
+    with a code, then for each of those in increasing order the gap from the previous one and its code length.
+    Every number is a varint, so most headers take about two bytes per distinct character"""
+    return bytes([FORMAT_CANONICAL]) + encode_varint(char_num) + encode_code_lengths(lengths)
+
+
+def encode_code_lengths(lengths):
+    """Returns the code lengths as bytes, as they appear in the canonical header: the number of characters with a code,
+    then for each of those in increasing order the gap from the previous one and its code length, all as varints"""
+    present = [i for i in range(len(lengths)) if lengths[i] != 0]
+    out = bytearray(encode_varint(len(present)))
+    prev = -1
+    for char in present:
+        out += encode_varint(char - prev - 1)
+        out += encode_varint(lengths[char])
+        prev = char
+    return bytes(out)
+
+
+def read_code_lengths(bit):
+    """Reads code lengths written by encode_code_lengths from a HuffmanBitReader; returns a list of at least 256 lengths,
+    longer if a symbol past 255 has a code"""
+    lengths = [0] * 256
+    char = -1
+    for i in range(read_varint(bit)):
+        char += read_varint(bit) + 1
+        if char >= len(lengths):
+            lengths.extend([0] * (char + 1 - len(lengths)))
+        lengths[char] = read_varint(bit)
+    return lengths
+
+
+def read_canonical_header(bit):
+    """Reads a header written by create_canonical_header, after the format byte, from a HuffmanBitReader
+    Returns a tuple (code lengths, number of characters in the file)"""
+    char_num = read_varint(bit)
+    return (read_code_lengths(bit), char_num)
+
+
 def create_header(freqs):
     """Input is the list of frequencies. Creates and returns a header for the output file
     Example: For the frequency list asscoaied with "aaabbbbcc, would return “97 3 98 4 99 2” """
@@ -129,77 +492,441 @@ def create_header(freqs):
     return ' '.join(temp)
 
 
-def huffman_encode(in_file, out_file):
+class Codebook:
+    # The codes for one frequency table or list of code lengths, with the tables built from them
+    # tree is the Huffman tree for a frequency table and None for canonical codes
+    # The translate and decode tables are built the first time they are asked for
+    def __init__(self, codes, tree=None):
+        self.tree = tree
+        self.codes = codes
+        self.translate = None
+        self.decode = None
+        self.arrays = None
+
+    # Returns the str.translate table that maps each character to its code
+    def translate_table(self):
+        if self.translate is None:
+            table = {}
+            for i in range(len(self.codes)):
+                if self.codes[i] != '':
+                    table[i] = self.codes[i]
+            self.translate = table
+        return self.translate
+
+    # Returns the decode_symbols table for the codes (see create_decode_table)
+    def decode_table(self):
+        if self.decode is None:
+            self.decode = create_decode_table(self.codes)
+        return self.decode
+
+    # Returns the codes as NumPy arrays (code values, code lengths) indexed by character for numpy_code_bits,
+    # or None if NumPy is not installed or a code is longer than NUMPY_MAX_CODE_LEN
+    def code_arrays(self):
+        if self.arrays is None:
+            self.arrays = ()
+            if numpy is not None and max(len(code) for code in self.codes) <= NUMPY_MAX_CODE_LEN:
+                values = [0] * len(self.codes)
+                lengths = [0] * len(self.codes)
+                for i in range(len(self.codes)):
+                    if self.codes[i] != '':
+                        values[i] = int(self.codes[i], 2)
+                        lengths[i] = len(self.codes[i])
+                self.arrays = (numpy.array(values, dtype=numpy.int64), numpy.array(lengths, dtype=numpy.int64))
+        if self.arrays == ():
+            return None
+        return self.arrays
+
+
+class CodebookCache:
+    # Least recently used cache of Codebooks, keyed by the frequency table or code lengths they were built from
+    # Keys are the tables themselves, as tuples, so two tables only share an entry if they are equal
+    # maxsize=0 turns the cache off; hits and misses count the lookups
+    def __init__(self, maxsize=CODEBOOK_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # Returns the codebook stored under key, calling build() to make it (and storing it) if there is none
+    def get(self, key, build):
+        with self.lock:
+            book = self.entries.get(key)
+            if book is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return book
+            self.misses += 1
+        book = build()
+        with self.lock:
+            if self.maxsize > 0:
+                self.entries[key] = book
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return book
+
+    # Empties the cache and resets the counters
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    # Returns the hit and miss counts and the current and maximum number of entries as a dict
+    def info(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'maxsize': self.maxsize}
+
+
+codebook_cache = CodebookCache()   # shared by the encoder and decoder in this process
+
+
+def tree_codebook(char_freq):
+    """Returns the Codebook for the Huffman tree of the frequency list char_freq, from codebook_cache if it is there"""
+    def build():
+        tree = create_huff_tree(char_freq)
+        return Codebook(create_code(tree), tree)
+    return codebook_cache.get(('tree', tuple(char_freq)), build)
+
+
+def canonical_codebook(lengths):
+    """Returns the Codebook for the canonical codes with the given lengths, from codebook_cache if it is there"""
+    return codebook_cache.get(('canonical', tuple(lengths)), lambda: Codebook(create_canonical_code(lengths)))
+
+
+def numpy_code_bits(data, book):
+    """Returns the code bits for the bytes in data as a NumPy array of 0s and 1s (dtype uint8), using the codes in book
+    Every bit is found at once: a cumulative sum of the code lengths gives where each code ends, and each output bit
+    is shifted out of the code it belongs to. Returns None when the NumPy encoder cannot be used"""
+    if numpy is None or not NUMPY_ENCODE:
+        return None
+    arrays = book.code_arrays()
+    if arrays is None:
+        return None
+    return numpy_symbol_bits(numpy.frombuffer(data, dtype=numpy.uint8), arrays[0], arrays[1])
+
+
+def numpy_symbol_bits(syms, values, lengths):
+    """Returns the code bits for the NumPy array of symbols syms as numpy_code_bits does
+    values and lengths are NumPy int64 arrays of the code value and code length of each symbol"""
+    code_lens = lengths[syms]
+    ends = numpy.cumsum(code_lens)
+    total = int(ends[-1]) if len(ends) > 0 else 0
+    # for output bit p of a code ending at bit e, the bit is e - 1 - p places from the low end of the code value
+    shifts = numpy.repeat(ends - 1, code_lens) - numpy.arange(total, dtype=numpy.int64)
+    return ((numpy.repeat(values[syms], code_lens) >> shifts) & 1).astype(numpy.uint8)
+
+
+def translate_chunk(chunk, book):
+    """Returns the code bits for the characters of chunk (a str or bytes) as a string of '0's and '1's
+    The NumPy encoder is used when it can be, with str.translate and the book's translate table as the fallback"""
+    try:
+        data = chunk if isinstance(chunk, bytes) else chunk.encode('latin-1')
+    except UnicodeEncodeError:   # characters past 255 have no code; leave them for translate as before
+        data = None
+    if data is not None:
+        bits = numpy_code_bits(data, book)
+        if bits is not None:
+            return (bits | ord('0')).tobytes().decode('ascii')
+        chunk = data.decode('latin-1')   # one character per byte, so str.translate can be used
+    return chunk.translate(book.translate_table())
+
+
+def write_chunk(bit, data, book):
+    """Writes the codes for the bytes in data with the HuffmanBitWriter bit
+    The NumPy encoder packs the bits with numpy.packbits and hands them to the writer as one integer"""
+    bits = numpy_code_bits(data, book)
+    if bits is None:
+        bit.write_code(data.decode('latin-1').translate(book.translate_table()))
+    else:
+        write_bit_array(bit, bits)
+
+
+def write_bit_array(bit, bits):
+    """Writes a NumPy array of 0s and 1s with the HuffmanBitWriter bit"""
+    if len(bits) > 0:
+        pad = -len(bits) % 8
+        bit.write_bits(int.from_bytes(numpy.packbits(bits).tobytes(), 'big') >> pad, len(bits))
+
+
+def coded_bits(char_freq, codes):
+    """Returns the number of code bits the characters counted in char_freq take with codes, a list of code lengths or
+    of code strings indexed by character; a single distinct character (or none) takes no bits"""
+    bits = 0
+    present = 0
+    for i in range(len(char_freq)):
+        if char_freq[i] != 0:
+            length = codes[i] if isinstance(codes[i], int) else len(codes[i])
+            bits += char_freq[i] * length
+            present += 1
+    if present < 2:
+        return 0
+    return bits
+
+
+def encoded_size(char_freq, codes, header_size):
+    """Returns the exact size in bytes of a compressed file with a header of header_size bytes, for the counts
+    char_freq and codes (as coded_bits takes them), without coding anything"""
+    return header_size + (coded_bits(char_freq, codes) + 7) // 8
+
+
+def worth_coding(char_freq, codes, header_size):
+    """Returns True if coding makes the input counted in char_freq smaller than storing it raw (FORMAT_RAW)"""
+    return encoded_size(char_freq, codes, header_size) < sum(char_freq) + 1
+
+
+def estimate_encoded_size(in_file, samples=ESTIMATE_SAMPLES, sample_size=ESTIMATE_SAMPLE_SIZE):
+    """Estimates the size of in_file compressed to the canonical format from samples pieces of sample_size bytes
+    spread evenly over the file, without reading the rest of it; files no bigger than the samples are counted in full
+    The code lengths built from the sampled counts are applied to the sample and scaled up to the whole file
+    Returns (estimated compressed size, file size)"""
+    try:
+        fin = open(in_file, 'rb')
+    except:
+        raise FileNotFoundError
+    with fin:
+        size = os.fstat(fin.fileno()).st_size
+        if size <= samples * sample_size:
+            char_freq = count_bytes(fin)
+        else:
+            char_freq = [0] * 256
+            step = (size - sample_size) // (samples - 1) if samples > 1 else 0
+            for i in range(samples):
+                fin.seek(i * step)
+                counts = count_bytes(io.BytesIO(fin.read(sample_size)))
+                for byte in range(256):
+                    char_freq[byte] += counts[byte]
+    lengths = create_code_lengths(create_huff_tree(char_freq))
+    header_size = len(create_canonical_header(lengths, size))
+    sampled = sum(char_freq)
+    if sampled == 0:
+        return (header_size, size)
+    return (header_size + (coded_bits(char_freq, lengths) * size // sampled + 7) // 8, size)
+
+
+def compressed_file_name(out_file):
+    """Returns the name of the compressed file that goes with out_file: _compressed is added before the extension"""
+    return os.path.splitext(out_file)[0] + '_compressed.txt'
+
+
+def huffman_encode(in_file, out_file, canonical=False, chunk_size=CHUNK_SIZE, binary=False, max_code_len=None, stats=None,
+                   store_raw=False):
     """Takes inout file name and output file name as parameters - both files will have .txt extensions
     Uses the Huffman coding process on the text from the input file and writes encoded text to output file
     Also creates a second output file which adds _compressed before the .txt extension to the name of the file.
     This second file is actually compressed by writing individual 0 and 1 bits to the file using the utility methods 
     provided in the huffman_bits_io module to write both the header and bits.
-    Take not of special cases - empty file and file with only one unique character"""
+    Take not of special cases - empty file and file with only one unique character
+    With canonical=True the compressed file uses canonical codes and a binary header of code lengths
+    (see create_canonical_header) instead of the text frequency header
+    The input is encoded chunk_size characters at a time
+    With binary=True the input is read as bytes, so any file round-trips (decode it with binary=True too)
+    max_code_len caps the length of every code (see create_limited_code_lengths); it needs canonical=True
+    stats, a HuffmanStats, collects the time of each stage and the bytes, symbols and bits handled
+    With store_raw=True the exact compressed size is worked out from the counts before any bits are written, and if
+    it is no smaller than the input the compressed file stores the input as it is instead (FORMAT_RAW); the output
+    file then only gets the header"""
+    if max_code_len is not None and not canonical:
+        raise ValueError('max_code_len needs canonical=True')
+    check_max_code_len(max_code_len)
+    # the code is worked out before the output files are opened, so a cap that cannot be met leaves them untouched
+    with timed_stage(stats, 'count'):
+        char_freq = cnt_freq(in_file, binary)
+    with timed_stage(stats, 'tree'):
+        book = tree_codebook(char_freq)
+        tree = book.tree
+    with timed_stage(stats, 'code'):
+        header = create_header(char_freq)
+        if canonical and max_code_len is not None:
+            lengths = create_limited_code_lengths(char_freq, max_code_len)
+            book = canonical_codebook(lengths)
+            comp_header = create_canonical_header(lengths, sum(char_freq))
+        elif canonical:
+            lengths = create_code_lengths(tree)
+            book = canonical_codebook(lengths)
+            comp_header = create_canonical_header(lengths, sum(char_freq))
+        else:
+            comp_header = (header + '\n').encode('utf-8')
     try:
-        fin = open(in_file,'r')
+        fin = open(in_file,'rb' if binary else 'r')
         fout = open(out_file,'w')
     except:
         raise FileNotFoundError
-    char_freq = cnt_freq(in_file)
-    tree = create_huff_tree(char_freq)
-    codes = create_code(tree)
-    header = create_header(char_freq)
-    if tree is None:
-        fin.close()
-        fout.close()
-        compfilename = ''
-        i = 0
-        while out_file[i] != '.':
-            compfilename += out_file[i]
-            i += 1
-        compfilename += '_compressed.txt'
+    compfilename = compressed_file_name(out_file)
+    with fin, fout:
+        if tree is None:
+            bit = HuffmanBitWriter(compfilename)
+            bit.close()
 
-        bit = HuffmanBitWriter(compfilename)
-        bit.close()
+        elif store_raw and not worth_coding(char_freq, lengths if canonical else book.codes, len(comp_header)):
+            fout.write(header)
+            fout.write('\n')
+            with timed_stage(stats, 'write_bits'):
+                write_raw_file(fin, compfilename, binary, chunk_size)
+            if stats is not None:
+                stats.add('stored_raw', 1)
 
-    elif tree.left is None and tree.right is None and tree is not None:
-        fout.write(header)
-        fout.write('\n')
-        fin.close()
-        fout.close()
-        compfilename = ''
-        i = 0
-        while out_file[i] != '.':
-            compfilename += out_file[i]
-            i += 1
-        compfilename += '_compressed.txt'
-        bit = HuffmanBitWriter(compfilename)
-        bit.write_str(header)
-        bit.write_str('\n')
-        bit.close()
+        elif tree.left is None and tree.right is None and tree is not None:
+            fout.write(header)
+            fout.write('\n')
+            bit = HuffmanBitWriter(compfilename)
+            bit.write_bytes(comp_header)
+            bit.close()
 
-    else:
-        fout.write(header)
-        fout.write('\n')
-        stringz = ''
-        for line in fin:
-            for char in line:
-                val = ord(char)
-                fout.write(codes[val])
-                stringz += codes[val]
-
-        compfilename = ''
-        i = 0
-        while out_file[i] != '.':
-            compfilename += out_file[i]
-            i += 1
-        compfilename += '_compressed.txt'
-        
-        bit = HuffmanBitWriter(compfilename)
-        bit.write_str(header)
-        bit.write_str('\n')
-        bit.write_code(stringz)
-        bit.close()
+        else:
+            fout.write(header)
+            fout.write('\n')
+            bit = HuffmanBitWriter(compfilename)
+            bit.write_bytes(comp_header)
+            # the input is read chunk_size characters at a time and each chunk is translated to its
+            # code bits in one go, so memory use does not grow with the size of the input
+            while True:
+                with timed_stage(stats, 'read'):
+                    chunk = fin.read(chunk_size)
+                if len(chunk) == 0:
+                    break
+                with timed_stage(stats, 'translate'):
+                    bits = translate_chunk(chunk, book)
+                with timed_stage(stats, 'write_text'):
+                    fout.write(bits)
+                with timed_stage(stats, 'write_bits'):
+                    bit.write_code(bits)
+                if stats is not None:
+                    stats.add('symbols_encoded', len(chunk))
+                    stats.add('bits_written', len(bits))
+            with timed_stage(stats, 'write_bits'):
+                bit.close()
+    if stats is not None:
+        stats.add('bytes_in', os.path.getsize(in_file))
+        stats.add('bytes_out', os.path.getsize(compfilename))
 
 
-        fin.close()
-        fout.close()
+def write_raw_file(fin, raw_file, binary=False, chunk_size=CHUNK_SIZE):
+    """Writes the rest of the file object fin to the file raw_file in the raw format: the FORMAT_RAW byte, then the
+    input as it is; text is written one byte per character, as the decoder writes decoded characters"""
+    try:
+        fout = open(raw_file, 'wb')
+    except:
+        raise FileNotFoundError
+    fout.write(bytes([FORMAT_RAW]))
+    for chunk in iter(lambda: fin.read(chunk_size), b'' if binary else ''):
+        fout.write(chunk if binary else chunk.encode('latin-1'))
+    fout.close()
+
+
+def raw_chunks(fin, chunk_size=CHUNK_SIZE):
+    """Yields the bytes stored in a raw-format file object fin, positioned at the format byte, chunk_size at a time"""
+    if fin.read(1) != bytes([FORMAT_RAW]):
+        raise ValueError('not a raw-format file')
+    for chunk in iter(lambda: fin.read(chunk_size), b''):
+        yield chunk
+
+
+def create_decode_table(codes, table_bits=DECODE_TABLE_BITS):
+    """Builds the lookup tables used by decode_symbols from a list of Huffman codes
+    The first level is indexed by the next table_bits bits of input and gives the symbol and its
+    code length. Codes longer than table_bits share a first level slot (code length 0) that points
+    at a second level table indexed by the bits that follow
+    Returns a tuple (table_bits, max_len, syms, lens, subtables)"""
+    max_len = 0
+    for code in codes:
+        if len(code) > max_len:
+            max_len = len(code)
+    table_bits = min(table_bits, max_len)
+    syms = [0] * (1 << table_bits)
+    lens = [0] * (1 << table_bits)
+    subtables = {}
+    long_codes = {}
+    for sym in range(len(codes)):
+        code = codes[sym]
+        if code == '':
+            continue
+        if len(code) <= table_bits:
+            fill = table_bits - len(code)
+            start = int(code, 2) << fill
+            for idx in range(start, start + (1 << fill)):
+                syms[idx] = sym
+                lens[idx] = len(code)
+        else:
+            long_codes.setdefault(int(code[:table_bits], 2), []).append(sym)
+    for prefix in long_codes:
+        sub_bits = max(len(codes[sym]) for sym in long_codes[prefix]) - table_bits
+        sub_syms = [0] * (1 << sub_bits)
+        sub_lens = [0] * (1 << sub_bits)
+        for sym in long_codes[prefix]:
+            code = codes[sym]
+            fill = sub_bits - (len(code) - table_bits)
+            start = int(code[table_bits:], 2) << fill
+            for idx in range(start, start + (1 << fill)):
+                sub_syms[idx] = sym
+                sub_lens[idx] = len(code)
+        subtables[prefix] = (sub_bits, sub_syms, sub_lens)
+    return (table_bits, max_len, syms, lens, subtables)
+
+
+def decode_symbols(bit, table, char_num, stats=None, out=None, offset=0, contexts=None, extra=None, values=None):
+    """Decodes char_num symbols from the HuffmanBitReader bit using a table from create_decode_table
+    Each step looks up a whole symbol instead of walking the tree one bit at a time
+    Bits are taken straight out of the reader's buffer, 32 at a time, and the reader is left just after the last code
+    Returns the decoded symbols as a bytearray, or, when out (a writable buffer such as a bytearray or an mmap) is given,
+    stores them in out from offset on and returns out; stats, a HuffmanStats, counts the symbols and the second level
+    lookups (table_misses)
+    With contexts, a list of decode tables indexed by symbol, table only decodes the first symbol and every later one
+    is decoded with the table contexts gives for the symbol before it. extra, a list indexed by symbol, can then give
+    the number of raw bits that follow each symbol's code; they are stored in values (values[i] goes with out[i])"""
+    table_bits, max_len, syms, lens, subtables = table
+    top_mask = (1 << table_bits) - 1
+    if contexts is not None:
+        max_len = max(context[1] for context in contexts)
+        if extra is not None:
+            max_len += max(extra)
+    if out is None:
+        out = bytearray(char_num)
+    buf = bit.buf
+    load = bit.bit_pos >> 3   # next byte of buf to go into the bit buffer
+    acc = 0                   # bit buffer, the next unread bit is bit n_acc - 1
+    n_acc = 0
+    misses = 0
+    if bit.bit_pos & 7:
+        n_acc = 8 - (bit.bit_pos & 7)
+        acc = buf[load]
+        load += 1
+    for i in range(offset, offset + char_num):
+        while n_acc < max_len:
+            if load + 4 > len(buf):
+                bit.bit_pos = load * 8 - n_acc
+                load -= bit.fill(load + 4 - (bit.bit_pos >> 3))
+                buf = bit.buf
+            word = int.from_bytes(buf[load:load + 4], 'big')
+            if load + 4 > len(buf):   # past the end of the file, missing bits read as 0s
+                word <<= 8 * (load + 4 - len(buf))
+            acc = ((acc & ((1 << n_acc) - 1)) << 32) | word
+            load += 4
+            n_acc += 32
+        idx = (acc >> (n_acc - table_bits)) & top_mask
+        length = lens[idx]
+        if length:
+            sym = syms[idx]
+        else:
+            sub_bits, sub_syms, sub_lens = subtables[idx]
+            sub_idx = (acc >> (n_acc - table_bits - sub_bits)) & ((1 << sub_bits) - 1)
+            length = sub_lens[sub_idx]
+            sym = sub_syms[sub_idx]
+            misses += 1
+        out[i] = sym
+        n_acc -= length
+        if contexts is not None:
+            if extra is not None:
+                nbits = extra[sym]
+                values[i] = (acc >> (n_acc - nbits)) & ((1 << nbits) - 1)
+                n_acc -= nbits
+            table_bits, _, syms, lens, subtables = contexts[sym]
+            top_mask = (1 << table_bits) - 1
+    bit.bit_pos = load * 8 - n_acc
+    if stats is not None:
+        stats.add('symbols_decoded', char_num)
+        stats.add('table_misses', misses)
+    return out
 
 
 def parse_header(header_string):
@@ -214,53 +941,292 @@ def parse_header(header_string):
     return freqs
 
 
-def huffman_decode(encoded_file,decode_file):
+def read_canonical_stream(bit, stats=None):
+    """Reads the header of a canonical-format stream from the HuffmanBitReader bit, positioned just after the format byte
+    Returns a tuple (decode table, number of characters, only character) for stream_chunks; the decode table is None
+    unless there are at least two different characters, and the only character is None unless there is exactly one"""
+    with timed_stage(stats, 'header'):
+        lengths, char_num = read_canonical_header(bit)
+    present = [i for i in range(len(lengths)) if lengths[i] != 0]
+    if len(present) == 1:
+        return (None, char_num, present[0])
+    elif len(present) > 1:
+        with timed_stage(stats, 'table'):
+            return (canonical_codebook(lengths).decode_table(), char_num, None)
+    return (None, 0, None)
+
+
+def read_legacy_stream(bit, stats=None):
+    """Reads the text frequency header of a file written by huffman_encode without canonical=True
+    Returns a tuple (decode table, number of characters, only character) as read_canonical_stream does"""
+    with timed_stage(stats, 'header'):
+        header_string = str(bit.read_str())
+        header_string = str(header_string[2:-3])
+        freqs = parse_header(header_string)
+    with timed_stage(stats, 'tree'):
+        book = tree_codebook(freqs)
+        tree = book.tree
+    char_num = 0
+    for val in freqs:
+        char_num += val
+
+    if tree is None:
+        return (None, 0, None)
+
+    elif tree.left is None and tree.right is None:
+        return (None, char_num, tree.char)
+
+    with timed_stage(stats, 'table'):
+        return (book.decode_table(), char_num, None)
+
+
+def stream_chunks(bit, stream, chunk_size=CHUNK_SIZE, stats=None):
+    """Yields the decoded characters of a stream, whose header read_canonical_stream or read_legacy_stream returned
+    as stream, chunk_size at a time. Only one chunk is decoded ahead, so a caller that stops early saves the rest"""
+    table, char_num, only = stream
+    while char_num > 0:
+        n = min(chunk_size, char_num)
+        if table is None:
+            yield bytes([only]) * n
+        else:
+            with timed_stage(stats, 'decode'):
+                chunk = decode_symbols(bit, table, n, stats)
+            yield chunk
+        char_num -= n
+
+
+def decode_stream_into(bit, stream, out, offset=0, stats=None):
+    """Decodes a stream, whose header read_canonical_stream or read_legacy_stream returned as stream, straight into
+    the writable buffer out (a bytearray, an mmap or a memoryview) from offset on, without building any chunks
+    out must have room for all the characters of the stream; returns the number of characters stored"""
+    table, char_num, only = stream
+    if offset + char_num > len(out):
+        raise ValueError('output buffer is too small: %d bytes needed' % (offset + char_num))
+    if table is None:
+        fill = bytes([only or 0]) * min(char_num, DECODE_CHUNK_SIZE)
+        for start in range(offset, offset + char_num, DECODE_CHUNK_SIZE):
+            end = min(start + DECODE_CHUNK_SIZE, offset + char_num)
+            out[start:end] = fill[:end - start]
+    elif char_num > 0:
+        with timed_stage(stats, 'decode'):
+            decode_symbols(bit, table, char_num, stats, out, offset)
+    return char_num
+
+
+def open_stream(fin, stats=None):
+    """Reads the header of a canonical or legacy text-header file from the binary file object fin, positioned at its start
+    Returns (HuffmanBitReader just after the header, stream tuple as read_canonical_stream returns)"""
+    bit = HuffmanBitReader(fin)
+    first = bit.peek_byte()
+    if first == FORMAT_CANONICAL:
+        bit.read_byte()
+        return (bit, read_canonical_stream(bit, stats))
+    if first is not None and not chr(first).isdigit():
+        raise ValueError('not a canonical or text-header file')
+    return (bit, read_legacy_stream(bit, stats))
+
+
+def decoded_size(encoded_file):
+    """Returns the number of bytes encoded_file decodes to, read from its header, for a canonical or text-header file
+    (or from the file size, for a raw file)"""
     try:
-        fin = open(encoded_file,'r')
-        fout = open(decode_file,'w')
+        fin = open(encoded_file, 'rb')
     except:
         raise FileNotFoundError
+    with fin:
+        if fin.read(1) == bytes([FORMAT_RAW]):
+            return os.fstat(fin.fileno()).st_size - 1
+        fin.seek(0)
+        bit, stream = open_stream(fin)
+        bit.close()
+    return stream[1]
 
-    bit = HuffmanBitReader(encoded_file)
-    header_string = str(bit.read_str())
-    header_string = str(header_string[2:-3])
-    freqs = parse_header(header_string)
-    tree = create_huff_tree(freqs)
 
-    if tree is None:
-        fin.close()
-        bit.close()
-        fout.close()
-
-    elif tree.left is None and tree.right is None and tree is not None:
-        char_num = 0
-        for val in range(len(freqs)):
-            char_num += freqs[val]
-            if freqs[val] != 0:
-                ascii_val = val
-        final = chr(ascii_val) * char_num
-        fout.write(final)
-        fin.close()
-        bit.close()
-        fout.close()
-
-    elif tree.left is not None and tree.right is not None:
-        char_num = 0
-        for val in freqs:
-            char_num += val
-        final = ''
-        i = 0
-        while i < char_num:
-            current = tree
-            while current.left is not None and current.right is not None:
-                temp = bit.read_bit()
-                if temp is True:
-                    current = current.right
-                elif temp is False:
-                    current = current.left
-            final += str(chr(current.char))
-            i += 1
-        fout.write(final)
-        fout.close()
+def decode_into(encoded_file, out, offset=0):
+    """Decodes a canonical or text-header file (or copies a raw file) straight into the writable buffer out from offset on
+    A bytearray that is too small is grown to fit, so one bytearray can be reused from file to file; any other buffer
+    (an mmap or a memoryview) must already be big enough. Returns the number of bytes decoded"""
+    try:
+        fin = open(encoded_file, 'rb')
+    except:
+        raise FileNotFoundError
+    with fin:
+        if fin.read(1) == bytes([FORMAT_RAW]):
+            data = fin.read()
+            if isinstance(out, bytearray) and offset + len(data) > len(out):
+                out.extend(bytes(offset + len(data) - len(out)))
+            if offset + len(data) > len(out):
+                raise ValueError('output buffer is too small: %d bytes needed' % (offset + len(data)))
+            out[offset:offset + len(data)] = data
+            return len(data)
+        fin.seek(0)
+        bit, stream = open_stream(fin)
+        if isinstance(out, bytearray) and offset + stream[1] > len(out):
+            out.extend(bytes(offset + stream[1] - len(out)))
+        n = decode_stream_into(bit, stream, out, offset)
         bit.close()
+    return n
+
+
+def decode_to_mmap(bit, stream, decode_file, stats=None):
+    """Decodes a stream, whose header has been read into stream, to decode_file through a memory map
+    The file is first set to its decoded size, then the symbols are decoded straight into the mapping, so no chunk of
+    output is built in memory and the OS writes the pages out when it suits it"""
+    char_num = stream[1]
+    try:
+        fout = open(decode_file, 'w+b')
+    except:
+        raise FileNotFoundError
+    with fout:
+        fout.truncate(char_num)
+        if char_num == 0:   # an empty file cannot be mapped
+            return
+        with mmap.mmap(fout.fileno(), char_num, access=mmap.ACCESS_WRITE) as out:
+            decode_stream_into(bit, stream, out, 0, stats)
+            with timed_stage(stats, 'write'):
+                out.flush()
+
+
+def decode_canonical(bit, stats=None):
+    """Decodes one canonical-format stream from the HuffmanBitReader bit, positioned just after the format byte
+    Returns the decoded bytes and leaves the reader just after the last code"""
+    stream = read_canonical_stream(bit, stats)
+    return b''.join(stream_chunks(bit, stream, max(stream[1], 1), stats))
+
+
+def encode_bytes(data, max_code_len=None, store_raw=True):
+    """Compresses the bytes in data to the canonical format in memory and returns the compressed bytes
+    The result is a complete compressed file, and it is what each block of a block container holds
+    max_code_len caps the length of every code, as in huffman_encode
+    With store_raw=True data that coding would not make smaller is stored as it is, in the raw format (FORMAT_RAW)"""
+    freqs = count_bytes(io.BytesIO(data))
+    if max_code_len is None:
+        lengths = create_code_lengths(tree_codebook(freqs).tree)
+    else:
+        lengths = create_limited_code_lengths(freqs, max_code_len)
+    header = create_canonical_header(lengths, len(data))
+    if store_raw and not worth_coding(freqs, lengths, len(header)):
+        return bytes([FORMAT_RAW]) + data
+    out = io.BytesIO()
+    bit = HuffmanBitWriter(out)
+    bit.write_bytes(header)
+    if sum(1 for length in lengths if length != 0) > 1:
+        book = canonical_codebook(lengths)
+        for start in range(0, len(data), CHUNK_SIZE):
+            write_chunk(bit, data[start:start + CHUNK_SIZE], book)
+    bit.close()
+    return out.getvalue()
+
+
+def decode_bytes(data):
+    """Decodes bytes produced by encode_bytes, coded or stored raw, and returns the original bytes"""
+    if data[:1] == bytes([FORMAT_RAW]):
+        return bytes(data[1:])
+    bit = HuffmanBitReader(io.BytesIO(data))
+    if bit.read_byte() != FORMAT_CANONICAL:
+        raise ValueError('not a canonical-format stream')
+    final = decode_canonical(bit)
+    bit.close()
+    return final
+
+
+def iter_decode(encoded_file, chunk_size=CHUNK_SIZE, max_bytes=None):
+    """Yields the decoded bytes of encoded_file, in any format huffman_decode reads, in chunks of chunk_size bytes
+    (the last one may be shorter). With max_bytes it stops after that many bytes, without decoding the rest of the file
+    Only a chunk is decoded ahead (a whole block for block container and stream files), so memory use stays flat"""
+    if max_bytes is not None:
+        if max_bytes <= 0:
+            return
+        chunk_size = min(chunk_size, max_bytes)
+    file_format = read_format(encoded_file)
+    if file_format == FORMAT_SHARED:
+        raise ValueError(SHARED_MESSAGE)
+    fin = open(encoded_file, 'rb')
+    try:
+        if file_format in FORMAT_DECODERS:
+            pieces = format_decoder(file_format, chunks=True)(fin, chunk_size)
+        elif file_format == FORMAT_RAW:
+            pieces = raw_chunks(fin, chunk_size)
+        else:
+            bit, stream = open_stream(fin)
+            pieces = stream_chunks(bit, stream, chunk_size)
+        left = max_bytes
+        pending = bytearray()
+        for piece in pieces:
+            pending += piece
+            while len(pending) >= chunk_size:
+                chunk = bytes(pending[:chunk_size])
+                del pending[:chunk_size]
+                if left is not None:
+                    if len(chunk) >= left:
+                        yield chunk[:left]
+                        return
+                    left -= len(chunk)
+                yield chunk
+        if len(pending) > 0:
+            if left is not None:
+                pending = pending[:left]
+            yield bytes(pending)
+    finally:
         fin.close()
+
+
+def read_format(encoded_file):
+    """Returns the first byte of encoded_file, which tells its format, or None if the file is empty"""
+    with open(encoded_file, 'rb') as fin:
+        first = fin.read(1)
+    return first[0] if first else None
+
+
+def format_decoder(file_format, chunks=False):
+    """Imports and returns the decoder FORMAT_DECODERS lists for file_format: the one that decodes a file to a file,
+    or with chunks=True the generator of decoded pieces"""
+    module, decode, pieces = FORMAT_DECODERS[file_format]
+    return getattr(importlib.import_module(module), pieces if chunks else decode)
+
+
+def huffman_decode(encoded_file, decode_file, binary=False, stats=None):
+    """Decodes a file written by huffman_encode, in either header format, and writes the text to decode_file
+    With binary=True the decoded bytes are written as they are (use it for files encoded with binary=True), straight
+    into a memory map of decode_file set to the decoded size unless MMAP_DECODE is False
+    Block container files from huffman_blocks, adaptive files from huffman_adaptive, stream files from
+    huffman_async, context files from huffman_context, LZ77 files from huffman_lz77 and segment files from
+    huffman_append are handed to their own decoders, which always write bytes; Unicode files from huffman_unicode are
+    decoded to UTF-8 text, and raw files (FORMAT_RAW) are copied out
+    stats, a HuffmanStats, collects the time of each stage and the bytes, symbols and table misses; for block,
+    adaptive, stream, context, LZ77, segment and Unicode files the whole decode is one 'decode' stage"""
+    # the format byte is read before decode_file is opened, so a file this function cannot decode leaves it untouched
+    file_format = read_format(encoded_file)
+    if file_format == FORMAT_SHARED:
+        raise ValueError(SHARED_MESSAGE)
+    if file_format in FORMAT_DECODERS:
+        with timed_stage(stats, 'decode'):
+            format_decoder(file_format)(encoded_file, decode_file)
+        add_file_sizes(stats, encoded_file, decode_file)
+        return
+
+    with open(encoded_file, 'rb') as fin:
+        if file_format == FORMAT_RAW:
+            with open(decode_file, 'wb' if binary else 'w') as fout:
+                for chunk in raw_chunks(fin, DECODE_CHUNK_SIZE):
+                    with timed_stage(stats, 'write'):
+                        fout.write(chunk if binary else chunk.decode('latin-1'))
+        else:
+            bit, stream = open_stream(fin, stats)
+            if binary and MMAP_DECODE:
+                decode_to_mmap(bit, stream, decode_file, stats)
+            else:
+                # written a chunk at a time, so memory use does not grow with the size of the file
+                with open(decode_file, 'wb' if binary else 'w') as fout:
+                    for chunk in stream_chunks(bit, stream, DECODE_CHUNK_SIZE, stats):
+                        with timed_stage(stats, 'write'):
+                            fout.write(chunk if binary else chunk.decode('latin-1'))
+            bit.close()
+    add_file_sizes(stats, encoded_file, decode_file)
+
+
+def add_file_sizes(stats, encoded_file, decode_file):
+    """Adds the sizes of the compressed and decoded files to the bytes_in and bytes_out counters of stats, if any"""
+    if stats is not None:
+        stats.add('bytes_in', os.path.getsize(encoded_file))
+        stats.add('bytes_out', os.path.getsize(decode_file))
@@ -0,0 +1,216 @@
+#
+#   One-pass adaptive Huffman coding (FGK algorithm)
+#
+#   Encoder and decoder both start from a tree holding only the NYT ("not yet transmitted") node
+#   and update it in the same way after every symbol, so no frequency header is needed and the
+#   input can be a pipe or a file that is still being written. A symbol seen for the first time
+#   is sent as the code of the NYT node followed by its value in SYMBOL_BITS raw bits; the end of
+#   the stream is sent the same way as the pseudo-symbol EOF_SYMBOL.
+#
+#   Layout of an adaptive file: FORMAT_ADAPTIVE byte, then the code bits, zero padded to a byte
+#
+#   From the shell:  python3 huffman_adaptive.py encode < input > output
+#                    python3 huffman_adaptive.py decode < input > output
+#
+
+import sys
+from huffman import *
+
+SYMBOL_BITS = 9         # raw bits used to send a new symbol, enough for the 256 bytes and EOF_SYMBOL
+EOF_SYMBOL = 256
+
+
+class AdaptiveHuffmanTree:
+    # Nodes are numbered 0, 1, 2, ... in the order they are made and described by parallel lists
+    # order lists the nodes by decreasing FGK node number (the root first), so weights never increase along it
+    def __init__(self):
+        self.weight = [0]
+        self.parent = [None]
+        self.left = [None]
+        self.right = [None]
+        self.symbols = [None]
+        self.order = [0]
+        self.position = [0]   # position[node] is the index of node in order
+        self.leaf = {}        # symbol -> its leaf node
+        self.nyt = 0
+        self.root = 0
+
+    def new_node(self, parent):
+        node = len(self.weight)
+        self.weight.append(0)
+        self.parent.append(parent)
+        self.left.append(None)
+        self.right.append(None)
+        self.symbols.append(None)
+        self.position.append(len(self.order))
+        self.order.append(node)
+        return node
+
+    # Returns the code of node as a (value, length) pair, found by walking up to the root
+    def node_code(self, node):
+        value = 0
+        length = 0
+        parent = self.parent[node]
+        while parent is not None:
+            if self.right[parent] == node:
+                value |= 1 << length
+            length += 1
+            node = parent
+            parent = self.parent[node]
+        return (value, length)
+
+    # Writes the code for symbol with the HuffmanBitWriter bit and updates the tree
+    def encode(self, symbol, bit):
+        if symbol in self.leaf:
+            bit.write_bits(*self.node_code(self.leaf[symbol]))
+        else:
+            value, length = self.node_code(self.nyt)
+            bit.write_bits((value << SYMBOL_BITS) | symbol, length + SYMBOL_BITS)
+        self.update(symbol)
+
+    # Reads one symbol from the HuffmanBitReader bit and updates the tree
+    def decode(self, bit):
+        node = self.root
+        while self.left[node] is not None:
+            if bit.read_bit():
+                node = self.right[node]
+            else:
+                node = self.left[node]
+        if node == self.nyt:
+            symbol = bit.read_bits(SYMBOL_BITS)
+        else:
+            symbol = self.symbols[node]
+        self.update(symbol)
+        return symbol
+
+    # Adds one to the count of symbol, swapping nodes so the sibling property still holds
+    def update(self, symbol):
+        if symbol in self.leaf:
+            node = self.leaf[symbol]
+        else:
+            # the NYT node becomes an internal node with a new NYT node on the left and the new leaf on the right
+            old = self.nyt
+            node = self.new_node(old)
+            self.nyt = self.new_node(old)
+            self.left[old] = self.nyt
+            self.right[old] = node
+            self.leaf[symbol] = node
+            self.symbols[node] = symbol
+        weight = self.weight
+        order = self.order
+        while node is not None:
+            # the leader of a block is the node with the highest number among those with the same weight
+            lead = self.position[node]
+            while lead > 0 and weight[order[lead - 1]] == weight[node]:
+                lead -= 1
+            leader = order[lead]
+            if leader != node and leader != self.parent[node]:
+                self.swap(node, leader)
+            weight[node] += 1
+            node = self.parent[node]
+
+    # Exchanges the places of nodes a and b in the tree and in the node order
+    def swap(self, a, b):
+        pa = self.parent[a]
+        pb = self.parent[b]
+        if pa == pb:
+            self.left[pa], self.right[pa] = self.right[pa], self.left[pa]
+        else:
+            if self.left[pa] == a:
+                self.left[pa] = b
+            else:
+                self.right[pa] = b
+            if self.left[pb] == b:
+                self.left[pb] = a
+            else:
+                self.right[pb] = a
+            self.parent[a] = pb
+            self.parent[b] = pa
+        ia = self.position[a]
+        ib = self.position[b]
+        self.order[ia] = b
+        self.order[ib] = a
+        self.position[a] = ib
+        self.position[b] = ia
+
+
+def adaptive_encode(fin, fout, chunk_size=CHUNK_SIZE):
+    """Reads the binary file object fin until it ends and writes it to the binary file object fout in the adaptive format
+    Each chunk is pushed out to fout as soon as it is encoded, so a reader on the other end of a pipe is kept up to date"""
+    tree = AdaptiveHuffmanTree()
+    bit = HuffmanBitWriter(fout)
+    bit.write_bytes(bytes([FORMAT_ADAPTIVE]))
+    read = getattr(fin, 'read1', fin.read)   # take what a pipe has now rather than wait for a full chunk
+    chunk = read(chunk_size)
+    while len(chunk) > 0:
+        for byte in chunk:
+            tree.encode(byte, bit)
+        bit.move_bytes()
+        bit.flush()
+        fout.flush()
+        chunk = read(chunk_size)
+    tree.encode(EOF_SYMBOL, bit)
+    bit.close()
+    fout.flush()
+
+
+def adaptive_chunks(fin, chunk_size=CHUNK_SIZE):
+    """Yields the bytes decoded from the adaptive format in the binary file object fin, positioned at the format byte,
+    chunk_size bytes at a time (the last chunk may be shorter)"""
+    bit = HuffmanBitReader(fin)
+    if bit.read_byte() != FORMAT_ADAPTIVE:
+        raise ValueError('not an adaptive-format stream')
+    tree = AdaptiveHuffmanTree()
+    out = bytearray()
+    symbol = tree.decode(bit)
+    while symbol != EOF_SYMBOL:
+        out.append(symbol)
+        if len(out) >= chunk_size:
+            yield bytes(out)
+            out = bytearray()
+        symbol = tree.decode(bit)
+    if len(out) > 0:
+        yield bytes(out)
+    bit.close()
+
+
+def adaptive_decode(fin, fout, chunk_size=CHUNK_SIZE):
+    """Decodes the adaptive format from the binary file object fin, positioned at the format byte, to the binary file object fout
+    Decoded bytes are written out every chunk_size bytes"""
+    for chunk in adaptive_chunks(fin, chunk_size):
+        fout.write(chunk)
+        fout.flush()
+    fout.flush()
+
+
+def huffman_encode_adaptive(in_file, out_file):
+    """Compresses the file in_file to out_file in one pass with adaptive Huffman coding"""
+    try:
+        fin = open(in_file, 'rb')
+        fout = open(out_file, 'wb')
+    except:
+        raise FileNotFoundError
+    adaptive_encode(fin, fout)
+    fout.close()
+    fin.close()
+
+
+def huffman_decode_adaptive(encoded_file, decode_file):
+    """Decodes an adaptive-format file written by huffman_encode_adaptive"""
+    try:
+        fin = open(encoded_file, 'rb')
+        fout = open(decode_file, 'wb')
+    except:
+        raise FileNotFoundError
+    adaptive_decode(fin, fout)
+    fout.close()
+    fin.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] not in ('encode', 'decode'):
+        sys.exit('usage: python3 huffman_adaptive.py encode|decode < input > output')
+    if sys.argv[1] == 'encode':
+        adaptive_encode(sys.stdin.buffer, sys.stdout.buffer)
+    else:
+        adaptive_decode(sys.stdin.buffer, sys.stdout.buffer)
@@ -0,0 +1,51 @@
+import unittest
+import filecmp
+import io
+import os
+import random
+import tempfile
+from huffman_adaptive import *
+
+class TestList(unittest.TestCase):
+    def test_adaptive_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            encoded = os.path.join(tmp, 'encoded.bin')
+            decoded = os.path.join(tmp, 'decoded.txt')
+            for name in ['file1.txt', 'file2.txt', 'multiline.txt', 'declaration.txt', 'single_char.txt', 'empty_file.txt']:
+                huffman_encode_adaptive(name, encoded)
+                huffman_decode_adaptive(encoded, decoded)
+                self.assertTrue(filecmp.cmp(name, decoded, shallow=False))
+                huffman_decode(encoded, decoded)
+                self.assertTrue(filecmp.cmp(name, decoded, shallow=False))
+
+    def test_adaptive_streams(self):
+        rng = random.Random(1)
+        data = bytes(rng.randrange(256) for _ in range(5000)) + bytes(int(rng.expovariate(0.1)) % 256 for _ in range(20000))
+        encoded = io.BytesIO()
+        adaptive_encode(io.BytesIO(data), encoded, chunk_size=777)
+        self.assertEqual(encoded.getvalue()[0], FORMAT_ADAPTIVE)
+        encoded.seek(0)
+        decoded = io.BytesIO()
+        adaptive_decode(encoded, decoded, chunk_size=100)
+        self.assertEqual(decoded.getvalue(), data)
+
+    def test_adaptive_tree(self):
+        # after "aab" the root has node(1) on the left, with NYT and b under it, and a(2) on the right
+        tree = AdaptiveHuffmanTree()
+        for symbol in b'aab':
+            tree.update(symbol)
+        self.assertEqual(tree.weight[tree.root], 3)
+        self.assertEqual(tree.node_code(tree.leaf[ord('a')]), (1, 1))
+        self.assertEqual(tree.node_code(tree.leaf[ord('b')]), (1, 2))
+        self.assertEqual(tree.node_code(tree.nyt), (0, 2))
+        weights = [tree.weight[node] for node in tree.order]
+        self.assertEqual(weights, sorted(weights, reverse=True))
+
+    def test_adaptive_errors(self):
+        with self.assertRaises(FileNotFoundError):
+            huffman_encode_adaptive('ddafd.txt', 'ddafd_out.txt')
+        with self.assertRaises(ValueError):
+            adaptive_decode(io.BytesIO(b'97 3\n'), io.BytesIO())
+
+if __name__ == '__main__': 
+   unittest.main()
@@ -0,0 +1,276 @@
+#
+#   Appending to a compressed file without recompressing it
+#
+#   A segment file is a run of self-describing segments, so new data can be coded on its own and
+#   added at the end. Each segment either carries a new code table, reuses the table of the last
+#   segment that had one, or stores its bytes raw, whichever makes it smallest (choose_segment).
+#   Every append ends with a footer that points at the segment holding the current table, so the
+#   next append reads the footer and that one table, codes the new data and writes after the end of
+#   the file. Nothing already written is changed, and the cost of an append depends only on the
+#   size of the new data. The decoder reads the segments in order and joins what they hold.
+#
+#   Layout of a segment file:
+#       FORMAT_SEGMENTS byte
+#       segments, each starting with its kind byte:
+#           SEGMENT_TABLE   code lengths (encode_code_lengths), number of bytes, payload size (varints), code bits
+#           SEGMENT_REUSE   number of bytes, payload size (varints), code bits with the current table
+#           SEGMENT_RAW     number of bytes (varint), then the bytes themselves
+#           SEGMENT_FOOTER  offset of the current table's segment (8 bytes, 0 for none), FOOTER_MAGIC
+#       the code bits of a segment are zero padded to a byte; only the last footer is read by an append
+#
+#   From the shell:  python3 huffman_append.py append encoded_file in_file
+#                    python3 huffman_append.py decode encoded_file out_file
+#                    python3 huffman_append.py list encoded_file
+#
+
+import io
+import os
+import struct
+import sys
+from huffman import *
+
+SEGMENT_TABLE = 1
+SEGMENT_REUSE = 2
+SEGMENT_RAW = 3
+SEGMENT_FOOTER = 4
+SEGMENT_NAMES = {SEGMENT_TABLE: 'table', SEGMENT_REUSE: 'reuse', SEGMENT_RAW: 'raw', SEGMENT_FOOTER: 'footer'}
+FOOTER_MAGIC = b'HSEG'
+FOOTER_STRUCT = struct.Struct('>BQ4s')   # kind, table offset, magic
+
+
+def table_bits(char_freq, lengths):
+    """Returns the number of code bits the characters counted in char_freq take with the code lengths lengths, or
+    None if a counted character has no code; a table with a single code takes no bits, as in encode_bytes"""
+    bits = 0
+    for i in range(len(char_freq)):
+        if char_freq[i] != 0:
+            if i >= len(lengths) or lengths[i] == 0:
+                return None
+            bits += char_freq[i] * lengths[i]
+    if sum(1 for length in lengths if length != 0) < 2:
+        return 0
+    return bits
+
+
+def choose_segment(char_freq, table=None):
+    """Picks the smallest way to store data with the counts char_freq after a segment file whose current code lengths
+    are table (None if it has none): reusing table, a new table, or raw bytes; on a tie the earlier one in that order
+    Returns (segment kind, code lengths or None for raw, payload size in bytes)"""
+    options = []
+    if table is not None:
+        bits = table_bits(char_freq, table)
+        if bits is not None:
+            options.append(((bits + 7) // 8, SEGMENT_REUSE, table, (bits + 7) // 8))
+    lengths = create_code_lengths(tree_codebook(char_freq).tree)
+    payload = (table_bits(char_freq, lengths) + 7) // 8
+    options.append((len(encode_code_lengths(lengths)) + payload, SEGMENT_TABLE, lengths, payload))
+    options.append((sum(char_freq), SEGMENT_RAW, None, sum(char_freq)))
+    cost, kind, lengths, payload = min(options, key=lambda option: option[0])
+    return (kind, lengths, payload)
+
+
+def read_footer(fin):
+    """Reads the footer at the end of the segment file object fin; returns the offset of the current table's segment"""
+    fin.seek(0)
+    if fin.read(1) != bytes([FORMAT_SEGMENTS]):
+        raise ValueError('not a segment file')
+    fin.seek(-FOOTER_STRUCT.size, os.SEEK_END)
+    kind, offset, magic = FOOTER_STRUCT.unpack(fin.read(FOOTER_STRUCT.size))
+    if kind != SEGMENT_FOOTER or magic != FOOTER_MAGIC:
+        raise ValueError('segment file does not end with a footer; an append may have been cut short')
+    return offset
+
+
+def read_table(fin, offset):
+    """Returns the code lengths of the SEGMENT_TABLE segment at offset in the file object fin, or None if offset is 0"""
+    if offset == 0:
+        return None
+    fin.seek(offset)
+    bit = HuffmanBitReader(fin, block_size=1 << 12)
+    if bit.read_byte() != SEGMENT_TABLE:
+        raise ValueError('segment file footer does not point at a table')
+    lengths = read_code_lengths(bit)
+    bit.close()
+    return lengths
+
+
+def append_segment(encoded_file, char_freq, chunks):
+    """Appends one segment to the segment file encoded_file (made if it does not exist or is empty) and a new footer
+    char_freq counts the bytes to append and chunks() returns an iterator over them, as bytes pieces
+    Returns the kind of segment written, or None if there was nothing to append"""
+    table_offset = 0
+    table = None
+    char_num = sum(char_freq)
+    if os.path.exists(encoded_file) and os.path.getsize(encoded_file) > 0:
+        with open(encoded_file, 'rb') as fin:
+            table_offset = read_footer(fin)
+            if char_num == 0:
+                return None
+            table = read_table(fin, table_offset)
+        new_file = False
+    else:
+        new_file = True
+    try:
+        fout = open(encoded_file, 'ab')
+    except:
+        raise FileNotFoundError
+    if new_file:
+        fout.write(bytes([FORMAT_SEGMENTS]))
+    kind = None
+    if char_num > 0:
+        kind, lengths, payload = choose_segment(char_freq, table)
+        offset = fout.tell()
+        header = bytearray([kind])
+        if kind == SEGMENT_TABLE:
+            header += encode_code_lengths(lengths)
+            table_offset = offset
+        header += encode_varint(char_num)
+        if kind == SEGMENT_RAW:
+            fout.write(bytes(header))
+            for chunk in chunks():
+                fout.write(chunk)
+        else:
+            fout.write(bytes(header) + encode_varint(payload))
+            if payload > 0:
+                bit = HuffmanBitWriter(fout)
+                book = canonical_codebook(lengths)
+                for chunk in chunks():
+                    write_chunk(bit, chunk, book)
+                bit.close()
+    fout.write(FOOTER_STRUCT.pack(SEGMENT_FOOTER, table_offset, FOOTER_MAGIC))
+    fout.close()
+    return kind
+
+
+def append_bytes(encoded_file, data):
+    """Appends the bytes in data to the segment file encoded_file as a new segment; returns the kind of segment written"""
+    return append_segment(encoded_file, count_bytes(io.BytesIO(data)),
+                          lambda: (data[start:start + CHUNK_SIZE] for start in range(0, len(data), CHUNK_SIZE)))
+
+
+def append_file(encoded_file, in_file):
+    """Appends the contents of the file in_file to the segment file encoded_file, read CHUNK_SIZE bytes at a time
+    The file is read twice, once to count its bytes and once to code them; returns the kind of segment written"""
+    char_freq = cnt_freq(in_file, True)
+    def chunks():
+        with open(in_file, 'rb') as fin:
+            for chunk in iter(lambda: fin.read(CHUNK_SIZE), b''):
+                yield chunk
+    return append_segment(encoded_file, char_freq, chunks)
+
+
+def huffman_encode_segments(in_file, out_file):
+    """Compresses in_file to a new segment file out_file (replacing it) that later data can be appended to"""
+    try:
+        open(out_file, 'wb').close()
+    except:
+        raise FileNotFoundError
+    append_file(out_file, in_file)
+
+
+def segment_chunks(fin, chunk_size=CHUNK_SIZE):
+    """Yields the bytes decoded from the segment file object fin, positioned at the format byte, segment by segment
+    and at most chunk_size bytes at a time"""
+    bit = HuffmanBitReader(fin)
+    if bit.read_byte() != FORMAT_SEGMENTS:
+        raise ValueError('not a segment file')
+    lengths = None
+    while bit.peek_byte() is not None:
+        kind = bit.read_byte()
+        if kind == SEGMENT_FOOTER:
+            bit.skip_bits(8 * (FOOTER_STRUCT.size - 1))
+            continue
+        if kind == SEGMENT_TABLE:
+            lengths = read_code_lengths(bit)
+        elif kind == SEGMENT_REUSE and lengths is None:
+            raise ValueError('segment file is damaged: a segment reuses a table before there is one')
+        elif kind not in SEGMENT_NAMES:
+            raise ValueError('segment file is damaged: unknown segment kind %d' % kind)
+        char_num = read_varint(bit)
+        if kind == SEGMENT_RAW:
+            while char_num > 0:
+                n = min(chunk_size, char_num)
+                bit.fill(n)
+                start = bit.bit_pos >> 3
+                chunk = bit.buf[start:start + n]
+                if len(chunk) < n:
+                    raise ValueError('segment file ends inside a segment')
+                bit.skip_bits(8 * n)
+                char_num -= n
+                yield chunk
+            continue
+        read_varint(bit)   # payload size, only needed to skip the segment
+        present = [i for i in range(len(lengths)) if lengths[i] != 0]
+        if len(present) == 1:
+            stream = (None, char_num, present[0])
+        else:
+            stream = (canonical_codebook(lengths).decode_table(), char_num, None)
+        for chunk in stream_chunks(bit, stream, chunk_size):
+            yield chunk
+        bit.align()
+    bit.close()
+
+
+def list_segments(encoded_file):
+    """Returns a list of (kind name, offset, number of bytes, segment size in bytes) for the segments of encoded_file,
+    footers included, found by skipping over the payloads without decoding them"""
+    try:
+        fin = open(encoded_file, 'rb')
+    except:
+        raise FileNotFoundError
+    segments = []
+    with fin:
+        size = os.fstat(fin.fileno()).st_size
+        read_footer(fin)
+        offset = 1
+        while offset < size:
+            fin.seek(offset)
+            bit = HuffmanBitReader(fin, block_size=1 << 12)
+            kind = bit.read_byte()
+            if kind == SEGMENT_FOOTER:
+                segments.append((SEGMENT_NAMES[kind], offset, 0, FOOTER_STRUCT.size))
+                offset += FOOTER_STRUCT.size
+                continue
+            header = 1
+            if kind == SEGMENT_TABLE:
+                header += len(encode_code_lengths(read_code_lengths(bit)))
+            char_num = read_varint(bit)
+            header += len(encode_varint(char_num))
+            if kind == SEGMENT_RAW:
+                payload = char_num
+            else:
+                payload = read_varint(bit)
+                header += len(encode_varint(payload))
+            segments.append((SEGMENT_NAMES[kind], offset, char_num, header + payload))
+            offset += header + payload
+    return segments
+
+
+def huffman_decode_segments(encoded_file, decode_file):
+    """Decodes every segment of the segment file encoded_file, in order, to decode_file"""
+    try:
+        fin = open(encoded_file, 'rb')
+        fout = open(decode_file, 'wb')
+    except:
+        raise FileNotFoundError
+    for chunk in segment_chunks(fin, DECODE_CHUNK_SIZE):
+        fout.write(chunk)
+    fout.close()
+    fin.close()
+
+
+if __name__ == '__main__':
+    usage = 'usage: python3 huffman_append.py append encoded_file in_file\n' \
+            '       python3 huffman_append.py decode encoded_file out_file\n' \
+            '       python3 huffman_append.py list encoded_file'
+    if len(sys.argv) < 3 or sys.argv[1] not in ('append', 'decode', 'list'):
+        sys.exit(usage)
+    if sys.argv[1] == 'list':
+        for name, offset, char_num, size in list_segments(sys.argv[2]):
+            print('%-6s at %10d: %10d bytes in %10d bytes' % (name, offset, char_num, size))
+    elif len(sys.argv) != 4:
+        sys.exit(usage)
+    elif sys.argv[1] == 'append':
+        print(SEGMENT_NAMES.get(append_file(sys.argv[2], sys.argv[3]), 'nothing appended'))
+    else:
+        huffman_decode_segments(sys.argv[2], sys.argv[3])
@@ -0,0 +1,81 @@
+import unittest
+import filecmp
+import os
+import tempfile
+from huffman_append import *
+
+class TestList(unittest.TestCase):
+    def test_choose_segment(self):
+        freqs = count_bytes(io.BytesIO(b'abracadabra' * 20))
+        kind, lengths, payload = choose_segment(freqs)
+        self.assertEqual(kind, SEGMENT_TABLE)
+        self.assertEqual(payload, (table_bits(freqs, lengths) + 7) // 8)
+        self.assertEqual(choose_segment(freqs, lengths), (SEGMENT_REUSE, lengths, payload))
+        # a table without a code for 'z' cannot be reused
+        self.assertEqual(choose_segment(count_bytes(io.BytesIO(b'zz' * 100)), lengths)[0], SEGMENT_TABLE)
+        self.assertEqual(choose_segment(count_bytes(io.BytesIO(bytes(range(256)))), lengths)[0], SEGMENT_RAW)
+        self.assertIsNone(table_bits(count_bytes(io.BytesIO(b'z')), lengths))
+        self.assertEqual(table_bits(freqs, [0] * 97 + [1]), None)
+
+    def test_append(self):
+        with open('declaration.txt', 'rb') as f:
+            text = f.read()
+        parts = [text[:3000], text[:3000], bytes(range(256)), b'', text[6000:], b'd' * 40, text[:100]]
+        with tempfile.TemporaryDirectory() as tmp:
+            encoded = os.path.join(tmp, 'log.seg')
+            decoded = os.path.join(tmp, 'decoded.txt')
+            kinds = [append_bytes(encoded, part) for part in parts]
+            self.assertEqual(kinds, [SEGMENT_TABLE, SEGMENT_REUSE, SEGMENT_RAW, None, SEGMENT_TABLE, SEGMENT_TABLE,
+                                     SEGMENT_RAW])
+            data = b''.join(parts)
+            self.assertEqual(b''.join(iter_decode(encoded)), data)
+            chunks = list(iter_decode(encoded, chunk_size=500))
+            self.assertEqual(b''.join(chunks), data)
+            self.assertTrue(all(len(chunk) == 500 for chunk in chunks[:-1]))
+            huffman_decode(encoded, decoded)
+            with open(decoded, 'rb') as f:
+                self.assertEqual(f.read(), data)
+            segments = list_segments(encoded)
+            self.assertEqual([segment[0] for segment in segments if segment[0] != 'footer'],
+                             ['table', 'reuse', 'raw', 'table', 'table', 'raw'])
+            self.assertEqual(sum(segment[2] for segment in segments), len(data))
+            self.assertEqual(1 + sum(segment[3] for segment in segments), os.path.getsize(encoded))
+            # appending only adds to the end of the file
+            with open(encoded, 'rb') as f:
+                before = f.read()
+            append_bytes(encoded, text[:50])
+            with open(encoded, 'rb') as f:
+                self.assertEqual(f.read(len(before)), before)
+            # a file cut short inside an append is refused rather than added to
+            with open(encoded, 'ab') as f:
+                f.write(b'\x01\x02')
+            with self.assertRaises(ValueError):
+                append_bytes(encoded, text)
+            with self.assertRaises(ValueError):
+                append_bytes('declaration_compressed_soln.txt', text)
+
+    def test_append_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            encoded = os.path.join(tmp, 'log.seg')
+            decoded = os.path.join(tmp, 'decoded.txt')
+            joined = os.path.join(tmp, 'joined.txt')
+            empty = os.path.join(tmp, 'empty.txt')
+            open(empty, 'wb').close()
+            huffman_encode_segments('declaration.txt', encoded)
+            huffman_decode_segments(encoded, decoded)
+            self.assertTrue(filecmp.cmp('declaration.txt', decoded, shallow=False))
+            for name in ('file1.txt', empty, 'multiline.txt'):
+                append_file(encoded, name)
+            with open(joined, 'wb') as fout:
+                for name in ('declaration.txt', 'file1.txt', empty, 'multiline.txt'):
+                    with open(name, 'rb') as fin:
+                        fout.write(fin.read())
+            huffman_decode_segments(encoded, decoded)
+            self.assertTrue(filecmp.cmp(joined, decoded, shallow=False))
+            huffman_encode_segments(empty, encoded)
+            self.assertEqual(list(iter_decode(encoded)), [])
+        with self.assertRaises(FileNotFoundError):
+            append_file(os.path.join('no_such_dir', 'log.seg'), 'declaration.txt')
+
+if __name__ == '__main__': 
+   unittest.main()
@@ -0,0 +1,171 @@
+#
+#   asyncio streaming API for Huffman compression
+#
+#   encode_stream and decode_stream work on an asyncio.StreamReader (or anything with an async
+#   read(n)) or an async iterable of bytes chunks, and write to an asyncio.StreamWriter. The input
+#   is cut into blocks of block_size bytes and each block is coded with encode_bytes/decode_bytes
+#   on an executor (the loop's default thread pool unless one is given), so the event loop only
+#   moves bytes around. The next block is not read until the last one has been written and the
+#   writer has drained, which bounds memory use and passes backpressure on to the source.
+#   encode_chunks and decode_chunks are the same as async generators of output chunks.
+#
+#   Layout of a stream file: FORMAT_STREAM byte, then for each block its compressed length as a
+#   varint followed by the encode_bytes output, then a length of 0 to mark the end of the stream
+#
+
+import asyncio
+from huffman import *
+
+STREAM_BLOCK_SIZE = 1 << 18   # bytes of input per block
+READ_SIZE = 1 << 16           # bytes asked of a StreamReader at a time
+
+
+class ChunkReader:
+    # Reads bytes from an asyncio.StreamReader (or anything with an async read(n)) or from an async iterable of
+    # bytes chunks, keeping what has been read but not yet asked for in buf
+    def __init__(self, source, read_size=READ_SIZE):
+        self.buf = bytearray()
+        self.eof = False
+        if hasattr(source, 'read'):
+            self.source = None
+            self.read_chunk = lambda: source.read(read_size)
+        else:
+            self.source = source.__aiter__()
+            self.read_chunk = self.next_chunk
+
+    # Returns the next non-empty chunk of the async iterable, or b'' once it is used up
+    async def next_chunk(self):
+        chunk = b''
+        try:
+            while len(chunk) == 0:
+                chunk = await self.source.__anext__()
+        except StopAsyncIteration:
+            return b''
+        return chunk
+
+    # Returns the next n bytes, or fewer if the source ends first
+    async def read(self, n):
+        while len(self.buf) < n and not self.eof:
+            chunk = await self.read_chunk()
+            if len(chunk) == 0:
+                self.eof = True
+            self.buf += chunk
+        data = bytes(self.buf[:n])
+        del self.buf[:n]
+        return data
+
+    # Reads an integer written by encode_varint; returns None if the source ends before it starts
+    async def read_varint(self):
+        n = 0
+        shift = 0
+        while True:
+            byte = await self.read(1)
+            if len(byte) == 0:
+                if shift == 0:
+                    return None
+                raise ValueError('stream ends inside a block length')
+            n |= (byte[0] & 0x7f) << shift
+            if byte[0] < 0x80:
+                return n
+            shift += 7
+
+
+async def encode_chunks(source, block_size=STREAM_BLOCK_SIZE, executor=None):
+    """Async generator that compresses the bytes read from source to the stream format, yielding the output a block at a time
+    source is an asyncio.StreamReader or an async iterable of bytes chunks; the blocks are coded on executor"""
+    loop = asyncio.get_running_loop()
+    reader = ChunkReader(source)
+    yield bytes([FORMAT_STREAM])
+    block = await reader.read(block_size)
+    while len(block) > 0:
+        compressed = await loop.run_in_executor(executor, encode_bytes, block)
+        yield encode_varint(len(compressed)) + compressed
+        block = await reader.read(block_size)
+    yield encode_varint(0)
+
+
+async def decode_chunks(source, executor=None):
+    """Async generator that decodes a stream-format source, yielding the original bytes a block at a time
+    source is an asyncio.StreamReader or an async iterable of bytes chunks; the blocks are decoded on executor"""
+    loop = asyncio.get_running_loop()
+    reader = ChunkReader(source)
+    if await reader.read(1) != bytes([FORMAT_STREAM]):
+        raise ValueError('not a stream-format stream')
+    while True:
+        length = await reader.read_varint()
+        if length is None:
+            raise ValueError('stream ends before its end marker')
+        if length == 0:
+            return
+        compressed = await reader.read(length)
+        if len(compressed) < length:
+            raise ValueError('stream ends inside a block')
+        yield await loop.run_in_executor(executor, decode_bytes, compressed)
+
+
+async def encode_stream(source, writer, block_size=STREAM_BLOCK_SIZE, executor=None):
+    """Compresses source to the asyncio.StreamWriter writer (anything with write() and an async drain()), waiting
+    for the writer to drain after every block"""
+    async for chunk in encode_chunks(source, block_size, executor):
+        writer.write(chunk)
+        await writer.drain()
+
+
+async def decode_stream(source, writer, executor=None):
+    """Decodes the stream-format source to the asyncio.StreamWriter writer, waiting for the writer to drain after every block"""
+    async for chunk in decode_chunks(source, executor):
+        writer.write(chunk)
+        await writer.drain()
+
+
+def huffman_encode_stream(in_file, out_file, block_size=STREAM_BLOCK_SIZE):
+    """Compresses in_file to a stream-format file out_file without asyncio, as encode_stream would"""
+    try:
+        fin = open(in_file, 'rb')
+        fout = open(out_file, 'wb')
+    except:
+        raise FileNotFoundError
+    fout.write(bytes([FORMAT_STREAM]))
+    block = fin.read(block_size)
+    while len(block) > 0:
+        compressed = encode_bytes(block)
+        fout.write(encode_varint(len(compressed)))
+        fout.write(compressed)
+        block = fin.read(block_size)
+    fout.write(encode_varint(0))
+    fout.close()
+    fin.close()
+
+
+def stream_blocks(fin, chunk_size=CHUNK_SIZE):
+    """Yields the decoded bytes of a stream-format file from the binary file object fin, positioned at its start,
+    chunk_size bytes at a time; one block is decoded at a time"""
+    bit = HuffmanBitReader(fin)
+    if bit.read_byte() != FORMAT_STREAM:
+        raise ValueError('not a stream-format file')
+    length = read_varint(bit)
+    while length > 0:
+        bit.fill(length)
+        start = bit.bit_pos >> 3
+        compressed = bit.buf[start:start + length]
+        if len(compressed) < length:
+            raise ValueError('file ends inside a block')
+        bit.skip_bits(8 * length)
+        block = decode_bytes(compressed)
+        for start in range(0, len(block), chunk_size):
+            yield block[start:start + chunk_size]
+        length = read_varint(bit)
+    bit.close()
+
+
+def huffman_decode_stream(encoded_file, decode_file):
+    """Decodes a stream-format file written by encode_stream or huffman_encode_stream to decode_file"""
+    try:
+        fin = open(encoded_file, 'rb')
+        fout = open(decode_file, 'wb')
+    except:
+        raise FileNotFoundError
+    for chunk in stream_blocks(fin):
+        fout.write(chunk)
+    fout.close()
+    fin.close()
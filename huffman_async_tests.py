@@ -0,0 +1,85 @@
+import unittest
+import asyncio
+import filecmp
+import os
+import tempfile
+from huffman_async import *
+
+class MemoryWriter:
+    # Collects what is written, like an asyncio.StreamWriter, and counts the drain() calls
+    def __init__(self):
+        self.data = bytearray()
+        self.drains = 0
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        self.drains += 1
+
+
+async def pieces(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+        await asyncio.sleep(0)
+
+
+def stream_reader(data):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+class TestList(unittest.TestCase):
+    def test_stream_round_trip(self):
+        async def round_trip(data):
+            encoded = MemoryWriter()
+            await encode_stream(pieces(data, 1000), encoded, block_size=4096)
+            decoded = MemoryWriter()
+            await decode_stream(stream_reader(bytes(encoded.data)), decoded)
+            self.assertEqual(encoded.drains, (len(data) + 4095) // 4096 + 2)
+            return bytes(encoded.data), bytes(decoded.data)
+        for name in ['declaration.txt', 'file1.txt', 'single_char.txt', 'empty_file.txt']:
+            with open(name, 'rb') as f:
+                data = f.read()
+            encoded, decoded = asyncio.run(round_trip(data))
+            self.assertEqual(decoded, data)
+            with tempfile.TemporaryDirectory() as tmp:
+                encoded_file = os.path.join(tmp, 'encoded.bin')
+                decoded_file = os.path.join(tmp, 'decoded.txt')
+                huffman_encode_stream(name, encoded_file, block_size=4096)
+                with open(encoded_file, 'rb') as f:
+                    self.assertEqual(f.read(), encoded)
+                huffman_decode(encoded_file, decoded_file)
+                self.assertTrue(filecmp.cmp(name, decoded_file, shallow=False))
+
+    def test_chunks(self):
+        async def collect(generator):
+            return [chunk async for chunk in generator]
+        data = b'abracadabra' * 100
+        encoded = asyncio.run(collect(encode_chunks(pieces(data, 7), block_size=256)))
+        self.assertEqual(len(encoded), 1 + 5 + 1)
+        decoded = asyncio.run(collect(decode_chunks(pieces(b''.join(encoded), 3))))
+        self.assertEqual([len(chunk) for chunk in decoded], [256, 256, 256, 256, 76])
+        self.assertEqual(b''.join(decoded), data)
+
+    def test_stream_errors(self):
+        async def decode(data):
+            await decode_stream(pieces(data, 10), MemoryWriter())
+        async def encode(data):
+            out = MemoryWriter()
+            await encode_stream(pieces(data, 10), out)
+            return bytes(out.data)
+        encoded = asyncio.run(encode(b'hello world'))
+        with self.assertRaises(ValueError):
+            asyncio.run(decode(b'\x01' + encoded[1:]))
+        with self.assertRaises(ValueError):
+            asyncio.run(decode(encoded[:-1]))
+        with self.assertRaises(ValueError):
+            asyncio.run(decode(encoded[:-4]))
+        with self.assertRaises(FileNotFoundError):
+            huffman_decode_stream('ddafd_compressed.txt', 'ddafd_decoded.txt')
+
+if __name__ == '__main__': 
+   unittest.main()
@@ -0,0 +1,210 @@
+#
+#   Batch compression of many small files with a shared dictionary
+#
+#   For tiny files the header is bigger than the compressed data, so instead every file in a batch
+#   is coded with one set of canonical code lengths trained from a sample of the files. The lengths
+#   are stored once, in a dictionary file, and each compressed file names its dictionary by ID.
+#   Training adds 1 to every count so that every byte has a code, even bytes missing from the sample.
+#
+#   Layout of a dictionary file:  FORMAT_DICTIONARY byte, dictionary ID (4 bytes), then the code
+#                                 lengths as a canonical header (create_canonical_header) for 0 characters
+#   Layout of a compressed file:  FORMAT_SHARED byte, dictionary ID (4 bytes), number of characters
+#                                 as a varint, then the code bits, zero padded to a byte
+#   The dictionary ID is the CRC-32 of the canonical header, so equal dictionaries get equal IDs.
+#
+#   From the shell:  python3 huffman_batch.py train dictionary_file in_dir [n_sample_files]
+#                    python3 huffman_batch.py compress dictionary_file in_dir out_dir [workers]
+#                    python3 huffman_batch.py decompress dictionary_file in_dir out_dir [workers]
+#
+
+import functools
+import io
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+from huffman import *
+from huffman_blocks import parallel_map
+
+DICTIONARY_MAX_CODE_LEN = 15   # cap on the code lengths of a trained dictionary
+BATCH_SUFFIX = '.huf'          # added to the name of each file compressed by compress_directory
+ID_STRUCT = struct.Struct('>I')
+
+
+class SharedDictionary:
+    # Code lengths for all 256 byte values, shared by every file of a batch
+    # dict_id is the CRC-32 of the lengths written as a canonical header
+    def __init__(self, lengths):
+        if len(lengths) != 256 or 0 in lengths:
+            raise ValueError('a shared dictionary needs a code for every byte value')
+        self.lengths = list(lengths)
+        self.header = create_canonical_header(self.lengths, 0)
+        self.dict_id = zlib.crc32(self.header)
+
+    # Returns the Codebook for the dictionary's codes (from codebook_cache)
+    def codebook(self):
+        return canonical_codebook(self.lengths)
+
+
+def train_dictionary(files, max_code_len=DICTIONARY_MAX_CODE_LEN):
+    """Builds a SharedDictionary from the byte counts of the files in the list files, plus 1 for every byte value"""
+    freqs = [1] * 256
+    for name in files:
+        counts = cnt_freq(name, True)
+        for i in range(256):
+            freqs[i] += counts[i]
+    return SharedDictionary(create_limited_code_lengths(freqs, max_code_len))
+
+
+def write_dictionary(dictionary, dict_file):
+    """Writes the SharedDictionary dictionary to the file dict_file"""
+    try:
+        fout = open(dict_file, 'wb')
+    except:
+        raise FileNotFoundError
+    fout.write(bytes([FORMAT_DICTIONARY]) + ID_STRUCT.pack(dictionary.dict_id) + dictionary.header)
+    fout.close()
+
+
+def read_dictionary(dict_file):
+    """Reads a SharedDictionary written by write_dictionary"""
+    try:
+        fin = open(dict_file, 'rb')
+    except:
+        raise FileNotFoundError
+    with fin:
+        bit = HuffmanBitReader(fin)
+        if bit.read_byte() != FORMAT_DICTIONARY:
+            raise ValueError('not a dictionary file')
+        dict_id = bit.read_bits(32)
+        if bit.read_byte() != FORMAT_CANONICAL:
+            raise ValueError('not a dictionary file')
+        lengths, char_num = read_canonical_header(bit)
+        bit.close()
+    dictionary = SharedDictionary(lengths)
+    if dictionary.dict_id != dict_id:
+        raise ValueError('dictionary file is damaged: its ID does not match its code lengths')
+    return dictionary
+
+
+def encode_with_dictionary(data, dictionary):
+    """Compresses the bytes in data with the codes of the SharedDictionary dictionary and returns the compressed bytes"""
+    out = io.BytesIO()
+    bit = HuffmanBitWriter(out)
+    bit.write_bytes(bytes([FORMAT_SHARED]) + ID_STRUCT.pack(dictionary.dict_id) + encode_varint(len(data)))
+    book = dictionary.codebook()
+    for start in range(0, len(data), CHUNK_SIZE):
+        write_chunk(bit, data[start:start + CHUNK_SIZE], book)
+    bit.close()
+    return out.getvalue()
+
+
+def decode_with_dictionary(data, dictionary):
+    """Decodes bytes produced by encode_with_dictionary; dictionary must be the SharedDictionary they were coded with"""
+    bit = HuffmanBitReader(io.BytesIO(data))
+    if bit.read_byte() != FORMAT_SHARED:
+        raise ValueError('not a shared-dictionary stream')
+    if bit.read_bits(32) != dictionary.dict_id:
+        raise ValueError('stream was coded with a different dictionary')
+    char_num = read_varint(bit)
+    final = bytes(decode_symbols(bit, dictionary.codebook().decode_table(), char_num))
+    bit.close()
+    return final
+
+
+def list_files(in_dir):
+    """Returns the paths, relative to in_dir, of all the files under the directory in_dir, sorted"""
+    paths = []
+    for root, dirs, files in os.walk(in_dir):
+        for name in files:
+            paths.append(os.path.relpath(os.path.join(root, name), in_dir))
+    return sorted(paths)
+
+
+def sample_files(in_dir, n, seed=0):
+    """Returns the paths of up to n files picked at random from under in_dir, for train_dictionary"""
+    paths = list_files(in_dir)
+    if len(paths) > n:
+        paths = random.Random(seed).sample(paths, n)
+    return [os.path.join(in_dir, path) for path in paths]
+
+
+def code_file(job, dictionary, code):
+    """Reads the file job[0], passes its bytes and dictionary to code and writes the result to the file job[1]
+    Returns (bytes read, bytes written)"""
+    in_path, out_path = job
+    with open(in_path, 'rb') as fin:
+        data = fin.read()
+    result = code(data, dictionary)
+    with open(out_path, 'wb') as fout:
+        fout.write(result)
+    return (len(data), len(result))
+
+
+def code_directory(in_dir, out_dir, dictionary, code, rename, workers, threads):
+    """Runs code_file on every file under in_dir, writing to the same relative path under out_dir as changed by rename
+    Returns the report described in compress_directory"""
+    start = time.perf_counter()
+    jobs = []
+    for path in list_files(in_dir):
+        out_path = os.path.join(out_dir, rename(path))
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        jobs.append((os.path.join(in_dir, path), out_path))
+    bytes_in = 0
+    bytes_out = 0
+    for n_in, n_out in parallel_map(functools.partial(code_file, dictionary=dictionary, code=code), jobs, workers, threads):
+        bytes_in += n_in
+        bytes_out += n_out
+    seconds = max(time.perf_counter() - start, 1e-9)
+    return {'files': len(jobs), 'bytes_in': bytes_in, 'bytes_out': bytes_out, 'seconds': seconds,
+            'files_per_s': len(jobs) / seconds, 'mb_per_s': bytes_in / 1e6 / seconds}
+
+
+def compress_directory(in_dir, out_dir, dictionary, workers=None, threads=False):
+    """Compresses every file under in_dir with the SharedDictionary dictionary into out_dir, adding BATCH_SUFFIX to each name
+    Files are spread over workers processes (threads with threads=True; one per CPU core when workers is None)
+    Returns a dict with the number of files, bytes_in, bytes_out, seconds, files_per_s and mb_per_s (of input)"""
+    return code_directory(in_dir, out_dir, dictionary, encode_with_dictionary,
+                          lambda path: path + BATCH_SUFFIX, workers, threads)
+
+
+def decompress_directory(in_dir, out_dir, dictionary, workers=None, threads=False):
+    """Decodes every file under in_dir written by compress_directory into out_dir, removing BATCH_SUFFIX from each name
+    Returns a report like compress_directory's, with bytes_in the compressed bytes"""
+    def rename(path):
+        if path.endswith(BATCH_SUFFIX):
+            return path[:-len(BATCH_SUFFIX)]
+        return path
+    return code_directory(in_dir, out_dir, dictionary, decode_with_dictionary, rename, workers, threads)
+
+
+def print_report(report):
+    """Prints a report from compress_directory or decompress_directory on one line"""
+    print('%d files, %d bytes in, %d bytes out, %.2f s: %.1f files/s, %.2f MB/s'
+          % (report['files'], report['bytes_in'], report['bytes_out'], report['seconds'],
+             report['files_per_s'], report['mb_per_s']))
+
+
+if __name__ == '__main__':
+    usage = 'usage: python3 huffman_batch.py train dictionary_file in_dir [n_sample_files]\n' \
+            '       python3 huffman_batch.py compress|decompress dictionary_file in_dir out_dir [workers]'
+    if len(sys.argv) < 4 or sys.argv[1] not in ('train', 'compress', 'decompress'):
+        sys.exit(usage)
+    if sys.argv[1] == 'train':
+        n = 1000
+        if len(sys.argv) > 4:
+            n = int(sys.argv[4])
+        write_dictionary(train_dictionary(sample_files(sys.argv[3], n)), sys.argv[2])
+    elif len(sys.argv) < 5:
+        sys.exit(usage)
+    else:
+        workers = None
+        if len(sys.argv) > 5:
+            workers = int(sys.argv[5])
+        dictionary = read_dictionary(sys.argv[2])
+        if sys.argv[1] == 'compress':
+            print_report(compress_directory(sys.argv[3], sys.argv[4], dictionary, workers))
+        else:
+            print_report(decompress_directory(sys.argv[3], sys.argv[4], dictionary, workers))
@@ -0,0 +1,69 @@
+import unittest
+import filecmp
+import os
+import tempfile
+from huffman_batch import *
+
+class TestList(unittest.TestCase):
+    def write_small_files(self, in_dir):
+        with open('declaration.txt') as f:
+            lines = [line for line in f.read().split('\n') if line != '']
+        os.makedirs(os.path.join(in_dir, 'sub'))
+        for i in range(len(lines)):
+            name = os.path.join(in_dir, 'sub' if i % 3 == 0 else '', 'line%d.txt' % i)
+            with open(name, 'w') as f:
+                f.write(lines[i])
+        for name in ['file1.txt', 'single_char.txt', 'empty_file.txt']:
+            with open(name, 'rb') as f, open(os.path.join(in_dir, name), 'wb') as g:
+                g.write(f.read())
+
+    def test_dictionary(self):
+        dictionary = train_dictionary(['declaration.txt', 'file1.txt'])
+        self.assertNotIn(0, dictionary.lengths)
+        self.assertLessEqual(max(dictionary.lengths), DICTIONARY_MAX_CODE_LEN)
+        self.assertEqual(dictionary.dict_id, train_dictionary(['file1.txt', 'declaration.txt']).dict_id)
+        self.assertNotEqual(dictionary.dict_id, train_dictionary(['file1.txt']).dict_id)
+        with tempfile.TemporaryDirectory() as tmp:
+            dict_file = os.path.join(tmp, 'dictionary')
+            write_dictionary(dictionary, dict_file)
+            self.assertEqual(read_dictionary(dict_file).lengths, dictionary.lengths)
+            with self.assertRaises(ValueError):
+                read_dictionary('file1.txt')
+        for data in [b'', b'a', b'hello world', bytes(range(256)) * 4]:
+            encoded = encode_with_dictionary(data, dictionary)
+            self.assertEqual(decode_with_dictionary(encoded, dictionary), data)
+        encoded = encode_with_dictionary(b'When in the Course of human events', dictionary)
+        self.assertLess(len(encoded), 30)
+        with self.assertRaises(ValueError):
+            decode_with_dictionary(encoded, train_dictionary(['file1.txt']))
+        with self.assertRaises(ValueError):
+            SharedDictionary([8] * 255 + [0])
+
+    def test_compress_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            in_dir = os.path.join(tmp, 'in')
+            out_dir = os.path.join(tmp, 'out')
+            back_dir = os.path.join(tmp, 'back')
+            self.write_small_files(in_dir)
+            dictionary = train_dictionary(sample_files(in_dir, 20))
+            for workers, threads in [(1, False), (2, True), (2, False)]:
+                report = compress_directory(in_dir, out_dir, dictionary, workers, threads)
+                files = list_files(in_dir)
+                self.assertEqual(report['files'], len(files))
+                self.assertEqual(report['bytes_in'], sum(os.path.getsize(os.path.join(in_dir, name)) for name in files))
+                self.assertLess(report['bytes_out'], report['bytes_in'])
+                self.assertEqual(list_files(out_dir), sorted(name + BATCH_SUFFIX for name in files))
+                report = decompress_directory(out_dir, back_dir, dictionary, workers, threads)
+                self.assertEqual(report['files'], len(files))
+                for name in files:
+                    self.assertTrue(filecmp.cmp(os.path.join(in_dir, name), os.path.join(back_dir, name), shallow=False))
+            decoded = os.path.join(tmp, 'decoded.txt')
+            with open(decoded, 'w') as f:
+                f.write('kept')
+            with self.assertRaises(ValueError):
+                huffman_decode(os.path.join(out_dir, 'file1.txt' + BATCH_SUFFIX), decoded)
+            with open(decoded) as f:
+                self.assertEqual(f.read(), 'kept')
+
+if __name__ == '__main__': 
+   unittest.main()
@@ -0,0 +1,679 @@
+#
+#   Benchmarks for the Huffman encoder and decoder
+#
+#   Run with:  python3 huffman_bench.py [--json results.json] [--baseline old.json] [--threshold 0.1]
+#
+#   The default run is the benchmark suite: throughput and per-call latency of each stage on the
+#   sample files and on synthetic inputs of known entropy. Inputs are made from fixed seeds, so two
+#   runs time the same work and their JSON results can be compared; with --baseline the run exits
+#   with status 1 if any stage got slower than the baseline by more than the threshold.
+#   python3 huffman_bench.py --studies  prints the one-off comparisons below the suite instead.
+#
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from huffman import *
+
+
+def synthetic_freqs(n_symbols, seed=0):
+    """Returns a frequency list of length n_symbols with random non-zero counts.
+    Counts are drawn from a small range so there are plenty of ties to break"""
+    rng = random.Random(seed)
+    return [rng.randint(1, 1000) for _ in range(n_symbols)]
+
+
+def time_call(func, *args, repeat=3):
+    """Calls func(*args) repeat times and returns the best wall time in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_create_huff_tree(sizes=(256, 1 << 16, 1 << 20), repeat=3):
+    """Times create_huff_tree on synthetic alphabets of the given sizes
+    Returns a list of (alphabet size, best seconds) pairs"""
+    results = []
+    for size in sizes:
+        freqs = synthetic_freqs(size)
+        results.append((size, time_call(create_huff_tree, freqs, repeat=repeat)))
+    return results
+
+
+def decode_tree_walk(encoded_file):
+    """Reference decoder that walks the tree one bit at a time, as huffman_decode used to
+    Kept here so the table-driven decoder has a baseline to be measured against"""
+    bit = HuffmanBitReader(encoded_file)
+    freqs = parse_header(bit.read_str())
+    tree = create_flat_tree(freqs)
+    out = []
+    for i in range(sum(freqs)):
+        current = tree.root
+        while tree.left[current] >= 0:
+            if bit.read_bit():
+                current = tree.right[current]
+            else:
+                current = tree.left[current]
+        out.append(chr(tree.char[current]))
+    bit.close()
+    return ''.join(out)
+
+
+def bench_decode(encoded_file='war_and_peace_out_compressed.txt', repeat=1):
+    """Times the bit-at-a-time reference decoder against huffman_decode on encoded_file
+    Returns (decoded MB, reference MB/s, huffman_decode MB/s)"""
+    bit = HuffmanBitReader(encoded_file)
+    size_mb = sum(parse_header(bit.read_str())) / 1e6
+    bit.close()
+    fd, decoded = tempfile.mkstemp(suffix='.txt')
+    os.close(fd)
+    try:
+        before = time_call(decode_tree_walk, encoded_file, repeat=repeat)
+        after = time_call(huffman_decode, encoded_file, decoded, repeat=repeat)
+    finally:
+        os.remove(decoded)
+    return (size_mb, size_mb / before, size_mb / after)
+
+
+def write_synthetic_file(filename, size, seed=0):
+    """Writes size bytes of skewed random data (lower byte values are more common) to filename
+    The file is written in 1 MB pieces, so multi-GB inputs can be made without holding them in memory"""
+    rng = random.Random(seed)
+    piece = bytes(min(int(rng.expovariate(1 / 40.0)), 255) for _ in range(1 << 20))
+    with open(filename, 'wb') as f:
+        written = 0
+        while written < size:
+            f.write(piece[:size - written])
+            written += len(piece)
+
+
+def bench_cnt_freq(filename, text=True, repeat=1):
+    """Times cnt_freq on filename in binary mode and, if text is True, in text mode
+    Returns (file MB, text MB/s or None, binary MB/s)"""
+    size_mb = os.path.getsize(filename) / 1e6
+    text_rate = None
+    if text:
+        text_rate = size_mb / time_call(cnt_freq, filename, repeat=repeat)
+    binary_rate = size_mb / time_call(cnt_freq, filename, True, repeat=repeat)
+    return (size_mb, text_rate, binary_rate)
+
+
+def write_repeated_file(filename, source, copies):
+    """Writes copies back-to-back copies of the file source to filename"""
+    with open(source, 'rb') as f:
+        data = f.read()
+    with open(filename, 'wb') as f:
+        for _ in range(copies):
+            f.write(data)
+
+
+def bench_blocks(copies=8, workers_list=(1, 2, 4, 8), block_size=1 << 20):
+    """Times huffman_encode_blocks and huffman_decode_blocks on copies of war_and_peace.txt with each worker count
+    Returns a list of (workers, encode MB/s, decode MB/s)"""
+    from huffman_blocks import huffman_encode_blocks, huffman_decode_blocks
+    tmp = tempfile.mkdtemp()
+    corpus = os.path.join(tmp, 'corpus.txt')
+    encoded = os.path.join(tmp, 'corpus.blk')
+    decoded = os.path.join(tmp, 'corpus_decoded.txt')
+    results = []
+    try:
+        write_repeated_file(corpus, 'war_and_peace.txt', copies)
+        size_mb = os.path.getsize(corpus) / 1e6
+        for workers in workers_list:
+            encode = time_call(huffman_encode_blocks, corpus, encoded, block_size, workers, repeat=1)
+            decode = time_call(huffman_decode_blocks, encoded, decoded, workers, repeat=1)
+            results.append((workers, size_mb / encode, size_mb / decode))
+    finally:
+        for name in (corpus, encoded, decoded):
+            if os.path.exists(name):
+                os.remove(name)
+        os.rmdir(tmp)
+    return results
+
+
+def bench_read_range(copies_list=(1, 16), length=4096, block_size=1 << 16, samples=50):
+    """Times read_range on block container files made from copies of war_and_peace.txt
+    Returns a list of (compressed file MB, mean milliseconds per read) for each entry of copies_list"""
+    from huffman_blocks import huffman_encode_blocks, read_range
+    tmp = tempfile.mkdtemp()
+    corpus = os.path.join(tmp, 'corpus.txt')
+    encoded = os.path.join(tmp, 'corpus.blk')
+    rng = random.Random(0)
+    results = []
+    try:
+        for copies in copies_list:
+            write_repeated_file(corpus, 'war_and_peace.txt', copies)
+            total = os.path.getsize(corpus)
+            huffman_encode_blocks(corpus, encoded, block_size)
+            starts = [rng.randrange(total - length) for _ in range(samples)]
+            begin = time.perf_counter()
+            for start in starts:
+                read_range(encoded, start, length)
+            elapsed = time.perf_counter() - begin
+            results.append((os.path.getsize(encoded) / 1e6, elapsed * 1000 / samples))
+    finally:
+        for name in (corpus, encoded):
+            if os.path.exists(name):
+                os.remove(name)
+        os.rmdir(tmp)
+    return results
+
+
+SAMPLE_FILES = ['file1.txt', 'file2.txt', 'multiline.txt', 'declaration.txt', 'war_and_peace.txt']
+
+
+def bench_length_limit(limits=(8, 10, 12, 15), files=SAMPLE_FILES):
+    """Compares the compressed size with capped code lengths against the unlimited tree
+    Returns a list of (file name, unlimited size, {limit: size}) with sizes in bytes"""
+    results = []
+    for name in files:
+        with open(name, 'rb') as f:
+            data = f.read()
+        limited = {}
+        for limit in limits:
+            try:
+                limited[limit] = len(encode_bytes(data, limit))
+            except ValueError:   # more distinct characters than the cap allows
+                limited[limit] = None
+        results.append((name, len(encode_bytes(data)), limited))
+    return results
+
+
+def bench_adaptive(files=('declaration.txt', 'war_and_peace.txt')):
+    """Compares one-pass adaptive coding with the two-pass canonical encoder on each file
+    Returns a list of (file name, file MB, two-pass ratio, adaptive ratio, two-pass MB/s, adaptive encode MB/s,
+    adaptive decode MB/s); a ratio is compressed size over original size"""
+    from huffman_adaptive import huffman_encode_adaptive, huffman_decode_adaptive
+    tmp = tempfile.mkdtemp()
+    out_file = os.path.join(tmp, 'out.txt')
+    adaptive = os.path.join(tmp, 'adaptive.bin')
+    decoded = os.path.join(tmp, 'decoded.txt')
+    results = []
+    try:
+        for name in files:
+            size = os.path.getsize(name)
+            two_pass = time_call(huffman_encode, name, out_file, True, CHUNK_SIZE, True, repeat=1)
+            encode = time_call(huffman_encode_adaptive, name, adaptive, repeat=1)
+            decode = time_call(huffman_decode_adaptive, adaptive, decoded, repeat=1)
+            results.append((name, size / 1e6, os.path.getsize(compressed_file_name(out_file)) / size,
+                            os.path.getsize(adaptive) / size, size / 1e6 / two_pass, size / 1e6 / encode, size / 1e6 / decode))
+    finally:
+        for name in os.listdir(tmp):
+            os.remove(os.path.join(tmp, name))
+        os.rmdir(tmp)
+    return results
+
+
+def bench_codebook_cache(name='declaration.txt', files=200):
+    """Times encoding and decoding files copies of the same file with codebook_cache turned off and on
+    Returns (files per second without the cache, files per second with it)"""
+    tmp = tempfile.mkdtemp()
+    out_file = os.path.join(tmp, 'out.txt')
+    decoded = os.path.join(tmp, 'decoded.txt')
+    maxsize = codebook_cache.maxsize
+    def run():
+        for _ in range(files):
+            huffman_encode(name, out_file)
+            huffman_decode(compressed_file_name(out_file), decoded)
+    rates = []
+    try:
+        for size in (0, maxsize):
+            codebook_cache.clear()
+            codebook_cache.maxsize = size
+            rates.append(files / time_call(run, repeat=1))
+    finally:
+        codebook_cache.maxsize = maxsize
+        for leftover in os.listdir(tmp):
+            os.remove(os.path.join(tmp, leftover))
+        os.rmdir(tmp)
+    return tuple(rates)
+
+
+def bench_async_latency(streams=4, name='war_and_peace.txt', block_size=1 << 16):
+    """Compresses name on streams concurrent encode_stream calls while a ticker task measures how late the event loop runs it
+    Returns (total MB/s, worst ticker delay in ms)"""
+    import asyncio
+    from huffman_async import encode_stream
+
+    class NullWriter:
+        def write(self, data):
+            pass
+
+        async def drain(self):
+            pass
+
+    async def source(data):
+        for start in range(0, len(data), 1 << 16):
+            yield data[start:start + (1 << 16)]
+
+    async def run(data):
+        worst = 0.0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal worst
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                worst = max(worst, time.perf_counter() - start - 0.001)
+
+        tick = asyncio.ensure_future(ticker())
+        begin = time.perf_counter()
+        await asyncio.gather(*[encode_stream(source(data), NullWriter(), block_size) for _ in range(streams)])
+        elapsed = time.perf_counter() - begin
+        done.set()
+        await tick
+        return (streams * len(data) / 1e6 / elapsed, worst * 1000)
+
+    with open(name, 'rb') as f:
+        data = f.read()
+    return asyncio.run(run(data))
+
+
+def bench_batch(name='declaration.txt', workers=1):
+    """Cuts name into one small file per line and compresses them all with huffman_encode, one at a time, and with a
+    shared dictionary through huffman_batch.compress_directory
+    Returns (number of files, input bytes, (bytes, files/s) for huffman_encode, (bytes, files/s) for the batch)"""
+    from huffman_batch import train_dictionary, sample_files, compress_directory
+    tmp = tempfile.mkdtemp()
+    in_dir = os.path.join(tmp, 'in')
+    out_dir = os.path.join(tmp, 'out')
+    os.makedirs(in_dir)
+    os.makedirs(out_dir)
+    try:
+        with open(name, 'rb') as f:
+            lines = [line for line in f.read().split(b'\n') if len(line) > 0]
+        for i in range(len(lines)):
+            with open(os.path.join(in_dir, 'line%d.txt' % i), 'wb') as f:
+                f.write(lines[i])
+        files = sorted(os.listdir(in_dir))
+        start = time.perf_counter()
+        single = 0
+        for file_name in files:
+            out_file = os.path.join(out_dir, file_name)
+            huffman_encode(os.path.join(in_dir, file_name), out_file)
+            single += os.path.getsize(compressed_file_name(out_file))
+        single_rate = len(files) / (time.perf_counter() - start)
+        report = compress_directory(in_dir, os.path.join(tmp, 'batch'), train_dictionary(sample_files(in_dir, 20)), workers)
+    finally:
+        for root, dirs, names in os.walk(tmp, topdown=False):
+            for leftover in names:
+                os.remove(os.path.join(root, leftover))
+            os.rmdir(root)
+    return (len(files), report['bytes_in'], (single, single_rate), (report['bytes_out'], report['files_per_s']))
+
+
+def bench_context(files=('declaration.txt', 'war_and_peace.txt')):
+    """Compares order-1 context coding with the single-table canonical encoder on each file
+    Returns a list of (file name, file MB, single-table ratio, context ratio, single-table encode and decode MB/s,
+    context encode and decode MB/s); a ratio is compressed size over original size"""
+    from huffman_context import context_encode_bytes, context_decode_bytes
+    results = []
+    for name in files:
+        with open(name, 'rb') as f:
+            data = f.read()
+        size_mb = len(data) / 1e6
+        single = encode_bytes(data)
+        context = context_encode_bytes(data)
+        rates = [size_mb / time_call(encode_bytes, data, repeat=1), size_mb / time_call(decode_bytes, single, repeat=1),
+                 size_mb / time_call(context_encode_bytes, data, repeat=1),
+                 size_mb / time_call(context_decode_bytes, context, repeat=1)]
+        results.append((name, size_mb, len(single) / len(data), len(context) / len(data)) + tuple(rates))
+    return results
+
+
+# (name, first code point, number of code points) of the letters each script of make_multilingual_text draws on
+SCRIPTS = [('latin', 0x61, 26), ('latin-1', 0xe0, 31), ('greek', 0x3b1, 25), ('cyrillic', 0x430, 32),
+           ('arabic', 0x627, 36), ('devanagari', 0x915, 37), ('cjk', 0x4e00, 3000), ('emoji', 0x1f600, 80)]
+
+
+def make_multilingual_text(n_chars, scripts=SCRIPTS, seed=0):
+    """Returns about n_chars characters of made-up text in paragraphs of the given scripts, in turn
+    Each script has a vocabulary of words drawn with Zipf-like weights, so its letters have a skewed distribution
+    as in real text (CJK and emoji words are one to three characters long, with no spaces between them)"""
+    rng = random.Random(seed)
+    vocabularies = []
+    for name, first, count in scripts:
+        letters = [chr(first + i) for i in range(count)]
+        weights = [1 / (i + 1) for i in range(count)]
+        dense = name in ('cjk', 'emoji')
+        words = [''.join(rng.choices(letters, weights, k=rng.randint(1, 3) if dense else rng.randint(2, 9)))
+                 for _ in range(2000)]
+        vocabularies.append((words, [1 / (i + 1) for i in range(len(words))], '' if dense else ' '))
+    paragraphs = []
+    written = 0
+    while written < n_chars:
+        words, weights, space = vocabularies[len(paragraphs) % len(vocabularies)]
+        paragraph = space.join(rng.choices(words, weights, k=200)) + '.\n'
+        paragraphs.append(paragraph)
+        written += len(paragraph)
+    return ''.join(paragraphs)
+
+
+def bench_unicode(n_chars=1 << 20, scripts_list=((SCRIPTS[:2], 'latin'), (SCRIPTS[2:6], 'alphabets'),
+                                                   (SCRIPTS[6:7], 'cjk'), (SCRIPTS, 'mixed'))):
+    """Compares Huffman coding over code points (huffman_unicode) with coding the UTF-8 bytes (encode_bytes) on
+    made-up multilingual text
+    Returns a list of (corpus name, UTF-8 MB, distinct characters, code point size, header size, byte-coded size,
+    code point encode MB/s, code point decode MB/s), rates in MB of UTF-8 text"""
+    from huffman_unicode import unicode_encode_text, unicode_decode_text, count_symbols, sparse_code_lengths, create_unicode_header
+    results = []
+    for scripts, name in scripts_list:
+        text = make_multilingual_text(n_chars, scripts)
+        data = text.encode('utf-8')
+        size_mb = len(data) / 1e6
+        counts = count_symbols(text)
+        encoded = unicode_encode_text(text)
+        header = create_unicode_header(sparse_code_lengths(counts), len(text))
+        results.append((name, size_mb, len(counts), len(encoded), len(header), len(encode_bytes(data)),
+                        size_mb / time_call(unicode_encode_text, text, repeat=1),
+                        size_mb / time_call(unicode_decode_text, encoded, repeat=1)))
+    return results
+
+
+def bench_store_raw(size=1 << 22, bits_list=(8, 7, 4)):
+    """Times huffman_encode with and without the stored-raw fallback on synthetic files of bits bits of entropy per byte
+    and checks estimate_encoded_size against the exact size
+    Returns a list of (bits, file size, coded size, size with the fallback, estimated size, coded seconds,
+    fallback seconds)"""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        name = os.path.join(tmp, 'entropy.bin')
+        out_file = os.path.join(tmp, 'entropy_out.txt')
+        for bits in bits_list:
+            write_entropy_file(name, size, bits)
+            coded_time = time_call(huffman_encode, name, out_file, True, CHUNK_SIZE, True, repeat=1)
+            coded = os.path.getsize(compressed_file_name(out_file))
+            start = time.perf_counter()
+            huffman_encode(name, out_file, canonical=True, binary=True, store_raw=True)
+            raw_time = time.perf_counter() - start
+            stored = os.path.getsize(compressed_file_name(out_file))
+            results.append((bits, size, coded, stored, estimate_encoded_size(name)[0], coded_time, raw_time))
+    return results
+
+
+def bench_lz77(name='war_and_peace.txt', levels=(1, 2, 3, 4, 5, 6, 7, 8, 9)):
+    """Compresses name with the LZ77 front end at each level and with encode_bytes alone
+    Returns (file MB, Huffman-only ratio, list of (level, ratio, encode MB/s, decode MB/s)); a ratio is compressed
+    size over original size"""
+    from huffman_lz77 import lz77_encode_bytes, lz77_decode_bytes
+    with open(name, 'rb') as f:
+        data = f.read()
+    size_mb = len(data) / 1e6
+    results = []
+    for level in levels:
+        start = time.perf_counter()
+        encoded = lz77_encode_bytes(data, level)
+        encode_time = time.perf_counter() - start
+        results.append((level, len(encoded) / len(data), size_mb / encode_time,
+                        size_mb / time_call(lz77_decode_bytes, encoded, repeat=1)))
+    return (size_mb, len(encode_bytes(data)) / len(data), results)
+
+
+def bench_append(name='war_and_peace.txt', pieces=50):
+    """Grows a compressed copy of name a piece at a time, as a log would grow, once by appending each piece to a
+    segment file and once by recompressing everything so far after each piece
+    Returns (pieces, seconds appending, seconds recompressing, segment file size, size of one encode_bytes of the file,
+    number of segments that reused a table)"""
+    from huffman_append import append_bytes, SEGMENT_REUSE
+    with open(name, 'rb') as f:
+        data = f.read()
+    step = -(-len(data) // pieces)
+    parts = [data[start:start + step] for start in range(0, len(data), step)]
+    with tempfile.TemporaryDirectory() as tmp:
+        encoded = os.path.join(tmp, 'log.seg')
+        start = time.perf_counter()
+        kinds = [append_bytes(encoded, part) for part in parts]
+        append_time = time.perf_counter() - start
+        size = os.path.getsize(encoded)
+    start = time.perf_counter()
+    for i in range(1, len(parts) + 1):
+        encode_bytes(data[:i * step])
+    recompress_time = time.perf_counter() - start
+    return (len(parts), append_time, recompress_time, size, len(encode_bytes(data)), kinds.count(SEGMENT_REUSE))
+
+
+def write_entropy_file(filename, size, bits, seed=0):
+    """Writes size bytes drawn uniformly from the byte values 0 to 2**bits - 1 to filename
+    The data has an entropy of bits bits per byte, so its ideal compressed size is known in advance"""
+    rng = random.Random(seed)
+    mask = bytes(i & ((1 << bits) - 1) for i in range(256))
+    with open(filename, 'wb') as f:
+        written = 0
+        while written < size:
+            piece = rng.randbytes(min(1 << 20, size - written)).translate(mask)
+            f.write(piece)
+            written += len(piece)
+
+
+# (entropy in bits per byte, size in bytes) of the synthetic suite inputs
+SYNTHETIC_INPUTS = [(1, 1 << 20), (4, 1 << 20), (8, 1 << 20)]
+BIT_SAMPLE = 1 << 18      # symbols written and read back by the bit writer and reader benchmarks
+SUITE_SEED = 0
+
+
+def measure(func, args, size, calls=1, repeat=3):
+    """Times calls back-to-back calls of func(*args), best of repeat
+    Returns a result dict with the per-call latency in milliseconds and, if size (bytes handled per call)
+    is not None, the throughput in MB/s"""
+    def run():
+        for _ in range(calls):
+            func(*args)
+    seconds = time_call(run, repeat=repeat)
+    mb_per_s = None
+    if size is not None:
+        mb_per_s = size * calls / 1e6 / max(seconds, 1e-9)
+    return {'latency_ms': seconds * 1000 / calls, 'mb_per_s': mb_per_s}
+
+
+def write_codes(pairs):
+    """Writes the (value, length) pairs to an in-memory HuffmanBitWriter and returns the bytes"""
+    out = io.BytesIO()
+    bit = HuffmanBitWriter(out)
+    write = bit.write_bits
+    for value, length in pairs:
+        write(value, length)
+    bit.close()
+    return out.getvalue()
+
+
+def read_codes(data, lengths):
+    """Reads back codes of the given lengths from data with a HuffmanBitReader"""
+    bit = HuffmanBitReader(io.BytesIO(data))
+    read = bit.read_bits
+    for length in lengths:
+        read(length)
+
+
+def bench_input(name, repeat=3):
+    """Runs every stage of the suite on the file name
+    Returns a dict from stage name to the result dict of measure"""
+    size = os.path.getsize(name)
+    with open(name, 'rb') as f:
+        data = f.read()
+    freqs = cnt_freq(name, True)
+    tree = create_huff_tree(freqs)
+    pairs = create_int_code(create_code(tree))
+    sample = [pairs[c] for c in data[:BIT_SAMPLE]]
+    encoded = write_codes(sample)
+    sample_bytes = min(size, BIT_SAMPLE)
+    tmp = tempfile.mkdtemp()
+    out_file = os.path.join(tmp, 'out.txt')
+    decoded = os.path.join(tmp, 'decoded.txt')
+    results = {}
+    try:
+        results['cnt_freq'] = measure(cnt_freq, (name, True), size, repeat=repeat)
+        results['create_huff_tree'] = measure(create_huff_tree, (freqs,), None, 20, repeat)
+        results['create_code'] = measure(create_code, (tree,), None, 20, repeat)
+        results['huffman_encode'] = measure(huffman_encode, (name, out_file, False, CHUNK_SIZE, True), size, repeat=repeat)
+        results['huffman_decode'] = measure(huffman_decode, (compressed_file_name(out_file), decoded, True), size, repeat=repeat)
+        results['bit_writer'] = measure(write_codes, (sample,), sample_bytes, repeat=repeat)
+        results['bit_reader'] = measure(read_codes, (encoded, [length for value, length in sample]), sample_bytes, repeat=repeat)
+    finally:
+        for leftover in os.listdir(tmp):
+            os.remove(os.path.join(tmp, leftover))
+        os.rmdir(tmp)
+    return results
+
+
+def run_suite(files=SAMPLE_FILES, synthetic=SYNTHETIC_INPUTS, repeat=3):
+    """Runs the benchmark suite on the sample files and on a synthetic file for each (bits, size) of synthetic
+    Returns a dict that json can write: run details under 'meta' and, under 'results', a dict from input name
+    to the stage results of bench_input"""
+    results = {}
+    for name in files:
+        if os.path.getsize(name) > 0:
+            results[name] = bench_input(name, repeat)
+    tmp = tempfile.mkdtemp()
+    try:
+        for bits, size in synthetic:
+            name = os.path.join(tmp, 'synthetic.bin')
+            write_entropy_file(name, size, bits, SUITE_SEED)
+            results['entropy%d_%dKB' % (bits, size >> 10)] = bench_input(name, repeat)
+            os.remove(name)
+    finally:
+        os.rmdir(tmp)
+    meta = {'python': platform.python_version(), 'platform': platform.platform(),
+            'numpy': numpy is not None, 'cpus': os.cpu_count(), 'repeat': repeat, 'seed': SUITE_SEED}
+    return {'meta': meta, 'results': results}
+
+
+def find_regressions(current, baseline, threshold=0.1):
+    """Compares two run_suite results and returns a list of (input, stage, baseline ms, current ms)
+    for every stage whose latency grew by more than the fraction threshold. Inputs or stages missing
+    from either run are skipped"""
+    regressions = []
+    for name, stages in sorted(current['results'].items()):
+        old_stages = baseline['results'].get(name, {})
+        for stage, result in sorted(stages.items()):
+            if stage in old_stages:
+                before = old_stages[stage]['latency_ms']
+                after = result['latency_ms']
+                if after > before * (1 + threshold):
+                    regressions.append((name, stage, before, after))
+    return regressions
+
+
+def print_suite(suite):
+    """Prints the results of run_suite as a table"""
+    print('%-22s %-18s %12s %10s' % ('input', 'stage', 'latency ms', 'MB/s'))
+    for name, stages in suite['results'].items():
+        for stage, result in stages.items():
+            rate = '-' if result['mb_per_s'] is None else '%.2f' % result['mb_per_s']
+            print('%-22s %-18s %12.3f %10s' % (name, stage, result['latency_ms'], rate))
+
+
+def run_studies():
+    """Prints the one-off comparisons: old against new implementations, worker counts and format trade-offs"""
+    print('create_huff_tree')
+    for size, secs in bench_create_huff_tree():
+        print('  %8d symbols: %9.2f ms' % (size, secs * 1000))
+    size_mb, before, after = bench_decode()
+    print('huffman_decode (%.2f MB)' % size_mb)
+    print('  tree walk: %7.2f MB/s' % before)
+    print('  table:     %7.2f MB/s' % after)
+    print('cnt_freq (%s)' % ('NumPy bincount' if numpy is not None else 'collections.Counter'))
+    size_mb, text_rate, binary_rate = bench_cnt_freq('war_and_peace.txt')
+    print('  war_and_peace.txt (%.2f MB): text %.2f MB/s, binary %.2f MB/s' % (size_mb, text_rate, binary_rate))
+    # pass a larger size to write_synthetic_file for multi-GB runs
+    fd, synthetic = tempfile.mkstemp(suffix='.bin')
+    os.close(fd)
+    try:
+        write_synthetic_file(synthetic, 64 << 20)
+        size_mb, text_rate, binary_rate = bench_cnt_freq(synthetic, text=False)
+        print('  synthetic (%.2f MB): binary %.2f MB/s' % (size_mb, binary_rate))
+    finally:
+        os.remove(synthetic)
+    print('block container, 8 x war_and_peace.txt (%d CPUs)' % (os.cpu_count() or 1))
+    for workers, encode_rate, decode_rate in bench_blocks():
+        print('  %d workers: encode %.2f MB/s, decode %.2f MB/s' % (workers, encode_rate, decode_rate))
+    print('read_range, 4 KB reads, 64 KB blocks')
+    for size_mb, ms in bench_read_range():
+        print('  %8.2f MB file: %.2f ms per read' % (size_mb, ms))
+    print('code length cap, compressed bytes (cost over unlimited)')
+    for name, unlimited, limited in bench_length_limit():
+        cells = []
+        for limit in sorted(limited):
+            if limited[limit] is None:
+                cells.append('%d bits: n/a' % limit)
+            else:
+                cells.append('%d bits: %d (+%.3f%%)' % (limit, limited[limit], 100.0 * (limited[limit] - unlimited) / unlimited))
+        print('  %-18s unlimited %d, %s' % (name, unlimited, ', '.join(cells)))
+    print('adaptive one-pass vs two-pass canonical')
+    for name, size_mb, ratio, adaptive_ratio, rate, encode_rate, decode_rate in bench_adaptive():
+        print('  %-18s ratio %.4f vs %.4f, encode %.2f vs %.2f MB/s, adaptive decode %.2f MB/s'
+              % (name, ratio, adaptive_ratio, rate, encode_rate, decode_rate))
+    print('codebook cache, encode + decode of 200 x declaration.txt')
+    uncached, cached = bench_codebook_cache()
+    print('  cache off: %.1f files/s, cache on: %.1f files/s' % (uncached, cached))
+    print('asyncio encode_stream, 4 concurrent streams of war_and_peace.txt')
+    rate, worst = bench_async_latency()
+    print('  %.2f MB/s in total, event loop at most %.1f ms late' % (rate, worst))
+    print('small files, one per line of declaration.txt')
+    files, size, (single, single_rate), (batch, batch_rate) = bench_batch()
+    print('  %d files, %d bytes: huffman_encode %d bytes at %.1f files/s, shared dictionary %d bytes at %.1f files/s'
+          % (files, size, single, single_rate, batch, batch_rate))
+    print('order-1 context tables vs one table')
+    for name, size_mb, ratio, context_ratio, encode, decode, context_encode, context_decode in bench_context():
+        print('  %-18s ratio %.4f vs %.4f, encode %.2f vs %.2f MB/s, decode %.2f vs %.2f MB/s'
+              % (name, ratio, context_ratio, encode, context_encode, decode, context_decode))
+    print('Unicode code points vs UTF-8 bytes, made-up text')
+    for name, size_mb, distinct, size, header, byte_size, encode, decode in bench_unicode():
+        print('  %-10s %.2f MB, %4d characters: %d bytes (header %d) vs %d bytes as bytes, encode %.2f MB/s, decode %.2f MB/s'
+              % (name, size_mb, distinct, size, header, byte_size, encode, decode))
+    size_mb, huffman_ratio, levels = bench_lz77()
+    print('LZ77 + Huffman, war_and_peace.txt (%.2f MB), Huffman alone ratio %.4f' % (size_mb, huffman_ratio))
+    for level, ratio, encode, decode in levels:
+        print('  level %d: ratio %.4f, encode %.2f MB/s, decode %.2f MB/s' % (level, ratio, encode, decode))
+    pieces, append_time, recompress_time, size, whole, reused = bench_append()
+    print('append mode, war_and_peace.txt in %d pieces' % pieces)
+    print('  appending %.2f s in total, recompressing after each piece %.2f s; %d bytes vs %d in one go, %d tables reused'
+          % (append_time, recompress_time, size, whole, reused))
+    print('stored-raw fallback, 4 MB synthetic files')
+    for bits, size, coded, stored, estimate, coded_time, raw_time in bench_store_raw():
+        print('  %d bits/byte: coded %d bytes in %.3f s, with fallback %d bytes in %.3f s, sampled estimate %d bytes'
+              % (bits, coded, coded_time, stored, raw_time, estimate))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for the Huffman encoder and decoder')
+    parser.add_argument('--json', help='write the suite results to this file')
+    parser.add_argument('--baseline', help='suite results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fraction a stage may slow down by before it counts as a regression (default 0.1)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage, the best is kept (default 3)')
+    parser.add_argument('--studies', action='store_true', help='print the one-off comparisons instead of running the suite')
+    args = parser.parse_args()
+    if args.studies:
+        run_studies()
+        sys.exit(0)
+    suite = run_suite(repeat=args.repeat)
+    print_suite(suite)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(suite, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(suite, baseline, args.threshold)
+        for name, stage, before, after in regressions:
+            print('regression: %s %s %.3f ms -> %.3f ms (+%.0f%%)' % (name, stage, before, after, 100.0 * (after - before) / before))
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,43 @@
+import unittest
+import collections
+import math
+import os
+import tempfile
+from huffman_bench import *
+
+class TestList(unittest.TestCase):
+    def test_write_entropy_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            name = os.path.join(tmp, 'synthetic.bin')
+            write_entropy_file(name, 1 << 16, 4)
+            with open(name, 'rb') as f:
+                data = f.read()
+            write_entropy_file(name, 1 << 16, 4)
+            with open(name, 'rb') as f:
+                self.assertEqual(f.read(), data)
+        self.assertEqual(len(data), 1 << 16)
+        counts = collections.Counter(data)
+        self.assertEqual(sorted(counts), list(range(16)))
+        entropy = -sum(n / len(data) * math.log2(n / len(data)) for n in counts.values())
+        self.assertAlmostEqual(entropy, 4, places=2)
+
+    def test_make_multilingual_text(self):
+        text = make_multilingual_text(1 << 14)
+        self.assertEqual(text, make_multilingual_text(1 << 14))
+        self.assertGreaterEqual(len(text), 1 << 14)
+        for name, first, count in SCRIPTS:
+            self.assertTrue(any(first <= ord(c) < first + count for c in text), name)
+
+    def test_find_regressions(self):
+        baseline = {'results': {'a.txt': {'encode': {'latency_ms': 10.0, 'mb_per_s': 1.0},
+                                          'decode': {'latency_ms': 10.0, 'mb_per_s': 1.0}}}}
+        current = {'results': {'a.txt': {'encode': {'latency_ms': 10.5, 'mb_per_s': 0.95},
+                                         'decode': {'latency_ms': 12.0, 'mb_per_s': 0.8},
+                                         'tree': {'latency_ms': 1.0, 'mb_per_s': None}},
+                               'b.txt': {'encode': {'latency_ms': 99.0, 'mb_per_s': 0.1}}}}
+        self.assertEqual(find_regressions(current, baseline, 0.1), [('a.txt', 'decode', 10.0, 12.0)])
+        self.assertEqual(find_regressions(current, baseline, 0.25), [])
+        self.assertEqual(len(find_regressions(current, baseline, 0.0)), 2)
+
+if __name__ == '__main__': 
+   unittest.main()
@@ -2,41 +2,138 @@
 #   Bit-packing reader and writer for Huffman encoder and decoder
 #
 
-import struct 
-   
+import struct
+
 # --------------------------------------------------------------------
 # HuffmanBitReader is a HuffmanBitReader(string)
 class HuffmanBitReader:
     # side effect: open a file with file name 'fname' for reading in binary mode
-    def __init__(self, fname):
-        self.file = open(fname, 'rb')
-        self.n_bits = 0
-        self.byte = 0
-        self.mask = 0
+    # fname may also be a file object already open in binary mode (for example an io.BytesIO); close() leaves it open
+    # The file is read block_size bytes at a time and the bits are read straight out of that buffer
+    def __init__(self, fname, block_size=1 << 16):
+        self.owns_file = isinstance(fname, str)
+        if self.owns_file:
+            self.file = open(fname, 'rb')
+        else:
+            self.file = fname
+        self.block_size = block_size
+        self.buf = b''                  # bytes read from the file that are not all consumed yet
+        self.view = memoryview(self.buf)
+        self.bit_pos = 0                # position of the next unread bit, counted from the start of buf
 
-    # side effect: closes opened file  
+    # side effect: closes opened file
     def close(self):
-        self.file.close()
-      
-    # Use this method to read the header from the compressed file. 
+        if self.owns_file:
+            self.file.close()
+
+    # Use this method to read the header from the compressed file.
     def read_str(self): # str is a string
-        return self.file.readline()
-   
+        self.align()
+        while True:
+            start = self.bit_pos >> 3
+            end = self.buf.find(b'\n', start)
+            if end != -1:
+                end += 1
+                break
+            size = self.remaining_bytes()
+            self.fill(size + self.block_size)
+            if self.remaining_bytes() == size:   # no newline before the end of the file
+                start = self.bit_pos >> 3
+                end = len(self.buf)
+                break
+        self.bit_pos = end * 8
+        return self.buf[start:end]
+
+    # Use this method to look at the next byte of the compressed file (for example the format byte) without consuming it
+    # It returns None at the end of the file
+    def peek_byte(self):
+        self.align()
+        self.fill(1)
+        if self.remaining_bytes() == 0:
+            return None
+        return self.buf[self.bit_pos >> 3]
+
     # Use this method to read a single bit from opened file
     # It returns False if a 0 was read, 1 otherwise
-    def read_bit(self):  
-        if self.mask == 0:     # all bits consumed, need to read in the next byte
-            self.byte = self.read_byte()
-            self.mask = 1 << 7
-        bit = self.byte & self.mask
-        self.mask = self.mask >> 1
+    def read_bit(self):
+        start = self.bit_pos >> 3
+        if start >= len(self.buf):
+            start -= self.fill(1)
+        if start < len(self.buf):
+            bit = self.buf[start] & (0x80 >> (self.bit_pos & 7))
+        else:
+            bit = 0
+        self.bit_pos += 1
         if bit == 0:
             return False
         else:
             return True
-         
+
+    # Use this method to read the next n bits as an unsigned int, first bit most significant
+    # Past the end of the file the missing bits read as 0s, like the padding in the last byte
+    def read_bits(self, n):
+        value = self.peek_bits(n)
+        self.bit_pos += n
+        return value
+
+    # Returns the next n bits as read_bits does, without consuming them
+    def peek_bits(self, n):
+        start = self.bit_pos >> 3
+        end = (self.bit_pos + n + 7) >> 3
+        if end > len(self.buf):
+            dropped = self.fill(end - start)
+            start -= dropped
+            end -= dropped
+        value = int.from_bytes(self.view[start:end], 'big')
+        missing = end - len(self.buf)
+        if missing > 0:
+            value <<= missing * 8
+        return (value >> (((end - start) << 3) - (self.bit_pos & 7) - n)) & ((1 << n) - 1)
+
+    # Consumes the next n bits without looking at them
+    def skip_bits(self, n):
+        self.bit_pos += n
+
+    # Skips what is left of a partly read byte so the next read starts on a byte boundary
+    def align(self):
+        self.bit_pos = (self.bit_pos + 7) & ~7
+
     # Reads a 1 byte from opened file and returns as unsigned int
     # You should not need to call this method
     def read_byte(self):
-        return struct.unpack('B', self.file.read(1))[0]  # 1 byte unsigned int      
+        self.align()
+        start = self.bit_pos >> 3
+        if start >= len(self.buf):
+            start -= self.fill(1)
+        byte = struct.unpack('B', self.buf[start:start + 1])[0]  # 1 byte unsigned int
+        self.bit_pos += 8
+        return byte
 
+    # Returns how many bytes after the current byte are already in the buffer
+    # You should not need to call this method
+    def remaining_bytes(self):
+        return max(len(self.buf) - (self.bit_pos >> 3), 0)
+
+    # Makes sure at least n_bytes bytes from the current byte on are in the buffer, reading a new block if not
+    # (fewer at the end of the file). Only the unread tail of the old buffer is copied
+    # Returns how many bytes were dropped from the front of the buffer; positions into it move back by that much
+    # You should not need to call this method
+    def fill(self, n_bytes):
+        start = self.bit_pos >> 3
+        if len(self.buf) - start >= n_bytes:
+            return 0
+        start = min(start, len(self.buf))
+        # read1 returns what is available instead of waiting for a whole block, which matters on pipes
+        read = getattr(self.file, 'read1', self.file.read)
+        parts = [self.buf[start:]]
+        have = len(parts[0])
+        while have < n_bytes:
+            more = read(max(self.block_size, n_bytes - have))
+            if len(more) == 0:
+                break
+            parts.append(more)
+            have += len(more)
+        self.buf = b''.join(parts)
+        self.view = memoryview(self.buf)
+        self.bit_pos -= start * 8
+        return start
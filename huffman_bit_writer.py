@@ -1,34 +1,69 @@
-import struct 
-
 #   Bit-packing writer for Huffman encoder
 class HuffmanBitWriter:
     # side effect: open a file with file name 'fname' for writing in binary mode
-    def __init__(self, fname):
-        self.file = open(fname, 'wb') # open a file with file name fname
+    # fname may also be a file object already open in binary mode (for example an io.BytesIO); close() leaves it open
+    # Whole bytes are collected in a buffer and written out buffer_size bytes at a time
+    def __init__(self, fname, buffer_size=1 << 16):
+        self.owns_file = isinstance(fname, str)
+        if self.owns_file:
+            self.file = open(fname, 'wb') # open a file with file name fname
+        else:
+            self.file = fname
         self.n_bits = 0               # Number of accumulated bits so far
-        self.byte = 0                 # accumulated bits represented as byte 
+        self.byte = 0                 # accumulated bits represented as an integer, oldest bit highest
+        self.buffer = bytearray()     # whole bytes waiting to be written to the file
+        self.buffer_size = buffer_size
 
-   # Use this method to close the compressed file 
+   # Use this method to close the compressed file
     def close(self):
       # need to pad remaining bits in byte with 0s and write them to file
+        self.move_bytes()
         if self.n_bits > 0:
-            self.byte = self.byte << (7-self.n_bits)
-            self.file.write(struct.pack('B', self.byte)) 
-        self.file.close()
-      
-    # Use this method to write the header to the compressed file. 
+            self.buffer.append(self.byte << (8-self.n_bits))
+            self.byte = 0
+            self.n_bits = 0
+        self.flush()
+        if self.owns_file:
+            self.file.close()
+
+    # Use this method to write the header to the compressed file.
     def write_str(self, str): # str is a string
-        self.file.write(str.encode('utf-8'))
-   
-    # Use this method to write individual 0 and 1 bits to the compressed file  
+        self.write_bytes(str.encode('utf-8'))
+
+    # Use this method to write a binary header to the compressed file
+    # Only whole bytes of bits written so far go out before it, as with write_str
+    def write_bytes(self, data): # data is a bytes object
+        self.move_bytes()
+        self.flush()
+        self.file.write(data)
+
+    # Use this method to write individual 0 and 1 bits to the compressed file
     def write_code(self, code): # code is a string of '0's and '1's
-        for bit in code:
-            if bit == '1': self.byte += 1
-            if self.n_bits == 7:
-                self.file.write(struct.pack('B', self.byte)) 
-                self.byte = 0
-                self.n_bits = 0
-            else:
-                self.byte = self.byte << 1
-                self.n_bits += 1
-   
+        if code != '':
+            self.write_bits(int(code, 2), len(code))
+
+    # Use this method to write the low nbits bits of value, most significant bit first
+    # Codes kept as (value, nbits) pairs can be written without going through strings
+    def write_bits(self, value, nbits):
+        self.byte = (self.byte << nbits) | value
+        self.n_bits += nbits
+        if self.n_bits >= 64:
+            self.move_bytes()
+
+    # Moves the whole bytes in the accumulator into the buffer, writing the buffer out once it is full
+    # You should not need to call this method
+    def move_bytes(self):
+        n_bytes = self.n_bits >> 3
+        if n_bytes > 0:
+            self.n_bits &= 7
+            self.buffer += (self.byte >> self.n_bits).to_bytes(n_bytes, 'big')
+            self.byte &= (1 << self.n_bits) - 1
+            if len(self.buffer) >= self.buffer_size:
+                self.flush()
+
+    # Writes the buffered bytes to the file
+    # You should not need to call this method
+    def flush(self):
+        if len(self.buffer) > 0:
+            self.file.write(self.buffer)
+            self.buffer = bytearray()
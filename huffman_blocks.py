@@ -0,0 +1,174 @@
+#
+#   Block container for parallel Huffman compression
+#
+#   The input is cut into blocks of block_size bytes and every block is compressed on its own
+#   with encode_bytes (canonical codes, its own code table), so blocks can be encoded and
+#   decoded on separate CPU cores.
+#
+#   Layout of a block container file:
+#       FORMAT_BLOCKS byte
+#       block size, total number of bytes, number of blocks   (struct HEADER_STRUCT)
+#       block directory: for each block, where its compressed bytes start in the file and how many
+#                        there are                             (struct ENTRY_STRUCT per block)
+#       the compressed blocks, one after the other
+#
+#   The directory doubles as a seek index: block i holds the bytes from i * block_size on, and its
+#   entry sits at a fixed place in the file, so read_range can go straight to the blocks it needs.
+#
+
+import collections
+import concurrent.futures
+import functools
+import os
+import struct
+from huffman import *
+
+BLOCK_SIZE = 1 << 20          # bytes of input per block
+HEADER_STRUCT = struct.Struct('>IQI')
+ENTRY_STRUCT = struct.Struct('>QI')
+
+
+def read_blocks(fin, block_size):
+    """Yields the contents of the binary file object fin, block_size bytes at a time"""
+    block = fin.read(block_size)
+    while len(block) > 0:
+        yield block
+        block = fin.read(block_size)
+
+
+def map_in_order(pool, func, items, window):
+    """Like pool.map(func, items), but never has more than window calls in flight
+    pool.map submits everything at once, which would read a whole large input into memory"""
+    pending = collections.deque()
+    for item in items:
+        pending.append(pool.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def parallel_map(func, items, workers, threads=False):
+    """Yields func(item) for each item, in order, using a process pool when workers is more than 1
+    workers=None means one worker per CPU core; threads=True uses a thread pool instead of processes"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        for item in items:
+            yield func(item)
+        return
+    if threads:
+        executor = concurrent.futures.ThreadPoolExecutor
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor
+    with executor(workers) as pool:
+        for result in map_in_order(pool, func, items, 2 * workers):
+            yield result
+
+
+def huffman_encode_blocks(in_file, out_file, block_size=BLOCK_SIZE, workers=None, max_code_len=None):
+    """Compresses in_file into a block container file out_file, encoding the blocks on up to workers processes
+    (one per CPU core when workers is None). Only about two blocks per worker are held in memory at a time
+    max_code_len caps the code length in every block, as in huffman_encode
+    If encoding fails part way, out_file is removed rather than left holding a partial container"""
+    if block_size <= 0:
+        raise ValueError('block_size must be positive, got %d' % block_size)
+    check_max_code_len(max_code_len)
+    try:
+        fin = open(in_file, 'rb')
+        fout = open(out_file, 'wb')
+    except:
+        raise FileNotFoundError
+    try:
+        with fin, fout:
+            total = os.path.getsize(in_file)
+            n_blocks = (total + block_size - 1) // block_size
+            fout.write(bytes([FORMAT_BLOCKS]))
+            fout.write(HEADER_STRUCT.pack(block_size, total, n_blocks))
+            directory_pos = fout.tell()
+            fout.write(bytes(ENTRY_STRUCT.size * n_blocks))   # filled in once the block sizes are known
+            directory = []
+            encode = functools.partial(encode_bytes, max_code_len=max_code_len)
+            for compressed in parallel_map(encode, read_blocks(fin, block_size), workers):
+                directory.append(ENTRY_STRUCT.pack(fout.tell(), len(compressed)))
+                fout.write(compressed)
+            fout.seek(directory_pos)
+            fout.write(b''.join(directory))
+    except BaseException:
+        os.remove(out_file)
+        raise
+
+
+def read_block_header(fin):
+    """Reads the header of a block container from the binary file object fin, positioned at its start
+    Returns a tuple (block size, total number of bytes, number of blocks)"""
+    if fin.read(1) != bytes([FORMAT_BLOCKS]):
+        raise ValueError('not a block container file')
+    return HEADER_STRUCT.unpack(fin.read(HEADER_STRUCT.size))
+
+
+def read_directory(fin, n_blocks):
+    """Reads the block directory that follows the header; returns a list of (offset, length) pairs"""
+    data = fin.read(ENTRY_STRUCT.size * n_blocks)
+    return [ENTRY_STRUCT.unpack_from(data, i * ENTRY_STRUCT.size) for i in range(n_blocks)]
+
+
+def decode_block_at(job):
+    """Decodes one block; job is (file name, offset, length). The block is read by the worker itself"""
+    encoded_file, offset, length = job
+    with open(encoded_file, 'rb') as fin:
+        fin.seek(offset)
+        return decode_bytes(fin.read(length))
+
+
+def block_chunks(fin, chunk_size=CHUNK_SIZE):
+    """Yields the decoded bytes of the block container file open as the binary file object fin, chunk_size bytes at a
+    time; one block is decoded at a time"""
+    block_size, total, n_blocks = read_block_header(fin)
+    for offset, length in read_directory(fin, n_blocks):
+        fin.seek(offset)
+        block = decode_bytes(fin.read(length))
+        for start in range(0, len(block), chunk_size):
+            yield block[start:start + chunk_size]
+
+
+def huffman_decode_blocks(encoded_file, decode_file, workers=None):
+    """Decodes a block container file, dispatching the blocks from its directory to up to workers processes
+    The decoded blocks are written to decode_file in order"""
+    try:
+        fin = open(encoded_file, 'rb')
+        fout = open(decode_file, 'wb')
+    except:
+        raise FileNotFoundError
+    with fout:
+        with fin:
+            block_size, total, n_blocks = read_block_header(fin)
+            jobs = [(encoded_file, offset, length) for offset, length in read_directory(fin, n_blocks)]
+        for block in parallel_map(decode_block_at, jobs, workers):
+            fout.write(block)
+
+
+def read_range(encoded_file, start, length):
+    """Returns up to length bytes of the original data, starting at offset start, from a block container file
+    Only the directory entries and blocks that hold the range are read and decoded, so the cost depends on
+    length and the block size but not on the size of the file"""
+    if start < 0 or length < 0:
+        raise ValueError('start and length must not be negative')
+    try:
+        fin = open(encoded_file, 'rb')
+    except:
+        raise FileNotFoundError
+    with fin:
+        block_size, total, n_blocks = read_block_header(fin)
+        end = min(start + length, total)
+        if start >= end:
+            return b''
+        first = start // block_size
+        last = (end - 1) // block_size
+        fin.seek(1 + HEADER_STRUCT.size + first * ENTRY_STRUCT.size)
+        parts = []
+        for offset, size in read_directory(fin, last - first + 1):
+            fin.seek(offset)
+            parts.append(decode_bytes(fin.read(size)))
+    skip = start - first * block_size
+    return b''.join(parts)[skip:skip + end - start]
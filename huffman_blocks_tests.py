@@ -0,0 +1,68 @@
+import unittest
+import filecmp
+import os
+import tempfile
+from huffman_blocks import *
+
+class TestList(unittest.TestCase):
+    def test_blocks_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            encoded = os.path.join(tmp, 'encoded.bin')
+            decoded = os.path.join(tmp, 'decoded.txt')
+            for name in ['declaration.txt', 'file1.txt', 'single_char.txt', 'empty_file.txt']:
+                for workers in (1, 2):
+                    huffman_encode_blocks(name, encoded, block_size=1000, workers=workers)
+                    huffman_decode_blocks(encoded, decoded, workers=workers)
+                    self.assertTrue(filecmp.cmp(name, decoded, shallow=False))
+                huffman_decode(encoded, decoded)
+                self.assertTrue(filecmp.cmp(name, decoded, shallow=False))
+
+    def test_block_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            encoded = os.path.join(tmp, 'encoded.bin')
+            huffman_encode_blocks('declaration.txt', encoded, block_size=3000, workers=1)
+            with open(encoded, 'rb') as fin:
+                self.assertEqual(read_block_header(fin), (3000, 8226, 3))
+                directory = read_directory(fin, 3)
+                self.assertEqual(directory[0][0], 1 + HEADER_STRUCT.size + 3 * ENTRY_STRUCT.size)
+                self.assertEqual(directory[1][0], directory[0][0] + directory[0][1])
+                self.assertEqual(directory[2][0] + directory[2][1], os.path.getsize(encoded))
+                fin.seek(directory[1][0])
+                with open('declaration.txt', 'rb') as f:
+                    self.assertEqual(decode_bytes(fin.read(directory[1][1])), f.read()[3000:6000])
+
+    def test_read_range(self):
+        with open('declaration.txt', 'rb') as f:
+            data = f.read()
+        with tempfile.TemporaryDirectory() as tmp:
+            encoded = os.path.join(tmp, 'encoded.bin')
+            huffman_encode_blocks('declaration.txt', encoded, block_size=500, workers=1)
+            for start, length in [(0, 10), (495, 10), (500, 500), (1234, 4000), (8200, 100), (0, 8226), (9000, 5), (10, 0)]:
+                self.assertEqual(read_range(encoded, start, length), data[start:start + length])
+            with self.assertRaises(ValueError):
+                read_range(encoded, -1, 10)
+        with self.assertRaises(FileNotFoundError):
+            read_range('ddafd_compressed.txt', 0, 10)
+
+    def test_blocks_errors(self):
+        with self.assertRaises(FileNotFoundError):
+            huffman_encode_blocks('ddafd.txt', 'ddafd_out.txt')
+        with self.assertRaises(FileNotFoundError):
+            huffman_decode_blocks('ddafd_compressed.txt', 'ddafd_decoded.txt')
+        with tempfile.TemporaryDirectory() as tmp:
+            encoded = os.path.join(tmp, 'encoded.bin')
+            for max_code_len in (0, 4):
+                with self.assertRaises(ValueError):
+                    huffman_encode_blocks('declaration.txt', encoded, block_size=500, workers=1, max_code_len=max_code_len)
+            # a block that fails to encode leaves no partial container behind
+            self.assertFalse(os.path.exists(encoded))
+            with open(encoded, 'w') as f:
+                f.write('kept')
+            for block_size in (0, -1):
+                with self.assertRaises(ValueError):
+                    huffman_encode_blocks('declaration.txt', encoded, block_size=block_size)
+            with open(encoded) as f:
+                self.assertEqual(f.read(), 'kept')
+
+if __name__ == '__main__': 
+   unittest.main()
@@ -0,0 +1,233 @@
+#
+#   Order-1 context Huffman coding
+#
+#   Each character is coded with a table chosen by the character before it (the first character
+#   counts as following a 0 byte). After a 'q', for example, a 'u' gets a very short code. A context
+#   only gets a table of its own if that saves more bits than the table costs to store; the rest
+#   share one table built from their combined counts (see choose_tables).
+#
+#   Layout of a context file:
+#       FORMAT_CONTEXT byte
+#       number of characters, number of tables                      (varints)
+#       the code lengths of each table                               (encode_code_lengths)
+#       a bitmap of the contexts that occur, 32 bytes, then the table used by each of them (varints)
+#       the code bits, zero padded to a byte
+#
+
+import collections
+import io
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from huffman import *
+
+CLUSTER_ROUNDS = 4   # passes of choose_tables over the contexts
+
+
+def count_pairs(data, counts=None, prev=0):
+    """Adds the pairs in the bytes data, the first of which follows the byte prev, to counts (a new one if it is None)
+    and returns counts, a list of 256 frequency lists: counts[prev][char] is how often char follows prev"""
+    if counts is None:
+        counts = [[0] * 256 for _ in range(256)]
+    if len(data) == 0:
+        return counts
+    pairs = collections.Counter(zip(bytes([prev]) + data[:-1], data))
+    for (before, char), n in pairs.items():
+        counts[before][char] += n
+    return counts
+
+
+def table_cost(counts, lengths):
+    """Returns the bits needed to code the characters counted in counts with the code lengths lengths, or None if a
+    counted character has no code"""
+    bits = 0
+    for char in range(256):
+        if counts[char] != 0:
+            if lengths[char] == 0:
+                return None
+            bits += counts[char] * lengths[char]
+    return bits
+
+
+def choose_tables(counts):
+    """Decides which contexts get a table of their own, from the pair counts of count_pairs
+    A context keeps its own table when coding it with that table, plus storing the table, takes fewer bits than coding
+    it with the shared table; the shared table is then rebuilt from the contexts left and the choice made again
+    Returns (list of code length tables, list of 256 table numbers, one per context, or -1 for unused contexts)"""
+    used = [prev for prev in range(256) if sum(counts[prev]) != 0]
+    own_lengths = {}
+    for prev in used:
+        own_lengths[prev] = create_code_lengths(create_huff_tree(counts[prev]))
+    own = set()
+    shared = [sum(counts[prev][char] for prev in used) for char in range(256)]
+    for _ in range(CLUSTER_ROUNDS):
+        shared_lengths = create_code_lengths(create_huff_tree(shared))
+        chosen = set()
+        for prev in used:
+            own_bits = table_cost(counts[prev], own_lengths[prev]) + 8 * len(encode_code_lengths(own_lengths[prev]))
+            shared_bits = table_cost(counts[prev], shared_lengths)
+            if shared_bits is None or own_bits < shared_bits:
+                chosen.add(prev)
+        shared = [sum(counts[prev][char] for prev in used if prev not in chosen) for char in range(256)]
+        if chosen == own:
+            break
+        own = chosen
+    tables = []
+    table_of = [-1] * 256
+    if len(own) < len(used):
+        tables.append(create_code_lengths(create_huff_tree(shared)))
+        for prev in used:
+            table_of[prev] = 0
+    for prev in used:
+        if prev in own:
+            table_of[prev] = len(tables)
+            tables.append(own_lengths[prev])
+    return (tables, table_of)
+
+
+def pair_codes(tables, table_of):
+    """Returns the codes of every (previous character, character) pair as a list of 65536 (value, length) pairs
+    indexed by prev * 256 + char"""
+    codes = [(0, 0)] * 65536
+    books = [canonical_codebook(lengths) for lengths in tables]
+    for prev in range(256):
+        if table_of[prev] >= 0:
+            table_codes = books[table_of[prev]].codes
+            for char in range(256):
+                if table_codes[char] != '':
+                    codes[(prev << 8) | char] = (int(table_codes[char], 2), len(table_codes[char]))
+    return codes
+
+
+def write_context_codes(bit, data, codes, prev=0):
+    """Writes the codes for the bytes in data, each looked up by the byte before it in the pair codes codes; the first
+    byte follows the byte prev"""
+    max_len = max(length for value, length in codes)
+    if numpy is not None and NUMPY_ENCODE and max_len <= NUMPY_MAX_CODE_LEN:
+        values = numpy.array([value for value, length in codes], dtype=numpy.int64)
+        lengths = numpy.array([length for value, length in codes], dtype=numpy.int64)
+        syms = numpy.frombuffer(data, dtype=numpy.uint8).astype(numpy.int64)
+        prevs = numpy.concatenate((numpy.full(1, prev, dtype=numpy.int64), syms[:-1]))
+        pairs = (prevs << 8) | syms
+        for start in range(0, len(data), CHUNK_SIZE):
+            write_bit_array(bit, numpy_symbol_bits(pairs[start:start + CHUNK_SIZE], values, lengths))
+        return
+    strings = [format(value, '0%db' % length) if length else '' for value, length in codes]
+    for start in range(0, len(data), CHUNK_SIZE):
+        chunk = data[start:start + CHUNK_SIZE]
+        bit.write_code(''.join([strings[(p << 8) | c] for p, c in zip(bytes([prev]) + chunk[:-1], chunk)]))
+        prev = chunk[-1]
+
+
+def create_context_header(char_num, tables, table_of):
+    """Returns the header of a context-format stream of char_num bytes coded with the tables of choose_tables"""
+    header = bytearray([FORMAT_CONTEXT])
+    header += encode_varint(char_num)
+    header += encode_varint(len(tables))
+    for lengths in tables:
+        header += encode_code_lengths(lengths)
+    bitmap = 0
+    for prev in range(256):
+        if table_of[prev] >= 0:
+            bitmap |= 1 << (255 - prev)
+    header += bitmap.to_bytes(32, 'big')
+    for prev in range(256):
+        if table_of[prev] >= 0:
+            header += encode_varint(table_of[prev])
+    return bytes(header)
+
+
+def context_encode_bytes(data):
+    """Compresses the bytes in data to the context format in memory and returns the compressed bytes"""
+    tables, table_of = choose_tables(count_pairs(data))
+    out = io.BytesIO()
+    bit = HuffmanBitWriter(out)
+    bit.write_bytes(create_context_header(len(data), tables, table_of))
+    if len(data) > 0:
+        write_context_codes(bit, data, pair_codes(tables, table_of))
+    bit.close()
+    return out.getvalue()
+
+
+def read_context_header(bit):
+    """Reads the header of a context-format stream from the HuffmanBitReader bit, positioned at the format byte
+    Returns (number of characters, list of 256 decode tables indexed by context)
+    A context that never occurs gets the first table, so decode_symbols can look up a table after any byte"""
+    if bit.read_byte() != FORMAT_CONTEXT:
+        raise ValueError('not a context-format stream')
+    char_num = read_varint(bit)
+    tables = [read_code_lengths(bit) for _ in range(read_varint(bit))]
+    bitmap = bit.read_bits(256)
+    decode_tables = [canonical_codebook(lengths).decode_table() for lengths in tables]
+    by_context = [None] * 256
+    for prev in range(256):
+        if bitmap & (1 << (255 - prev)):
+            by_context[prev] = decode_tables[read_varint(bit)]
+        elif len(decode_tables) > 0:
+            by_context[prev] = decode_tables[0]
+    return (char_num, by_context)
+
+
+def context_chunks(fin, chunk_size=CHUNK_SIZE):
+    """Yields the bytes decoded from the context format in the binary file object fin, positioned at the format byte,
+    chunk_size bytes at a time; each byte is decoded by decode_symbols with the table of the byte before it"""
+    bit = HuffmanBitReader(fin)
+    char_num, by_context = read_context_header(bit)
+    prev = 0
+    while char_num > 0:
+        chunk = decode_symbols(bit, by_context[prev], min(chunk_size, char_num), contexts=by_context)
+        prev = chunk[-1]
+        char_num -= len(chunk)
+        yield chunk
+    bit.close()
+
+
+def context_decode_bytes(data):
+    """Decodes bytes produced by context_encode_bytes and returns the original bytes"""
+    return b''.join(context_chunks(io.BytesIO(data), DECODE_CHUNK_SIZE))
+
+
+def huffman_encode_context(in_file, out_file):
+    """Compresses the file in_file to out_file in the context format
+    The file is read twice, CHUNK_SIZE bytes at a time, once to count the pairs and once to code them; each chunk
+    carries on from the last byte of the chunk before it"""
+    try:
+        fin = open(in_file, 'rb')
+        fout = open(out_file, 'wb')
+    except:
+        raise FileNotFoundError
+    with fin, fout:
+        counts = count_pairs(b'')
+        char_num = 0
+        prev = 0
+        for chunk in iter(lambda: fin.read(CHUNK_SIZE), b''):
+            counts = count_pairs(chunk, counts, prev)
+            char_num += len(chunk)
+            prev = chunk[-1]
+        tables, table_of = choose_tables(counts)
+        bit = HuffmanBitWriter(fout)
+        bit.write_bytes(create_context_header(char_num, tables, table_of))
+        if char_num > 0:
+            codes = pair_codes(tables, table_of)
+            fin.seek(0)
+            prev = 0
+            for chunk in iter(lambda: fin.read(CHUNK_SIZE), b''):
+                write_context_codes(bit, chunk, codes, prev)
+                prev = chunk[-1]
+        bit.close()
+
+
+def huffman_decode_context(encoded_file, decode_file):
+    """Decodes a context-format file written by huffman_encode_context, writing it out DECODE_CHUNK_SIZE bytes at a time"""
+    try:
+        fin = open(encoded_file, 'rb')
+        fout = open(decode_file, 'wb')
+    except:
+        raise FileNotFoundError
+    for chunk in context_chunks(fin, DECODE_CHUNK_SIZE):
+        fout.write(chunk)
+    fout.close()
+    fin.close()
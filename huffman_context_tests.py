@@ -0,0 +1,76 @@
+import unittest
+import filecmp
+import os
+import tempfile
+import huffman
+import huffman_context
+from huffman_context import *
+
+class TestList(unittest.TestCase):
+    def test_count_pairs(self):
+        counts = count_pairs(b'abab')
+        self.assertEqual(counts[0][ord('a')], 1)
+        self.assertEqual(counts[ord('a')][ord('b')], 2)
+        self.assertEqual(counts[ord('b')][ord('a')], 1)
+        self.assertEqual(sum(sum(row) for row in counts), 4)
+        # counting in pieces, each following the last byte of the one before, gives the same counts
+        self.assertEqual(count_pairs(b'ab', count_pairs(b'ab'), ord('b')), counts)
+
+    def test_choose_tables(self):
+        # after 'q' always 'u': that context is worth a table of its own
+        data = b'quiet quick quest queue ' * 50
+        tables, table_of = choose_tables(count_pairs(data))
+        q = table_of[ord('q')]
+        self.assertGreater(q, 0)
+        self.assertEqual([i for i in range(256) if tables[q][i] != 0], [ord('u')])
+        self.assertEqual(table_of[ord('z')], -1)
+        for prev in set(data):
+            for char in range(256):
+                if count_pairs(data)[prev][char]:
+                    self.assertNotEqual(tables[table_of[prev]][char], 0)
+
+    def test_context_round_trip(self):
+        for name in ['declaration.txt', 'file1.txt', 'file2.txt', 'multiline.txt', 'single_char.txt', 'empty_file.txt']:
+            with open(name, 'rb') as f:
+                data = f.read()
+            for flag in (False, True):
+                huffman.NUMPY_ENCODE = flag
+                try:
+                    encoded = context_encode_bytes(data)
+                finally:
+                    huffman.NUMPY_ENCODE = True
+                self.assertEqual(context_decode_bytes(encoded), data)
+        data = bytes(range(256)) * 20 + b'\x00\xff' * 500
+        self.assertEqual(context_decode_bytes(context_encode_bytes(data)), data)
+        with open('declaration.txt', 'rb') as f:
+            data = f.read()
+        self.assertLess(len(context_encode_bytes(data)), len(encode_bytes(data)))
+        with self.assertRaises(ValueError):
+            context_decode_bytes(encode_bytes(data))
+
+    def test_context_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            encoded = os.path.join(tmp, 'encoded.bin')
+            decoded = os.path.join(tmp, 'decoded.txt')
+            huffman_encode_context('declaration.txt', encoded)
+            huffman_decode_context(encoded, decoded)
+            self.assertTrue(filecmp.cmp('declaration.txt', decoded, shallow=False))
+            # the file is coded in chunks that carry the context across, to the same bytes as coding it whole
+            with open('declaration.txt', 'rb') as f:
+                whole = context_encode_bytes(f.read())
+            huffman_context.CHUNK_SIZE = 1000
+            try:
+                huffman_encode_context('declaration.txt', encoded)
+            finally:
+                huffman_context.CHUNK_SIZE = huffman.CHUNK_SIZE
+            with open(encoded, 'rb') as f:
+                self.assertEqual(f.read(), whole)
+            huffman_decode(encoded, decoded)
+            self.assertTrue(filecmp.cmp('declaration.txt', decoded, shallow=False))
+            with open('declaration.txt', 'rb') as f:
+                self.assertEqual(b''.join(iter_decode(encoded, chunk_size=7)), f.read())
+        with self.assertRaises(FileNotFoundError):
+            huffman_encode_context('ddafd.txt', 'ddafd_out.txt')
+
+if __name__ == '__main__': 
+   unittest.main()
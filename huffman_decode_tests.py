@@ -1,5 +1,8 @@
 import unittest
 import filecmp
+import io
+import os
+import tempfile
 from huffman import *
 import subprocess
 
@@ -43,6 +46,177 @@ class TestList(unittest.TestCase):
         self.assertEqual(err, 0)
 
 
+    def test_canonical_decode(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ['file1', 'file2', 'multiline', 'declaration', 'single_char', 'empty_file']:
+                out_file = os.path.join(tmp, name + '_out.txt')
+                decoded = os.path.join(tmp, name + '_decoded.txt')
+                huffman_encode(name + '.txt', out_file, canonical=True)
+                huffman_decode(os.path.join(tmp, name + '_out_compressed.txt'), decoded)
+                self.assertTrue(filecmp.cmp(name + '.txt', decoded, shallow=False))
+            self.assertEqual(os.path.getsize(os.path.join(tmp, 'file1_out_compressed.txt')), 17)
+
+    def test_limited_code_length_decode(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out_file = os.path.join(tmp, 'declaration_out.txt')
+            decoded = os.path.join(tmp, 'declaration_decoded.txt')
+            for max_code_len in (7, 9, 12):
+                huffman_encode('declaration.txt', out_file, canonical=True, max_code_len=max_code_len)
+                huffman_decode(compressed_file_name(out_file), decoded)
+                self.assertTrue(filecmp.cmp('declaration.txt', decoded, shallow=False))
+            with self.assertRaises(ValueError):
+                huffman_encode('declaration.txt', out_file, max_code_len=12)
+            with open(out_file, 'w') as f:
+                f.write('kept')
+            for max_code_len in (0, 4):
+                with self.assertRaises(ValueError):
+                    huffman_encode('declaration.txt', out_file, canonical=True, max_code_len=max_code_len)
+            with open(out_file) as f:
+                self.assertEqual(f.read(), 'kept')
+
+    def test_binary_decode(self):
+        data = bytes(range(256)) + b'\r\n\r\n\x00\xff' * 50 + bytes(i * i % 251 for i in range(3000))
+        with tempfile.TemporaryDirectory() as tmp:
+            in_file = os.path.join(tmp, 'binary.txt')
+            with open(in_file, 'wb') as f:
+                f.write(data)
+            for canonical in (False, True):
+                out_file = os.path.join(tmp, 'binary_out.txt')
+                decoded = os.path.join(tmp, 'binary_decoded.txt')
+                huffman_encode(in_file, out_file, canonical=canonical, binary=True)
+                huffman_decode(compressed_file_name(out_file), decoded, binary=True)
+                self.assertTrue(filecmp.cmp(in_file, decoded, shallow=False))
+
+    def test_decode_symbols_long_codes(self):
+        # Fibonacci frequencies give a maximally skewed tree with codes longer than the first table level
+        freqs = [0] * 256
+        a, b = 1, 1
+        for i in range(65, 91):
+            freqs[i] = a
+            a, b = b, a + b
+        codes = create_code(create_huff_tree(freqs))
+        text = bytes(range(65, 91)) * 3 + b'ZZYA'
+        bits = ''.join(codes[c] for c in text)
+        bits += '0' * (-len(bits) % 8)
+        data = int(bits, 2).to_bytes(len(bits) // 8, 'big')
+        for table_bits in (1, 4, 10):
+            table = create_decode_table(codes, table_bits)
+            bit = HuffmanBitReader(io.BytesIO(data), block_size=3)
+            self.assertEqual(decode_symbols(bit, table, len(text)), text)
+
+    def test_bit_reader(self):
+        data = b'hdr 1\n' + bytes([0b10110011, 0b01011100, 0b11110000, 0xff])
+        bit = HuffmanBitReader(io.BytesIO(data), block_size=2)
+        self.assertEqual(bit.peek_byte(), ord('h'))
+        self.assertEqual(bit.read_str(), b'hdr 1\n')
+        self.assertEqual(bit.read_bits(3), 0b101)
+        self.assertEqual(bit.peek_bits(12), 0b100110101110)
+        self.assertEqual(bit.read_bits(12), 0b100110101110)
+        bit.skip_bits(1)
+        self.assertTrue(bit.read_bit())
+        bit.skip_bits(3)
+        self.assertFalse(bit.read_bit())
+        self.assertEqual(bit.read_bits(12), 0b000111111110)
+        self.assertEqual(bit.read_bits(4), 0)
+        self.assertEqual(bit.peek_byte(), None)
+        bit.close()
+
+    def test_stats(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out_file = os.path.join(tmp, 'out.txt')
+            decoded = os.path.join(tmp, 'decoded.txt')
+            for canonical in (False, True):
+                stats = HuffmanStats()
+                huffman_encode('declaration.txt', out_file, canonical, stats=stats)
+                counts = stats.as_dict()
+                size = os.path.getsize('declaration.txt')
+                self.assertEqual(counts['bytes_in'], size)
+                self.assertEqual(counts['symbols_encoded'], size)
+                self.assertEqual(counts['bytes_out'], os.path.getsize(compressed_file_name(out_file)))
+                with open(out_file) as f:
+                    self.assertEqual(counts['bits_written'], len(f.read()) - len(create_header(cnt_freq('declaration.txt'))) - 1)
+                for stage in ('count', 'tree', 'code', 'read', 'translate', 'write_bits'):
+                    self.assertIn(stage + '_seconds', counts)
+                stats = HuffmanStats()
+                huffman_decode(compressed_file_name(out_file), decoded, stats=stats)
+                counts = stats.as_dict()
+                self.assertEqual(counts['symbols_decoded'], size)
+                self.assertEqual(counts['bytes_out'], size)
+                self.assertLess(counts['table_misses'], size // 100)   # few codes are longer than the first level
+                self.assertIn('decode_seconds', counts)
+        bit = HuffmanBitReader(io.BytesIO(bytes([0x00, 0x04])))
+        stats = HuffmanStats()
+        codes = ['1' * 12, '0' * 12, '01']
+        self.assertEqual(list(decode_symbols(bit, create_decode_table(codes, 4), 2, stats)), [1, 2])
+        self.assertEqual(stats.counts, {'symbols_decoded': 2, 'table_misses': 1})
+
+    def test_iter_decode(self):
+        from huffman_blocks import huffman_encode_blocks
+        from huffman_adaptive import huffman_encode_adaptive
+        from huffman_async import huffman_encode_stream
+        with open('declaration.txt', 'rb') as f:
+            data = f.read()
+        with tempfile.TemporaryDirectory() as tmp:
+            out_file = os.path.join(tmp, 'out.txt')
+            encoded = {}
+            huffman_encode('declaration.txt', out_file)
+            encoded['legacy'] = compressed_file_name(out_file)
+            encoded['canonical'] = os.path.join(tmp, 'canonical.bin')
+            with open(encoded['canonical'], 'wb') as f:
+                f.write(encode_bytes(data))
+            encoded['blocks'] = os.path.join(tmp, 'blocks.bin')
+            huffman_encode_blocks('declaration.txt', encoded['blocks'], block_size=1000, workers=1)
+            encoded['adaptive'] = os.path.join(tmp, 'adaptive.bin')
+            huffman_encode_adaptive('declaration.txt', encoded['adaptive'])
+            encoded['stream'] = os.path.join(tmp, 'stream.bin')
+            huffman_encode_stream('declaration.txt', encoded['stream'], block_size=1000)
+            for name in encoded:
+                chunks = list(iter_decode(encoded[name], chunk_size=300))
+                self.assertEqual(b''.join(chunks), data)
+                self.assertTrue(all(len(chunk) == 300 for chunk in chunks[:-1]))
+                self.assertEqual(b''.join(iter_decode(encoded[name], 300, max_bytes=1234)), data[:1234])
+                self.assertEqual(b''.join(iter_decode(encoded[name], max_bytes=10)), data[:10])
+                self.assertEqual(list(iter_decode(encoded[name], max_bytes=0)), [])
+            chunks = iter_decode(encoded['legacy'], chunk_size=100)
+            self.assertEqual(next(chunks), data[:100])
+            chunks.close()
+            self.assertEqual(list(iter_decode('single_char_compressed_soln.txt', 5)), [b'ddddd'] * 3 + [b'ddd'])
+            self.assertEqual(list(iter_decode('empty_file_compressed_soln.txt')), [])
+        with self.assertRaises(FileNotFoundError):
+            next(iter_decode('ddafd_compressed.txt'))
+
+    def test_decode_into(self):
+        with open('declaration.txt', 'rb') as f:
+            data = f.read()
+        with tempfile.TemporaryDirectory() as tmp:
+            canonical = os.path.join(tmp, 'canonical.bin')
+            with open(canonical, 'wb') as f:
+                f.write(encode_bytes(data))
+            for name in (canonical, 'declaration_compressed_soln.txt'):
+                self.assertEqual(decoded_size(name), len(data))
+                out = bytearray(b'xy')
+                self.assertEqual(decode_into(name, out, 2), len(data))
+                self.assertEqual(out, b'xy' + data)
+                self.assertEqual(decode_into(name, out), len(data))   # reused without growing
+                self.assertEqual(len(out), len(data) + 2)
+                self.assertEqual(out[:len(data)], data)
+                with self.assertRaises(ValueError):
+                    decode_into(name, memoryview(bytearray(10)))
+            out = bytearray(3)
+            self.assertEqual(decode_into('single_char_compressed_soln.txt', out), 18)
+            self.assertEqual(out, b'd' * 18)
+            self.assertEqual(decode_into('empty_file_compressed_soln.txt', out), 0)
+            decoded = os.path.join(tmp, 'decoded.txt')
+            for name, expected in ((canonical, data), ('single_char_compressed_soln.txt', b'd' * 18),
+                                   ('empty_file_compressed_soln.txt', b'')):
+                huffman_decode(name, decoded, binary=True)
+                with open(decoded, 'rb') as f:
+                    self.assertEqual(f.read(), expected)
+            with open(decoded, 'wb') as f:
+                f.write(bytes([FORMAT_ADAPTIVE, 0]))
+            with self.assertRaises(ValueError):
+                decoded_size(decoded)
+
     def test_decode_errors(self):
         with self.assertRaises(FileNotFoundError):
             huffman_decode('ddafajldfjksldafadffd_compressed_soln.txt','ddaaldsfkjlasdffd_decoded.txt')
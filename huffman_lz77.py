@@ -0,0 +1,400 @@
+#
+#   LZ77 match finding in front of the Huffman coder (DEFLATE style)
+#
+#   Huffman coding of single bytes cannot take advantage of repeated phrases. Here the input is first
+#   turned into a list of tokens: a literal byte, or a match that copies length bytes from distance
+#   bytes back in the last 2**window_bits bytes. Matches are found with hash chains: every position
+#   is filed under its first MIN_MATCH bytes, and the chain of earlier positions with the same three
+#   bytes is searched for the longest match. The level picks how far the chains are followed and
+#   whether a match is put off by a byte when the next position has a longer one (lazy matching).
+#
+#   As in DEFLATE, literals and match lengths share one alphabet: 0 to 255 are literals, and
+#   256 + length_code(length)[0] starts a match, followed by extra bits that pin down the length and
+#   then the distance code from a second alphabet with its own extra bits. Length and distance codes
+#   follow DEFLATE's buckets (two codes per power of two for distances, four for lengths), carried on
+#   for windows past 32 KB. As in DEFLATE the input is coded in blocks of LZ77_BLOCK_SIZE bytes, and
+#   each block gets one Huffman table per alphabet, built from its token counts with
+#   create_code_lengths and sent as canonical code lengths. Matches reach back across blocks, so
+#   only the current block and the window before it are held in memory, encoding or decoding.
+#
+#   Layout of an LZ77 file:
+#       FORMAT_LZ77 byte
+#       number of bytes, window_bits                                 (varints)
+#       blocks, each:
+#           number of codes (a match has two: its length and its distance)    (varint)
+#           the code lengths of the literal/length table, then of the distance table (encode_code_lengths)
+#           the code bits, zero padded to a byte
+#
+#   From the shell:  python3 huffman_lz77.py encode in_file out_file [level]
+#                    python3 huffman_lz77.py decode in_file out_file
+#
+
+from array import array
+import collections
+import io
+import os
+import sys
+from huffman import *
+
+MIN_MATCH = 3
+MAX_MATCH = 258
+DEFAULT_LEVEL = 6
+DEFAULT_WINDOW_BITS = 15     # a 32 KB window, as in DEFLATE
+MAX_WINDOW_BITS = 24
+LENGTH_SYMBOLS = 28          # length codes, for lengths MIN_MATCH to MAX_MATCH
+DIST_CODE_BASE = 256 + LENGTH_SYMBOLS   # what distance codes are numbered from when decoding
+TOKEN_CHUNK = 1 << 16        # tokens turned into code bits, or codes decoded, at a time
+LZ77_BLOCK_SIZE = 1 << 20    # input bytes coded with one pair of tables
+
+# level -> (longest hash chain followed, match length that ends the search, lazy matching)
+LZ77_LEVELS = {1: (4, 8, False), 2: (8, 16, False), 3: (16, 32, False), 4: (16, 16, True), 5: (32, 32, True),
+               6: (128, 128, True), 7: (256, MAX_MATCH, True), 8: (1024, MAX_MATCH, True), 9: (4096, MAX_MATCH, True)}
+
+
+def length_code(length):
+    """Returns (code, extra bit count, extra bits) for a match length from MIN_MATCH to MAX_MATCH
+    Lengths 3 to 10 get a code each; above that every power of two is split into four codes"""
+    v = length - MIN_MATCH
+    if v < 8:
+        return (v, 0, 0)
+    nb = v.bit_length() - 1
+    return (4 * (nb - 1) + ((v >> (nb - 2)) & 3), nb - 2, v & ((1 << (nb - 2)) - 1))
+
+
+def distance_code(distance):
+    """Returns (code, extra bit count, extra bits) for a match distance of 1 or more
+    Distances 1 to 4 get a code each; above that every power of two is split into two codes"""
+    v = distance - 1
+    if v < 4:
+        return (v, 0, 0)
+    nb = v.bit_length() - 1
+    return (2 * nb + ((v >> (nb - 1)) & 1), nb - 1, v & ((1 << (nb - 1)) - 1))
+
+
+def length_bases():
+    """Returns (list of the smallest length of each length code, list of its extra bit counts)"""
+    bases = []
+    extras = []
+    for code in range(LENGTH_SYMBOLS):
+        if code < 8:
+            bases.append(code + MIN_MATCH)
+            extras.append(0)
+        else:
+            nb = code // 4 + 1
+            bases.append(((4 | (code & 3)) << (nb - 2)) + MIN_MATCH)
+            extras.append(nb - 2)
+    return (bases, extras)
+
+
+def distance_bases(window_bits):
+    """Returns (list of the smallest distance of each distance code, list of its extra bit counts) for the window"""
+    bases = []
+    extras = []
+    for code in range(2 * window_bits):
+        if code < 4:
+            bases.append(code + 1)
+            extras.append(0)
+        else:
+            nb = code // 2
+            bases.append(((2 | (code & 1)) << (nb - 1)) + 1)
+            extras.append(nb - 1)
+    return (bases, extras)
+
+
+def check_lz77_args(level, window_bits):
+    """Raises ValueError unless level is one of LZ77_LEVELS and window_bits is from 1 to MAX_WINDOW_BITS"""
+    if level not in LZ77_LEVELS:
+        raise ValueError('level must be one of %s' % sorted(LZ77_LEVELS))
+    if not 1 <= window_bits <= MAX_WINDOW_BITS:
+        raise ValueError('window_bits must be between 1 and %d' % MAX_WINDOW_BITS)
+
+
+def find_matches(data, window_bits=DEFAULT_WINDOW_BITS, level=DEFAULT_LEVEL, start=0):
+    """Turns the bytes data from start on into LZ77 tokens with hash chains; matches may reach back into data[:start]
+    Returns (symbols, lengths, distances): array('H') symbols holds a literal byte or 256 for each match, and the
+    match lengths and distances are in array('H') lengths and array('I') distances, in order"""
+    check_lz77_args(level, window_bits)
+    max_chain, nice, lazy = LZ77_LEVELS[level]
+    window = 1 << window_bits
+    n = len(data)
+    symbols = array('H')
+    lengths = array('H')
+    distances = array('I')
+    head = {}                      # first MIN_MATCH bytes -> the last position they were seen at
+    prev = array('i', [-1]) * n    # position -> the position before it with the same first bytes
+    last = n - MIN_MATCH           # the last position with MIN_MATCH bytes to hash
+
+    def longest(i):
+        # longest match for position i, which must already be in the chains, as (length, distance)
+        best_len = MIN_MATCH - 1
+        best_dist = 0
+        limit = min(MAX_MATCH, n - i)
+        j = prev[i]
+        chain = max_chain
+        while j >= 0 and i - j <= window and chain > 0:
+            if data[j + best_len] == data[i + best_len]:   # best_len < limit, or the search has stopped
+                length = MIN_MATCH
+                while length + 8 <= limit and data[i + length:i + length + 8] == data[j + length:j + length + 8]:
+                    length += 8
+                while length < limit and data[i + length] == data[j + length]:
+                    length += 1
+                if length > best_len:
+                    best_len = length
+                    best_dist = i - j
+                    if length >= nice or length >= limit:
+                        break
+            j = prev[j]
+            chain -= 1
+        return (best_len, best_dist)
+
+    for k in range(min(start, last + 1)):
+        key = data[k:k + MIN_MATCH]
+        prev[k] = head.get(key, -1)
+        head[key] = k
+    i = start
+    inserted = start - 1   # positions up to this one are in the chains
+    while i < n:
+        if i > last:
+            symbols.append(data[i])
+            i += 1
+            continue
+        if inserted < i:
+            key = data[i:i + MIN_MATCH]
+            prev[i] = head.get(key, -1)
+            head[key] = i
+            inserted = i
+        length, distance = longest(i)
+        if lazy and MIN_MATCH <= length < nice and i + 1 <= last:
+            key = data[i + 1:i + 1 + MIN_MATCH]
+            prev[i + 1] = head.get(key, -1)
+            head[key] = i + 1
+            inserted = i + 1
+            next_length, next_distance = longest(i + 1)
+            if next_length > length:
+                symbols.append(data[i])
+                i += 1
+                length = next_length
+                distance = next_distance
+        if length < MIN_MATCH:
+            symbols.append(data[i])
+            i += 1
+            continue
+        symbols.append(256)
+        lengths.append(length)
+        distances.append(distance)
+        end = min(i + length, last + 1)
+        get = head.get
+        for k in range(inserted + 1, end):
+            key = data[k:k + MIN_MATCH]
+            prev[k] = get(key, -1)
+            head[key] = k
+        inserted = max(inserted, end - 1)
+        i += length
+    return (symbols, lengths, distances)
+
+
+def token_counts(symbols, lengths, distances, window_bits):
+    """Returns (literal/length counts, distance counts) for the tokens of find_matches"""
+    litlen = [0] * (256 + LENGTH_SYMBOLS)
+    for byte, n in collections.Counter(symbols).items():
+        if byte < 256:
+            litlen[byte] = n
+    for length, n in collections.Counter(lengths).items():
+        litlen[256 + length_code(length)[0]] += n
+    dist = [0] * (2 * window_bits)
+    for distance, n in collections.Counter(distances).items():
+        dist[distance_code(distance)[0]] += n
+    return (litlen, dist)
+
+
+def write_tokens(bit, symbols, lengths, distances, litlen_codes, dist_codes):
+    """Writes the codes of the tokens with the HuffmanBitWriter bit, TOKEN_CHUNK tokens at a time
+    Every match length is looked up once in a table of its code and extra bits; distances are worked out as they come"""
+    length_strings = [''] * (MAX_MATCH + 1)
+    for length in range(MIN_MATCH, MAX_MATCH + 1):
+        code, nbits, extra = length_code(length)
+        length_strings[length] = litlen_codes[256 + code] + (format(extra, '0%db' % nbits) if nbits else '')
+    dist_strings = {}
+    match = 0
+    pieces = []
+    for i in range(len(symbols)):
+        sym = symbols[i]
+        if sym < 256:
+            pieces.append(litlen_codes[sym])
+        else:
+            distance = distances[match]
+            dist_string = dist_strings.get(distance)
+            if dist_string is None:
+                code, nbits, extra = distance_code(distance)
+                dist_string = dist_codes[code] + (format(extra, '0%db' % nbits) if nbits else '')
+                dist_strings[distance] = dist_string
+            pieces.append(length_strings[lengths[match]])
+            pieces.append(dist_string)
+            match += 1
+        if len(pieces) >= TOKEN_CHUNK:
+            bit.write_code(''.join(pieces))
+            pieces = []
+    bit.write_code(''.join(pieces))
+
+
+def write_block(fout, symbols, lengths, distances, window_bits):
+    """Writes the tokens of find_matches to the binary file object fout as one block, with tables built from their
+    counts"""
+    litlen, dist = token_counts(symbols, lengths, distances, window_bits)
+    litlen_lengths = create_code_lengths(create_huff_tree(litlen))
+    litlen_lengths += [0] * (len(litlen) - len(litlen_lengths))   # the tree's codes stop at its last symbol
+    dist_lengths = create_code_lengths(create_huff_tree(dist))
+    bit = HuffmanBitWriter(fout)
+    bit.write_bytes(encode_varint(len(symbols) + len(lengths)) + encode_code_lengths(litlen_lengths)
+                    + encode_code_lengths(dist_lengths))
+    write_tokens(bit, symbols, lengths, distances, canonical_codebook(litlen_lengths).codes,
+                 canonical_codebook(dist_lengths).codes)
+    bit.close()
+
+
+def write_lz77(fout, blocks, char_num, level=DEFAULT_LEVEL, window_bits=DEFAULT_WINDOW_BITS):
+    """Writes an LZ77 stream of char_num bytes to the binary file object fout, one block for each bytes piece of the
+    iterable blocks; only the last 2**window_bits bytes before a piece are kept for its matches"""
+    check_lz77_args(level, window_bits)
+    fout.write(bytes([FORMAT_LZ77]) + encode_varint(char_num) + encode_varint(window_bits))
+    window = 1 << window_bits
+    history = b''
+    for block in blocks:
+        data = history + block
+        write_block(fout, *find_matches(data, window_bits, level, len(history)), window_bits)
+        history = data[-window:]
+
+
+def lz77_encode_bytes(data, level=DEFAULT_LEVEL, window_bits=DEFAULT_WINDOW_BITS):
+    """Compresses the bytes in data to the LZ77 format in memory and returns the compressed bytes"""
+    out = io.BytesIO()
+    blocks = (data[start:start + LZ77_BLOCK_SIZE] for start in range(0, len(data), LZ77_BLOCK_SIZE))
+    write_lz77(out, blocks, len(data), level, window_bits)
+    return out.getvalue()
+
+
+def block_tables(litlen_lengths, dist_lengths, window_bits):
+    """Returns (decode table of a block's first code, decode tables indexed by the code before, extra bit counts
+    indexed by code) for decode_symbols to decode an LZ77 block with
+    Distance code d is numbered DIST_CODE_BASE + d, so both alphabets share one range of symbols"""
+    dist_extra = distance_bases(window_bits)[1]
+    if any(litlen_lengths[DIST_CODE_BASE:]) or any(dist_lengths[len(dist_extra):]):
+        raise ValueError('LZ77 stream is damaged: a table has a code past the end of its alphabet')
+    litlen_lengths = (litlen_lengths + [0] * LENGTH_SYMBOLS)[:DIST_CODE_BASE]
+    dist_lengths = dist_lengths[:len(dist_extra)]
+    litlen_table = canonical_codebook(litlen_lengths).decode_table()
+    dist_table = litlen_table   # never used: with no distance codes there are no length codes either
+    if any(dist_lengths):
+        dist_table = canonical_codebook([0] * DIST_CODE_BASE + dist_lengths).decode_table()
+    # a length code is followed by a distance code, anything else by a literal or a length code
+    contexts = [litlen_table] * 256 + [dist_table] * LENGTH_SYMBOLS + [litlen_table] * len(dist_lengths)
+    extra = [0] * 256 + length_bases()[1] + dist_extra[:len(dist_lengths)]
+    return (litlen_table, contexts, extra)
+
+
+def lz77_chunks(fin, chunk_size=CHUNK_SIZE):
+    """Yields the bytes decoded from the LZ77 format in the binary file object fin, positioned at the format byte,
+    about chunk_size bytes at a time; only the last window of output is kept for the matches to copy from
+    The codes of a block are decoded TOKEN_CHUNK at a time by decode_symbols, each with the table the code before it
+    picks, then replayed"""
+    bit = HuffmanBitReader(fin)
+    if bit.read_byte() != FORMAT_LZ77:
+        raise ValueError('not an LZ77-format stream')
+    left = read_varint(bit)
+    window_bits = read_varint(bit)
+    len_base = length_bases()[0]
+    dist_base = distance_bases(window_bits)[0]
+    window = 1 << window_bits
+    codes = array('H', [0]) * TOKEN_CHUNK
+    values = array('I', [0]) * TOKEN_CHUNK
+    out = bytearray()
+    kept = 0        # bytes at the front of out that have been yielded and are only kept for matches to copy
+    while left > 0:
+        code_num = read_varint(bit)
+        litlen_lengths = read_code_lengths(bit)
+        dist_lengths = read_code_lengths(bit)
+        if code_num == 0:
+            raise ValueError('LZ77 stream is damaged: a block has no codes')
+        table, contexts, extra = block_tables(litlen_lengths, dist_lengths, window_bits)
+        match_len = 0   # length of the match whose distance code comes next, which may be in the next batch
+        while code_num > 0:
+            n = min(TOKEN_CHUNK, code_num)
+            decode_symbols(bit, table, n, None, codes, 0, contexts, extra, values)
+            table = contexts[codes[n - 1]]
+            code_num -= n
+            for i in range(n):
+                code = codes[i]
+                if code < 256:
+                    out.append(code)
+                    left -= 1
+                elif code < DIST_CODE_BASE:
+                    match_len = len_base[code - 256] + values[i]
+                else:
+                    distance = dist_base[code - DIST_CODE_BASE] + values[i]
+                    if distance > len(out) or match_len > left:
+                        raise ValueError('LZ77 stream is damaged: a match reaches outside the data')
+                    begin = len(out) - distance
+                    if distance >= match_len:
+                        out += out[begin:begin + match_len]
+                    else:   # the match overlaps the bytes it makes, so its first distance bytes repeat
+                        out += (out[begin:] * (match_len // distance + 1))[:match_len]
+                    left -= match_len
+                    if len(out) - kept >= chunk_size:
+                        yield bytes(out[kept:])
+                        if len(out) > window:
+                            del out[:len(out) - window]
+                        kept = len(out)
+            if len(out) - kept >= chunk_size:   # a run of literals
+                yield bytes(out[kept:])
+                if len(out) > window:
+                    del out[:len(out) - window]
+                kept = len(out)
+        if left < 0:
+            raise ValueError('LZ77 stream is damaged: it holds more bytes than its header says')
+        bit.align()
+    if len(out) > kept:
+        yield bytes(out[kept:])
+    bit.close()
+
+
+def lz77_decode_bytes(data):
+    """Decodes bytes produced by lz77_encode_bytes and returns the original bytes"""
+    return b''.join(lz77_chunks(io.BytesIO(data), DECODE_CHUNK_SIZE))
+
+
+def huffman_encode_lz77(in_file, out_file, level=DEFAULT_LEVEL, window_bits=DEFAULT_WINDOW_BITS):
+    """Compresses the file in_file to out_file in the LZ77 format, reading it LZ77_BLOCK_SIZE bytes at a time"""
+    check_lz77_args(level, window_bits)
+    try:
+        fin = open(in_file, 'rb')
+        fout = open(out_file, 'wb')
+    except:
+        raise FileNotFoundError
+    with fin, fout:
+        write_lz77(fout, iter(lambda: fin.read(LZ77_BLOCK_SIZE), b''), os.fstat(fin.fileno()).st_size, level,
+                   window_bits)
+
+
+def huffman_decode_lz77(encoded_file, decode_file):
+    """Decodes an LZ77-format file written by huffman_encode_lz77, writing it out DECODE_CHUNK_SIZE bytes at a time"""
+    try:
+        fin = open(encoded_file, 'rb')
+        fout = open(decode_file, 'wb')
+    except:
+        raise FileNotFoundError
+    for chunk in lz77_chunks(fin, DECODE_CHUNK_SIZE):
+        fout.write(chunk)
+    fout.close()
+    fin.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (4, 5) or sys.argv[1] not in ('encode', 'decode'):
+        sys.exit('usage: python3 huffman_lz77.py encode|decode in_file out_file [level]')
+    if sys.argv[1] == 'encode':
+        level = DEFAULT_LEVEL
+        if len(sys.argv) == 5:
+            level = int(sys.argv[4])
+        huffman_encode_lz77(sys.argv[2], sys.argv[3], level)
+    else:
+        huffman_decode_lz77(sys.argv[2], sys.argv[3])
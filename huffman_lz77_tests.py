@@ -0,0 +1,111 @@
+import unittest
+import filecmp
+import os
+import random
+import tempfile
+import huffman_lz77
+from huffman_lz77 import *
+
+class TestList(unittest.TestCase):
+    def test_length_distance_codes(self):
+        bases, extras = length_bases()
+        for length in range(MIN_MATCH, MAX_MATCH + 1):
+            code, nbits, extra = length_code(length)
+            self.assertLess(code, LENGTH_SYMBOLS)
+            self.assertEqual((bases[code] + extra, extras[code]), (length, nbits))
+        # the same buckets as DEFLATE's length codes 257 to 284
+        self.assertEqual(length_code(11), (8, 1, 0))
+        self.assertEqual(length_code(227), (27, 5, 0))
+        bases, extras = distance_bases(MAX_WINDOW_BITS)
+        for distance in list(range(1, 5000)) + [32768, 32769, 1 << 20, 1 << MAX_WINDOW_BITS]:
+            code, nbits, extra = distance_code(distance)
+            self.assertEqual((bases[code] + extra, extras[code]), (distance, nbits))
+        self.assertEqual(distance_code(32768), (29, 13, 8191))
+        self.assertEqual(len(distance_bases(15)[0]), 30)
+
+    def test_find_matches(self):
+        symbols, lengths, distances = find_matches(b'abcabcabcabcx', level=1)
+        self.assertEqual(list(symbols), [97, 98, 99, 256, 120])
+        self.assertEqual((list(lengths), list(distances)), ([9], [3]))
+        symbols, lengths, distances = find_matches(b'a' * 1000)
+        self.assertEqual(list(symbols[:2]), [97, 256])
+        self.assertTrue(all(length <= MAX_MATCH for length in lengths))
+        self.assertEqual(1 + sum(lengths), 1000)
+        # with a 16 byte window a repeat 20 bytes back is out of reach
+        data = bytes(range(20)) * 2
+        self.assertEqual(list(find_matches(data, window_bits=4)[0]), list(data))
+        self.assertEqual(list(find_matches(data, window_bits=5)[2]), [20])
+        # from start on, with the bytes before it only there to be matched
+        symbols, lengths, distances = find_matches(b'abcdefabcdef', level=1, start=6)
+        self.assertEqual((list(symbols), list(lengths), list(distances)), ([256], [6], [6]))
+        with self.assertRaises(ValueError):
+            find_matches(data, level=10)
+        with self.assertRaises(ValueError):
+            find_matches(data, window_bits=MAX_WINDOW_BITS + 1)
+
+    def test_lz77_round_trip(self):
+        rng = random.Random(1)
+        with open('declaration.txt', 'rb') as f:
+            text = f.read()
+        inputs = [b'', b'a', b'ab', b'a' * 5000, b'abcabcabcabcx', bytes(rng.randbytes(3000)), text,
+                  bytes(rng.choice(b'ab') for _ in range(20000))]
+        for data in inputs:
+            for level in (1, 4, 9):
+                for window_bits in (8, DEFAULT_WINDOW_BITS, 20):
+                    encoded = lz77_encode_bytes(data, level, window_bits)
+                    self.assertEqual(lz77_decode_bytes(encoded), data)
+                    self.assertEqual(b''.join(lz77_chunks(io.BytesIO(encoded), 100)), data)
+        self.assertLess(len(lz77_encode_bytes(text)), len(encode_bytes(text)) * 0.85)
+        with self.assertRaises(ValueError):
+            lz77_decode_bytes(encode_bytes(text))
+
+    def test_lz77_blocks(self):
+        with open('declaration.txt', 'rb') as f:
+            text = f.read()
+        data = text * 3 + bytes(random.Random(2).randbytes(5000))
+        whole = lz77_encode_bytes(data)
+        huffman_lz77.LZ77_BLOCK_SIZE = 1000
+        try:
+            encoded = lz77_encode_bytes(data)
+            # matches reach back into the blocks before, so the second and third copies of the text cost little
+            self.assertLess(len(lz77_encode_bytes(text * 3)), len(lz77_encode_bytes(text)) + 1000)
+        finally:
+            huffman_lz77.LZ77_BLOCK_SIZE = 1 << 20
+        self.assertNotEqual(encoded, whole)
+        self.assertEqual(lz77_decode_bytes(encoded), data)
+        self.assertEqual(b''.join(lz77_chunks(io.BytesIO(encoded), 100)), data)
+        with self.assertRaises(ValueError):
+            lz77_decode_bytes(bytes([FORMAT_LZ77, 5, DEFAULT_WINDOW_BITS, 0, 0, 0]))
+
+    def test_lz77_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            in_file = os.path.join(tmp, 'repeated.txt')
+            encoded = os.path.join(tmp, 'repeated.lz')
+            decoded = os.path.join(tmp, 'decoded.txt')
+            with open('declaration.txt', 'rb') as f:
+                text = f.read()
+            with open(in_file, 'wb') as f:
+                f.write(text * 50)
+            huffman_encode_lz77(in_file, encoded, level=2)
+            huffman_decode_lz77(encoded, decoded)
+            self.assertTrue(filecmp.cmp(in_file, decoded, shallow=False))
+            # the file is read a block at a time, to the same bytes as coding it whole
+            huffman_lz77.LZ77_BLOCK_SIZE = 10000
+            try:
+                huffman_encode_lz77(in_file, encoded, level=2)
+                with open(encoded, 'rb') as f:
+                    self.assertEqual(f.read(), lz77_encode_bytes(text * 50, level=2))
+            finally:
+                huffman_lz77.LZ77_BLOCK_SIZE = 1 << 20
+            os.remove(decoded)
+            huffman_decode(encoded, decoded)
+            self.assertTrue(filecmp.cmp(in_file, decoded, shallow=False))
+            chunks = list(iter_decode(encoded, chunk_size=10000))
+            self.assertEqual(b''.join(chunks), text * 50)
+            self.assertTrue(all(len(chunk) == 10000 for chunk in chunks[:-1]))
+            self.assertEqual(b''.join(iter_decode(encoded, max_bytes=100)), text[:100])
+        with self.assertRaises(FileNotFoundError):
+            huffman_encode_lz77('ddafd.txt', 'ddafd_out.txt')
+
+if __name__ == '__main__': 
+   unittest.main()
@@ -0,0 +1,56 @@
+#
+#   Optional instrumentation for the Huffman encoder and decoder
+#
+#   Pass a HuffmanStats as stats= to huffman_encode or huffman_decode to find out where the time
+#   goes: it collects the wall time of each stage and counters such as bytes in and out, bits
+#   written, symbols decoded and decode table misses. With stats=None (the default) the codec only
+#   pays for a few checks per chunk, never per symbol.
+#
+
+import contextlib
+import json
+import logging
+import time
+
+NO_STAGE = contextlib.nullcontext()
+
+
+class HuffmanStats:
+    # times maps a stage name to the seconds spent in it, counts maps a counter name to its total
+    # Both add up over every call the object is passed to, so one object can cover a whole job
+    def __init__(self):
+        self.times = {}
+        self.counts = {}
+
+    # Use this method as  with stats.stage('name'):  to add the time spent in the block to stage 'name'
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - start
+
+    # Use this method to add n to the counter 'name'
+    def add(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    # Returns the stage times and counters as one flat dict, stage times under '<stage>_seconds'
+    def as_dict(self):
+        result = dict(self.counts)
+        for name in self.times:
+            result[name + '_seconds'] = self.times[name]
+        return result
+
+    # Writes the stats as a single JSON line to logger (the 'huffman' logger by default)
+    def log(self, logger=None, level=logging.INFO):
+        if logger is None:
+            logger = logging.getLogger('huffman')
+        logger.log(level, 'huffman stats %s', json.dumps(self.as_dict(), sort_keys=True))
+
+
+def timed_stage(stats, name):
+    """Returns stats.stage(name), or a context manager that does nothing when stats is None"""
+    if stats is None:
+        return NO_STAGE
+    return stats.stage(name)
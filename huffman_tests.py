@@ -1,6 +1,9 @@
 import unittest
 import filecmp
+import io
+import os
 import subprocess
+import tempfile
 from huffman import *
 
 class TestList(unittest.TestCase):
@@ -13,6 +16,12 @@ class TestList(unittest.TestCase):
         anslist = [0] * 256
         self.assertEqual(freqlist,anslist)
 
+    def test_cnt_freq_binary(self):
+        for name in ['file2.txt', 'declaration.txt', 'empty_file.txt']:
+            self.assertEqual(cnt_freq(name, binary=True), cnt_freq(name))
+        with self.assertRaises(FileNotFoundError):
+            cnt_freq('ddafd.txt', binary=True)
+
     def test_cnt_freq_error(self):
         with self.assertRaises(FileNotFoundError):
             cnt_freq('ddafd.txt')
@@ -133,6 +142,53 @@ class TestList(unittest.TestCase):
         right = hufftree.right
         self.assertEqual(right,None)
 
+    def test_create_huff_tree_large_alphabet(self):
+        freqlist = [0, 0] + [i % 7 for i in range(5000)]
+        hufftree = create_huff_tree(freqlist)
+        self.assertEqual(hufftree.freq, sum(freqlist))
+        self.assertEqual(hufftree.char, 3)
+        leaves = 0
+        stack = [hufftree]
+        while stack:
+            node = stack.pop()
+            if node.left is None and node.right is None:
+                leaves += 1
+            else:
+                self.assertTrue(comes_before(node.left, node.right))
+                stack.append(node.left)
+                stack.append(node.right)
+        self.assertEqual(leaves, len([f for f in freqlist if f != 0]))
+
+
+    def test_create_flat_tree(self):
+        for name in ['file1.txt', 'file2.txt', 'multiline.txt', 'declaration.txt', 'single_char.txt']:
+            freqlist = cnt_freq(name)
+            tree = create_flat_tree(freqlist)
+            present = [i for i in range(256) if freqlist[i] != 0]
+            self.assertEqual(list(tree.char[:len(present)]), present)
+            self.assertEqual(len(tree.char), 2 * len(present) - 1)
+            self.assertEqual(tree.freq[tree.root], sum(freqlist))
+            hufftree = create_huff_tree(freqlist)
+            self.assertEqual((hufftree.char, hufftree.freq), (tree.char[tree.root], tree.freq[tree.root]))
+            self.assertEqual(tree.node(), tree.node(tree.root))
+            self.assertEqual(hufftree.left, hufftree.left)
+            self.assertEqual(create_tree_int_code(hufftree), tree.int_codes())
+            self.assertEqual(create_int_code(create_code(hufftree)), tree.int_codes())
+        self.assertIsNone(create_flat_tree([0] * 256))
+        # a HuffmanNode tree made with combine gives the same codes as the flat tree
+        a = HuffmanNode(97, 1)
+        b = HuffmanNode(98, 2)
+        c = HuffmanNode(99, 4)
+        self.assertEqual(create_code(combine(combine(a, b), c)), create_code(create_huff_tree([0] * 97 + [1, 2, 4])))
+        # doubling frequencies make a tree one level deeper per character, far deeper than the recursion limit
+        freqlist = [1 << i for i in range(2000)]
+        hufftree = create_huff_tree(freqlist)
+        self.assertEqual(hufftree.freq, sum(freqlist))
+        codes = create_tree_int_code(hufftree)
+        self.assertEqual(len(codes), 2000)
+        self.assertEqual(codes[0], (0, 1999))
+        self.assertEqual(codes[1999], (1, 1))
+        self.assertEqual(create_code_lengths(hufftree)[:3], [1999, 1999, 1998])
 
     def test_create_header(self):
         freqlist = cnt_freq("file2.txt")
@@ -186,6 +242,97 @@ class TestList(unittest.TestCase):
         codes = create_code(hufftree)
         self.assertEqual(codes, ['']*256)
 
+    def test_create_canonical_code(self):
+        freqlist = cnt_freq("file2.txt")
+        lengths = create_code_lengths(create_huff_tree(freqlist))
+        codes = create_canonical_code(lengths)
+        self.assertEqual(codes[ord('d')], '0')
+        self.assertEqual(codes[ord('c')], '10')
+        self.assertEqual(codes[ord('b')], '110')
+        self.assertEqual(codes[ord('a')], '1110')
+        self.assertEqual(codes[ord('f')], '1111')
+
+        freqlist = cnt_freq('single_char.txt')
+        lengths = create_code_lengths(create_huff_tree(freqlist))
+        self.assertEqual(lengths[ord('d')], 1)
+        self.assertEqual(sum(lengths), 1)
+
+        self.assertEqual(create_canonical_code([0] * 256), [''] * 256)
+
+    def test_create_limited_code_lengths(self):
+        # Fibonacci frequencies make the unlimited tree as deep as it can get
+        freqlist = [0] * 256
+        a, b = 1, 1
+        for i in range(65, 91):
+            freqlist[i] = a
+            a, b = b, a + b
+        unlimited = create_code_lengths(create_huff_tree(freqlist))
+        self.assertEqual(max(unlimited), 25)
+        self.assertEqual(create_limited_code_lengths(freqlist, 25), unlimited)
+        for max_code_len in (5, 8, 12):
+            lengths = create_limited_code_lengths(freqlist, max_code_len)
+            self.assertEqual(max(lengths), max_code_len)
+            self.assertEqual(sum(2 ** (max_code_len - l) for l in lengths if l != 0), 2 ** max_code_len)
+        lengths = create_limited_code_lengths(freqlist, 5)
+        self.assertEqual(sum(f * l for f, l in zip(freqlist, lengths)), 1196214)
+
+        freqlist = cnt_freq('file2.txt')
+        self.assertEqual(create_limited_code_lengths(freqlist, 3)[97:103], [3, 3, 3, 1, 0, 3])
+        with self.assertRaises(ValueError):
+            create_limited_code_lengths(freqlist, 2)
+        # a single character still needs a 1-bit code, and 256 characters need at least 8 bits
+        self.assertEqual(create_limited_code_lengths([0] * 97 + [5] + [0] * 158, 1)[97], 1)
+        for max_code_len in (0, -1):
+            with self.assertRaises(ValueError):
+                create_limited_code_lengths([0] * 97 + [5] + [0] * 158, max_code_len)
+        self.assertEqual(max(create_limited_code_lengths([1] * 256, 8)), 8)
+        with self.assertRaises(ValueError):
+            create_limited_code_lengths([1] * 256, 7)
+
+    def test_create_canonical_header(self):
+        freqlist = cnt_freq("file2.txt")
+        lengths = create_code_lengths(create_huff_tree(freqlist))
+        header = create_canonical_header(lengths, 32)
+        self.assertEqual(header, bytes([FORMAT_CANONICAL, 32, 5, 97, 4, 0, 3, 0, 2, 0, 1, 1, 4]))
+
+        freqlist = cnt_freq('declaration.txt')
+        lengths = create_code_lengths(create_huff_tree(freqlist))
+        with tempfile.TemporaryDirectory() as tmp:
+            name = os.path.join(tmp, 'header.bin')
+            bit = HuffmanBitWriter(name)
+            bit.write_bytes(create_canonical_header(lengths, 8226))
+            bit.close()
+            bit = HuffmanBitReader(name)
+            self.assertEqual(bit.read_byte(), FORMAT_CANONICAL)
+            self.assertEqual(read_canonical_header(bit), (lengths, 8226))
+            bit.close()
+
+    def test_write_bits(self):
+        codes = create_code(create_huff_tree(cnt_freq('declaration.txt')))
+        pairs = create_int_code(codes)
+        self.assertEqual(pairs[ord('d')], (int(codes[ord('d')], 2), len(codes[ord('d')])))
+        self.assertEqual(pairs[0], (0, 0))
+        with open('declaration.txt', 'rb') as f:
+            text = f.read()
+        with tempfile.TemporaryDirectory() as tmp:
+            by_code = os.path.join(tmp, 'by_code.bin')
+            by_bits = os.path.join(tmp, 'by_bits.bin')
+            bit = HuffmanBitWriter(by_code)
+            for char in text:
+                bit.write_code(codes[char])
+            bit.close()
+            bit = HuffmanBitWriter(by_bits, buffer_size=16)
+            for char in text:
+                bit.write_bits(*pairs[char])
+            bit.close()
+            self.assertTrue(filecmp.cmp(by_code, by_bits, shallow=False))
+
+            bit = HuffmanBitWriter(by_bits)
+            bit.write_bits(0b101, 3)
+            bit.close()
+            with open(by_bits, 'rb') as f:
+                self.assertEqual(f.read(), bytes([0b10100000]))
+
     def test_given_textfiles(self):
         huffman_encode("file1.txt", "file1_out.txt")
         # capture errors by running 'diff' on your encoded file with a *known* solution file
@@ -215,6 +362,132 @@ class TestList(unittest.TestCase):
         self.assertEqual(err,0)
 
 
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_numpy_encoder(self):
+        import huffman
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ['file1', 'multiline', 'declaration', 'single_char']:
+                for canonical, binary, chunk_size in [(False, False, 7), (True, True, CHUNK_SIZE)]:
+                    outputs = []
+                    for flag in (False, True):
+                        huffman.NUMPY_ENCODE = flag
+                        out_file = os.path.join(tmp, '%s_%d_out.txt' % (name, flag))
+                        try:
+                            huffman_encode(name + '.txt', out_file, canonical, chunk_size, binary)
+                        finally:
+                            huffman.NUMPY_ENCODE = True
+                        with open(out_file, 'rb') as f, open(compressed_file_name(out_file), 'rb') as g:
+                            outputs.append((f.read(), g.read()))
+                    self.assertEqual(outputs[0], outputs[1])
+        data = bytes(range(256)) * 3 + b'skewed' * 100
+        book = canonical_codebook(create_code_lengths(create_huff_tree(count_bytes(io.BytesIO(data)))))
+        self.assertEqual(''.join(map(str, numpy_code_bits(data, book))), data.decode('latin-1').translate(book.translate_table()))
+        self.assertEqual(len(numpy_code_bits(b'', book)), 0)
+        long_codes = Codebook(['1' * 60, '0'] + [''] * 254)
+        self.assertIsNone(numpy_code_bits(b'\x00\x01', long_codes))
+        self.assertEqual(translate_chunk(b'\x00\x01', long_codes), '1' * 60 + '0')
+
+    def test_encoded_size(self):
+        for name in ('file1.txt', 'declaration.txt', 'single_char.txt'):
+            with open(name, 'rb') as f:
+                data = f.read()
+            freqs = count_bytes(io.BytesIO(data))
+            lengths = create_code_lengths(create_huff_tree(freqs))
+            header_size = len(create_canonical_header(lengths, len(data)))
+            self.assertEqual(encoded_size(freqs, lengths, header_size), len(encode_bytes(data, store_raw=False)))
+            book = tree_codebook(freqs)
+            self.assertEqual(encoded_size(freqs, book.codes, len(create_header(freqs)) + 1),
+                             os.path.getsize(name[:-4] + '_compressed_soln.txt'))
+            self.assertEqual(estimate_encoded_size(name), (len(encode_bytes(data, store_raw=False)), len(data)))
+        with tempfile.TemporaryDirectory() as tmp:
+            name = os.path.join(tmp, 'big.txt')
+            with open(name, 'wb') as f:
+                for i in range(20):
+                    f.write(bytes(range(32, 127)) * (i + 1) * 50)
+            with open(name, 'rb') as f:
+                exact = len(encode_bytes(f.read(), store_raw=False))
+            estimate, size = estimate_encoded_size(name, samples=4, sample_size=1000)
+            self.assertEqual(size, os.path.getsize(name))
+            self.assertAlmostEqual(estimate / exact, 1, places=2)
+
+    def test_store_raw(self):
+        data = bytes(range(256)) * 40
+        self.assertEqual(encode_bytes(data), bytes([FORMAT_RAW]) + data)
+        self.assertEqual(decode_bytes(encode_bytes(data)), data)
+        self.assertEqual(encode_bytes(b'a' * 100)[0], FORMAT_CANONICAL)
+        self.assertEqual(encode_bytes(b'abc'), bytes([FORMAT_RAW]) + b'abc')
+        with tempfile.TemporaryDirectory() as tmp:
+            in_file = os.path.join(tmp, 'random.bin')
+            out_file = os.path.join(tmp, 'random_out.txt')
+            decoded = os.path.join(tmp, 'random_decoded.bin')
+            with open(in_file, 'wb') as f:
+                f.write(data)
+            for canonical in (False, True):
+                stats = HuffmanStats()
+                huffman_encode(in_file, out_file, canonical=canonical, binary=True, stats=stats, store_raw=True)
+                self.assertEqual(stats.as_dict()['stored_raw'], 1)
+                with open(compressed_file_name(out_file), 'rb') as f:
+                    self.assertEqual(f.read(), bytes([FORMAT_RAW]) + data)
+                huffman_decode(compressed_file_name(out_file), decoded, binary=True)
+                self.assertTrue(filecmp.cmp(in_file, decoded, shallow=False))
+            self.assertEqual(b''.join(iter_decode(compressed_file_name(out_file), 1000)), data)
+            self.assertEqual(decoded_size(compressed_file_name(out_file)), len(data))
+            out = bytearray()
+            self.assertEqual(decode_into(compressed_file_name(out_file), out), len(data))
+            self.assertEqual(out, data)
+            # text mode, and files that do shrink are coded as before
+            huffman_encode('file1.txt', out_file, store_raw=True)
+            with open('file1.txt', 'rb') as f:
+                text = f.read()
+            with open(compressed_file_name(out_file), 'rb') as f:
+                self.assertEqual(f.read(), bytes([FORMAT_RAW]) + text)
+            huffman_decode(compressed_file_name(out_file), decoded)
+            self.assertTrue(filecmp.cmp('file1.txt', decoded, shallow=False))
+            huffman_encode('declaration.txt', out_file, store_raw=True)
+            self.assertTrue(filecmp.cmp(compressed_file_name(out_file), 'declaration_compressed_soln.txt', shallow=False))
+
+    def test_codebook_cache(self):
+        cache = CodebookCache(maxsize=2)
+        built = []
+        def build(key):
+            built.append(key)
+            return Codebook(['0', '1'])
+        a = cache.get('a', lambda: build('a'))
+        self.assertIs(cache.get('a', lambda: build('a')), a)
+        cache.get('b', lambda: build('b'))
+        cache.get('a', lambda: build('a'))   # 'a' is now the most recently used, so 'b' goes first
+        cache.get('c', lambda: build('c'))
+        cache.get('b', lambda: build('b'))
+        self.assertEqual(built, ['a', 'b', 'c', 'b'])
+        self.assertEqual(cache.info(), {'hits': 2, 'misses': 4, 'size': 2, 'maxsize': 2})
+        self.assertEqual(list(cache.entries), ['c', 'b'])
+        cache.clear()
+        self.assertEqual(cache.info(), {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 2})
+        off = CodebookCache(maxsize=0)
+        off.get('a', lambda: build('a'))
+        off.get('a', lambda: build('a'))
+        self.assertEqual(off.info()['size'], 0)
+
+        book = tree_codebook(cnt_freq('file1.txt'))
+        self.assertIs(tree_codebook(cnt_freq('file1.txt')), book)
+        self.assertEqual(book.codes, create_code(create_huff_tree(cnt_freq('file1.txt'))))
+        self.assertEqual(book.translate_table()[ord('a')], book.codes[ord('a')])
+        self.assertIs(book.decode_table(), book.decode_table())
+        with tempfile.TemporaryDirectory() as tmp:
+            out_file = os.path.join(tmp, 'file1_out.txt')
+            hits = codebook_cache.info()['hits']
+            huffman_encode('file1.txt', out_file)
+            self.assertTrue(filecmp.cmp(compressed_file_name(out_file), 'file1_compressed_soln.txt', shallow=False))
+            self.assertEqual(codebook_cache.info()['hits'], hits + 1)
+
+    def test_encode_small_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ['file1', 'multiline', 'declaration']:
+                out_file = os.path.join(tmp, name + '_out.txt')
+                huffman_encode(name + '.txt', out_file, chunk_size=7)
+                self.assertTrue(filecmp.cmp(out_file, name + '_soln.txt', shallow=False))
+                self.assertTrue(filecmp.cmp(compressed_file_name(out_file), name + '_compressed_soln.txt', shallow=False))
+
     def test_improper_input(self):
         with self.assertRaises(FileNotFoundError):
             huffman_encode('ddafd.txt','ddafd_out.txt')
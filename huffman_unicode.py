@@ -0,0 +1,262 @@
+#
+#   Huffman coding of text over the full Unicode alphabet
+#
+#   The rest of the codec counts characters in a [0] * 256 list indexed by ord(char), so text with
+#   characters past Latin-1 cannot be coded, and a dense list over every code point would make each
+#   scan of it slow. Here the counts are a dict from code point to count, and the code points that
+#   occur are numbered 0, 1, 2, ... in increasing order (a SymbolAlphabet). Trees, canonical codes
+#   and decode tables are built over those numbers, so their cost grows with the number of distinct
+#   characters only. Text files are read and written as UTF-8, newlines untouched.
+#
+#   Layout of a Unicode file:
+#       FORMAT_UNICODE byte
+#       number of characters                                          (varint)
+#       the code lengths, as encode_code_lengths writes them but indexed by code point: the number of
+#       characters with a code, then for each in increasing order the gap from the one before and its
+#       code length (varints)
+#       the code bits, zero padded to a byte
+#
+#   From the shell:  python3 huffman_unicode.py encode in_file out_file
+#                    python3 huffman_unicode.py decode in_file out_file
+#
+
+from array import array
+import collections
+import io
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from huffman import *
+
+
+class SymbolAlphabet:
+    # The code points of a text in increasing order; the code point symbols[i] is coded as symbol i
+    # index maps a code point back to its symbol number
+    def __init__(self, code_points):
+        self.symbols = sorted(code_points)
+        self.index = {}
+        for i in range(len(self.symbols)):
+            self.index[self.symbols[i]] = i
+        self.chars = [chr(cp) for cp in self.symbols]
+        self.array = None
+
+    def __len__(self):
+        return len(self.symbols)
+
+    # Returns the code points as a NumPy array, for mapping symbols to and from code points in bulk
+    def code_point_array(self):
+        if self.array is None:
+            self.array = numpy.array(self.symbols, dtype=numpy.uint32)
+        return self.array
+
+    # Returns the dense list of counts or code lengths, indexed by symbol, for a dict indexed by code point
+    def dense(self, by_code_point):
+        return [by_code_point[cp] for cp in self.symbols]
+
+
+def count_symbols(text, counts=None):
+    """Adds the number of times each character occurs in the str text to the dict counts (a new one if it is None),
+    keyed by code point, and returns counts"""
+    if counts is None:
+        counts = {}
+    for char, n in collections.Counter(text).items():
+        cp = ord(char)
+        counts[cp] = counts.get(cp, 0) + n
+    return counts
+
+
+def cnt_symbols(filename):
+    """Counts the characters of the UTF-8 text file filename, CHUNK_SIZE characters at a time
+    Returns a dict from code point to count holding only the characters that occur"""
+    try:
+        fin = open(filename, 'r', encoding='utf-8', newline='')
+    except:
+        raise FileNotFoundError
+    counts = {}
+    for chunk in iter(lambda: fin.read(CHUNK_SIZE), ''):
+        count_symbols(chunk, counts)
+    fin.close()
+    return counts
+
+
+def sparse_code_lengths(counts, max_code_len=None):
+    """Returns the code lengths for the dict counts as a dict from code point to length
+    The tree is built over the symbol numbers of a SymbolAlphabet, which keep the order of the code points, so ties
+    are broken as create_huff_tree would break them on a list indexed by code point; max_code_len caps every code"""
+    alphabet = SymbolAlphabet(counts.keys())
+    freqs = alphabet.dense(counts)
+    if max_code_len is None:
+        lengths = create_code_lengths(create_huff_tree(freqs))
+    else:
+        lengths = create_limited_code_lengths(freqs, max_code_len)
+    result = {}
+    for i in range(len(alphabet)):
+        result[alphabet.symbols[i]] = lengths[i]
+    return result
+
+
+def encode_sparse_lengths(lengths):
+    """Returns the dict of code lengths lengths as bytes, in the layout of encode_code_lengths"""
+    out = bytearray(encode_varint(len(lengths)))
+    prev = -1
+    for cp in sorted(lengths):
+        out += encode_varint(cp - prev - 1)
+        out += encode_varint(lengths[cp])
+        prev = cp
+    return bytes(out)
+
+
+def read_sparse_lengths(bit):
+    """Reads code lengths written by encode_sparse_lengths from a HuffmanBitReader; returns a dict from code point to length"""
+    lengths = {}
+    cp = -1
+    for i in range(read_varint(bit)):
+        cp += read_varint(bit) + 1
+        lengths[cp] = read_varint(bit)
+    return lengths
+
+
+def unicode_codebook(lengths):
+    """Returns (SymbolAlphabet, Codebook of canonical codes by symbol number) for the dict of code lengths lengths
+    The codebook comes from codebook_cache, shared by every alphabet with the same lengths in symbol order"""
+    alphabet = SymbolAlphabet(lengths.keys())
+    return (alphabet, canonical_codebook(alphabet.dense(lengths)))
+
+
+def create_unicode_header(lengths, char_num):
+    """Returns the header of a Unicode file for the dict of code lengths lengths and char_num characters"""
+    return bytes([FORMAT_UNICODE]) + encode_varint(char_num) + encode_sparse_lengths(lengths)
+
+
+def unicode_translate_table(alphabet, book):
+    """Returns the str.translate table that maps each code point of alphabet to its code"""
+    table = {}
+    for i in range(len(alphabet)):
+        table[alphabet.symbols[i]] = book.codes[i]
+    return table
+
+
+def write_text_chunk(bit, text, alphabet, book, table):
+    """Writes the codes for the characters of the str text with the HuffmanBitWriter bit
+    With NumPy the code points are looked up in the alphabet with numpy.searchsorted and the code bits are found as
+    numpy_code_bits finds them; otherwise str.translate with table turns the text into a string of '0's and '1's"""
+    arrays = None
+    if numpy is not None and NUMPY_ENCODE:
+        arrays = book.code_arrays()
+    if arrays is None:
+        bit.write_code(text.translate(table))
+        return
+    cps = numpy.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=numpy.uint32)
+    syms = numpy.searchsorted(alphabet.code_point_array(), cps)
+    write_bit_array(bit, numpy_symbol_bits(syms, arrays[0], arrays[1]))
+
+
+def write_unicode(bit, chunks, lengths, char_num):
+    """Writes a Unicode file with the HuffmanBitWriter bit: the header for lengths and char_num, then the codes for the
+    str chunks, an iterable of text that holds char_num characters in all"""
+    bit.write_bytes(create_unicode_header(lengths, char_num))
+    if len(lengths) > 1:
+        alphabet, book = unicode_codebook(lengths)
+        table = None
+        if numpy is None or not NUMPY_ENCODE or book.code_arrays() is None:
+            table = unicode_translate_table(alphabet, book)
+        for chunk in chunks:
+            write_text_chunk(bit, chunk, alphabet, book, table)
+    bit.close()
+
+
+def unicode_encode_text(text, max_code_len=None):
+    """Compresses the str text to the Unicode format in memory and returns the compressed bytes"""
+    lengths = sparse_code_lengths(count_symbols(text), max_code_len)
+    out = io.BytesIO()
+    write_unicode(HuffmanBitWriter(out), (text[start:start + CHUNK_SIZE] for start in range(0, len(text), CHUNK_SIZE)),
+                  lengths, len(text))
+    return out.getvalue()
+
+
+def symbols_to_text(syms, n, alphabet):
+    """Returns the first n symbol numbers of the array('i') syms as a str of the characters they stand for"""
+    if numpy is not None:
+        cps = alphabet.code_point_array()[numpy.frombuffer(syms, dtype=numpy.int32, count=n)]
+        return cps.tobytes().decode('utf-32-le', 'surrogatepass')
+    chars = alphabet.chars
+    return ''.join([chars[sym] for sym in syms[:n]])
+
+
+def unicode_text_chunks(fin, chunk_size=CHUNK_SIZE):
+    """Yields the text decoded from the Unicode format in the binary file object fin, positioned at the format byte,
+    as str chunks of chunk_size characters (the last one may be shorter)
+    Symbols are decoded into one array('i') that is reused for every chunk"""
+    bit = HuffmanBitReader(fin)
+    if bit.read_byte() != FORMAT_UNICODE:
+        raise ValueError('not a Unicode-format stream')
+    char_num = read_varint(bit)
+    lengths = read_sparse_lengths(bit)
+    if len(lengths) == 1:
+        only = chr(next(iter(lengths)))
+        while char_num > 0:
+            n = min(chunk_size, char_num)
+            yield only * n
+            char_num -= n
+    elif char_num > 0:
+        alphabet, book = unicode_codebook(lengths)
+        table = book.decode_table()
+        syms = array('i', [0]) * min(chunk_size, char_num)
+        while char_num > 0:
+            n = min(chunk_size, char_num)
+            decode_symbols(bit, table, n, None, syms)
+            yield symbols_to_text(syms, n, alphabet)
+            char_num -= n
+    bit.close()
+
+
+def unicode_chunks(fin, chunk_size=CHUNK_SIZE):
+    """Yields the text decoded from a Unicode-format file object fin as UTF-8 bytes, about chunk_size characters at a time"""
+    for text in unicode_text_chunks(fin, chunk_size):
+        yield text.encode('utf-8', 'surrogatepass')
+
+
+def unicode_decode_text(data):
+    """Decodes bytes produced by unicode_encode_text and returns the original str"""
+    return ''.join(unicode_text_chunks(io.BytesIO(data), DECODE_CHUNK_SIZE))
+
+
+def huffman_encode_unicode(in_file, out_file, max_code_len=None):
+    """Compresses the UTF-8 text file in_file to out_file in the Unicode format
+    The file is read twice, CHUNK_SIZE characters at a time, once to count the characters and once to code them"""
+    counts = cnt_symbols(in_file)
+    lengths = sparse_code_lengths(counts, max_code_len)
+    try:
+        fin = open(in_file, 'r', encoding='utf-8', newline='')
+        fout = open(out_file, 'wb')
+    except:
+        raise FileNotFoundError
+    write_unicode(HuffmanBitWriter(fout), iter(lambda: fin.read(CHUNK_SIZE), ''), lengths, sum(counts.values()))
+    fout.close()
+    fin.close()
+
+
+def huffman_decode_unicode(encoded_file, decode_file):
+    """Decodes a Unicode-format file written by huffman_encode_unicode to the UTF-8 text file decode_file"""
+    try:
+        fin = open(encoded_file, 'rb')
+        fout = open(decode_file, 'w', encoding='utf-8', newline='')
+    except:
+        raise FileNotFoundError
+    for text in unicode_text_chunks(fin, DECODE_CHUNK_SIZE):
+        fout.write(text)
+    fout.close()
+    fin.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] not in ('encode', 'decode'):
+        sys.exit('usage: python3 huffman_unicode.py encode|decode in_file out_file')
+    if sys.argv[1] == 'encode':
+        huffman_encode_unicode(sys.argv[2], sys.argv[3])
+    else:
+        huffman_decode_unicode(sys.argv[2], sys.argv[3])
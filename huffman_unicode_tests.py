@@ -0,0 +1,77 @@
+import unittest
+import filecmp
+import os
+import tempfile
+import huffman
+from huffman_unicode import *
+
+TEXT = 'Grüße — Привет, мир! Γειά σου κόσμε. 你好，世界。नमस्ते 😀😀🎉\r\nline two\n' * 20
+
+
+class TestList(unittest.TestCase):
+    def test_count_symbols(self):
+        counts = count_symbols('aé你😀a')
+        self.assertEqual(counts, {0x61: 2, 0xe9: 1, 0x4f60: 1, 0x1f600: 1})
+        self.assertEqual(count_symbols('a', counts)[0x61], 3)
+
+    def test_sparse_code_lengths(self):
+        # over Latin-1 the lengths and header match the 256-slot canonical encoder exactly
+        with open('declaration.txt') as f:
+            text = f.read()
+        freqs = cnt_freq('declaration.txt')
+        dense = create_code_lengths(create_huff_tree(freqs))
+        lengths = sparse_code_lengths(count_symbols(text))
+        self.assertEqual(lengths, {i: dense[i] for i in range(256) if dense[i] != 0})
+        self.assertEqual(encode_sparse_lengths(lengths), encode_code_lengths(dense))
+        self.assertEqual(len(unicode_encode_text(text)), len(encode_bytes(text.encode('latin-1'))))
+        lengths = sparse_code_lengths(count_symbols(TEXT), max_code_len=6)
+        self.assertLessEqual(max(lengths.values()), 6)
+        self.assertEqual(sparse_code_lengths({0x10ffff: 4}), {0x10ffff: 1})
+
+    def test_sparse_lengths_round_trip(self):
+        lengths = {0: 3, 0x41: 2, 0x4e00: 5, 0x10ffff: 7}
+        bit = HuffmanBitReader(io.BytesIO(encode_sparse_lengths(lengths)))
+        self.assertEqual(read_sparse_lengths(bit), lengths)
+
+    def test_unicode_round_trip(self):
+        for flag in (False, True):
+            huffman.NUMPY_ENCODE = flag
+            try:
+                for text in ['', 'a', '你' * 1000, TEXT, TEXT * 200, 'lone \ud800 surrogate']:
+                    self.assertEqual(unicode_decode_text(unicode_encode_text(text)), text)
+            finally:
+                huffman.NUMPY_ENCODE = True
+        # smaller than coding the UTF-8 bytes when most characters take more than one byte
+        text = TEXT * 50
+        self.assertLess(len(unicode_encode_text(text)), len(encode_bytes(text.encode('utf-8'))))
+        with self.assertRaises(ValueError):
+            unicode_decode_text(encode_bytes(b'abc'))
+
+    def test_unicode_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            in_file = os.path.join(tmp, 'text.txt')
+            encoded = os.path.join(tmp, 'text.huf')
+            decoded = os.path.join(tmp, 'decoded.txt')
+            with open(in_file, 'w', encoding='utf-8', newline='') as f:
+                f.write(TEXT * 5000)
+            huffman_encode_unicode(in_file, encoded)
+            huffman_decode_unicode(encoded, decoded)
+            self.assertTrue(filecmp.cmp(in_file, decoded, shallow=False))
+            os.remove(decoded)
+            huffman_decode(encoded, decoded)
+            self.assertTrue(filecmp.cmp(in_file, decoded, shallow=False))
+            with open(in_file, 'rb') as f:
+                data = f.read()
+            chunks = list(iter_decode(encoded, chunk_size=1000))
+            self.assertEqual(b''.join(chunks), data)
+            self.assertTrue(all(len(chunk) == 1000 for chunk in chunks[:-1]))
+            self.assertEqual(b''.join(iter_decode(encoded, max_bytes=25)), data[:25])
+            for name in ('declaration.txt', 'single_char.txt', 'empty_file.txt'):
+                huffman_encode_unicode(name, encoded)
+                huffman_decode_unicode(encoded, decoded)
+                self.assertTrue(filecmp.cmp(name, decoded, shallow=False))
+        with self.assertRaises(FileNotFoundError):
+            huffman_encode_unicode('ddafd.txt', 'ddafd_out.txt')
+
+if __name__ == '__main__': 
+   unittest.main()